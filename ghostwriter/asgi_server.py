@@ -0,0 +1,89 @@
+"""Asyncio front end for GhostWriter (SERVER_MODE=asgi).
+
+python-socketio's AsyncServer handles Socket.IO on one event loop under
+uvicorn, and plain HTTP (static files, /metrics) goes to the same Flask app
+through asgiref's WsgiToAsgi.  uvicorn and asgiref are optional
+(requirements-asgi.txt) and only imported once this mode is chosen.  The
+event handlers are the ones in server.py:
+they run in arrival order on a single worker thread, and context grabs on a
+small bounded pool, so UIA, clipboard and injector calls never block the
+loop and the thread count stays flat no matter how many events arrive.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Any, Callable
+
+import socketio
+
+try:
+    from .transport import AsyncioTransport
+except ImportError:
+    from transport import AsyncioTransport
+
+log = logging.getLogger("ghostwriter.asgi")
+
+
+def create_app(core: ModuleType, loop: asyncio.AbstractEventLoop, grab_workers: int = 2) -> Any:
+    """Build the ASGI app around `core` (the loaded server module)."""
+    from asgiref.wsgi import WsgiToAsgi
+
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins="*",
+        ping_timeout=60,
+        ping_interval=25,
+        logger=False,
+        engineio_logger=False,
+    )
+    # One thread keeps handlers (and so injection order) sequential
+    events = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghostwriter-events")
+    grabs = ThreadPoolExecutor(max_workers=grab_workers, thread_name_prefix="ghostwriter-grab")
+    core.set_transport(AsyncioTransport(sio, loop, grabs))
+
+    async def run(handler: Callable[..., None], *args: Any) -> None:
+        await loop.run_in_executor(events, handler, *args)
+
+    @sio.on("connect")
+    async def connect(sid, environ, auth=None):
+        scope = environ.get("asgi.scope") or {}
+        client = scope.get("client") or (environ.get("REMOTE_ADDR"),)
+        await run(core.on_connect, sid, client[0], auth)
+
+    @sio.on("disconnect")
+    async def disconnect(sid, *args):
+        await run(core.on_disconnect, sid)
+
+    def bind(handler: Callable[[str, Any], None]) -> Callable[..., Any]:
+        async def on_event(sid, payload=None):
+            await run(handler, sid, payload)
+        return on_event
+
+    for event, handler in core.EVENT_HANDLERS.items():
+        sio.on(event, bind(handler))
+
+    return socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(core.app))
+
+
+async def _serve(core: ModuleType, host: str, port: int, grab_workers: int) -> None:
+    import uvicorn
+
+    app = create_app(core, asyncio.get_running_loop(), grab_workers)
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+    await uvicorn.Server(config).serve()
+
+
+def serve(core: ModuleType, host: str, port: int, grab_workers: int = 2) -> None:
+    """Run the ASGI front end until interrupted."""
+    try:
+        import uvicorn  # noqa: F401
+        import asgiref  # noqa: F401
+    except ImportError:
+        log.error("SERVER_MODE=asgi needs uvicorn and asgiref: pip install -r requirements-asgi.txt")
+        raise SystemExit(1)
+    log.info(f"[asgi] uvicorn on {host}:{port} (grab workers={grab_workers})")
+    asyncio.run(_serve(core, host, port, grab_workers))
@@ -0,0 +1,217 @@
+"""Content-hashed static assets for GhostWriter.
+
+At startup `AssetPipeline.build` reads static/, gives every file a name that
+carries its content hash (``app.js`` -> ``/assets/app.3f2a9c1b7e.js``),
+rewrites the references in index.html and manifest.json to those names, and
+keeps each file in memory together with gzip (and, when the optional
+``brotli`` package is installed, brotli) variants.
+
+Hashed URLs change whenever the content does, so they are served with a
+year-long ``immutable`` Cache-Control: a phone never revalidates them, and
+never runs an old app.js against a newer server either, because index.html
+and the service worker are served ``no-cache`` (revalidated by ETag on every
+load) and always point at the current hashes.
+
+sw.js is generated from static/sw.js with the hashed file list filled in; it
+precaches the shell so the page opens offline or on a slow network.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from flask import Response
+
+try:
+    import brotli  # optional: smaller JS/CSS for phones that accept br
+except ImportError:
+    brotli = None
+
+log = logging.getLogger("ghostwriter")
+
+ASSET_PREFIX = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+HASH_CHARS = 10
+# Served at fixed URLs and rewritten, never fingerprinted
+ENTRY_FILES = ("index.html", "sw.js")
+COMPRESSIBLE = {".html", ".js", ".css", ".json", ".svg", ".txt"}
+MIN_COMPRESS = 256
+
+_REF_RE = re.compile(r'(?P<attr>\b(?:href|src))="(?P<path>/[^"?#]*)(?:[?#][^"]*)?"')
+
+
+@dataclass
+class Asset:
+    """One file held in memory with its encodings ("identity", "gzip", "br")."""
+
+    name: str
+    url: str
+    content_type: str
+    etag: str
+    cache_control: str
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+
+def _content_type(name: str) -> str:
+    if name.endswith(".webmanifest") or name == "manifest.json":
+        return "application/manifest+json"
+    if name.endswith(".js"):
+        return "text/javascript; charset=utf-8"
+    guessed = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if guessed.startswith("text/") or guessed in ("image/svg+xml", "application/json"):
+        guessed += "; charset=utf-8"
+    return guessed
+
+
+def _hashed_name(rel: str, digest: str) -> str:
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{digest}{ext}"
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+class AssetPipeline:
+    """Fingerprinted, precompressed copies of static/ served from memory."""
+
+    def __init__(self, static_dir: str, prefix: str = ASSET_PREFIX) -> None:
+        self.static_dir = static_dir
+        self.prefix = prefix
+        self.version = ""
+        # URL path ("/assets/app.<hash>.js", "/", "/sw.js") -> Asset
+        self._assets: Dict[str, Asset] = {}
+        # Original path ("/app.js") -> hashed URL
+        self.urls: Dict[str, str] = {}
+
+    # ── Build ────────────────────────────────────────────────
+
+    def _files(self) -> Iterable[str]:
+        for root, _dirs, files in os.walk(self.static_dir):
+            for name in sorted(files):
+                rel = os.path.relpath(os.path.join(root, name), self.static_dir)
+                yield rel.replace(os.sep, "/")
+
+    def _read(self, rel: str) -> bytes:
+        with open(os.path.join(self.static_dir, rel), "rb") as f:
+            return f.read()
+
+    def _add(self, url: str, name: str, data: bytes, cache_control: str) -> Asset:
+        digest = hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+        asset = Asset(name, url, _content_type(name), f'"{digest}"', cache_control, {"identity": data})
+        if os.path.splitext(name)[1] in COMPRESSIBLE and len(data) >= MIN_COMPRESS:
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                asset.bodies["gzip"] = gz
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    asset.bodies["br"] = br
+        self._assets[url] = asset
+        return asset
+
+    def _rewrite_html(self, html: str) -> str:
+        def swap(match: re.Match) -> str:
+            url = self.urls.get(match.group("path"))
+            return f'{match.group("attr")}="{url}"' if url else match.group(0)
+        return _REF_RE.sub(swap, html)
+
+    def _rewrite_manifest(self, raw: bytes) -> bytes:
+        manifest = json.loads(raw.decode("utf-8"))
+        for icon in manifest.get("icons", []):
+            icon["src"] = self.urls.get(icon.get("src"), icon.get("src"))
+        return json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def build(self) -> "AssetPipeline":
+        self._assets.clear()
+        self.urls.clear()
+        files = [rel for rel in self._files() if rel not in ENTRY_FILES]
+        # The manifest names the icons, so it is hashed after them
+        files.sort(key=lambda rel: rel == "manifest.json")
+        for rel in files:
+            data = self._read(rel)
+            if rel == "manifest.json":
+                data = self._rewrite_manifest(data)
+            digest = hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+            url = self.prefix + _hashed_name(rel, digest)
+            self._add(url, rel, data, IMMUTABLE)
+            self.urls["/" + rel] = url
+
+        shell = self.shell
+        self.version = hashlib.sha256("\n".join(shell).encode()).hexdigest()[:HASH_CHARS]
+
+        html = self._rewrite_html(self._read("index.html").decode("utf-8"))
+        self._add("/", "index.html", html.encode("utf-8"), REVALIDATE)
+
+        if os.path.exists(os.path.join(self.static_dir, "sw.js")):
+            sw = self._read("sw.js").decode("utf-8")
+            sw = sw.replace("__VERSION__", self.version).replace("__ASSETS__", json.dumps(shell))
+            self._add("/sw.js", "sw.js", sw.encode("utf-8"), REVALIDATE)
+
+        raw = sum(len(a.bodies["identity"]) for a in self._assets.values())
+        packed = sum(len(a.bodies.get("br") or a.bodies.get("gzip") or a.bodies["identity"]) for a in self._assets.values())
+        log.info(
+            f"[assets] {len(self._assets)} files, version {self.version}: "
+            f"{raw / 1024:.1f} KB -> {packed / 1024:.1f} KB compressed"
+            + ("" if brotli is not None else " (gzip only; pip install brotli for br)")
+        )
+        return self
+
+    # ── Serving ──────────────────────────────────────────────
+
+    def get(self, url: str) -> Optional[Asset]:
+        return self._assets.get(url)
+
+    @property
+    def shell(self) -> List[str]:
+        return sorted(self.urls.values())
+
+    def response(self, url: str, accept_encoding: str = "", if_none_match: str = "") -> Optional[Response]:
+        """The Flask response for `url`, or None if it is not a built asset."""
+        asset = self._assets.get(url)
+        if asset is None:
+            return None
+
+        accepted = _parse_accept_encoding(accept_encoding)
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.bodies and accepted.get(candidate, 0) > 0:
+                encoding = candidate
+                break
+        tag = asset.etag if encoding == "identity" else f'"{asset.etag[1:-1]}-{encoding}"'
+
+        headers = {
+            "Cache-Control": asset.cache_control,
+            "ETag": tag,
+            "Vary": "Accept-Encoding",
+        }
+        wanted = {t.strip().removeprefix("W/") for t in if_none_match.split(",") if t.strip()}
+        if "*" in wanted or tag in wanted:
+            return Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], status=200, headers=headers, content_type=asset.content_type)
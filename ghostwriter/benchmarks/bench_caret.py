@@ -0,0 +1,73 @@
+"""Caret placement benchmark.
+
+Moves the caret by growing distances on a FakeDocument two ways: the old
+path, one arrow key event per character through a RecordingBackend, and
+WindowsUIABackend.place_caret, one TextRange Move + Select on the cached
+selection range.  Both must land on the same offset, including clamping
+at the document edges (tests/test_caret.py checks placement in detail).
+
+--key-ms simulates the target app's per-key-event cost, which is what makes
+long arrow runs visibly crawl.
+
+Usage (from the ghostwriter directory):
+    python benchmarks/bench_caret.py [--key-ms 0.3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_grabber import WindowsUIABackend  # noqa: E402
+from fakes import FakeDocument, FakeTextPattern, RecordingBackend  # noqa: E402
+from uia_worker import UIATarget  # noqa: E402
+
+DOC_CHARS = 4_000
+# The last two run past the document edges
+DISTANCES = [1, 10, 100, 1_000, -1, -10, -100, -1_000, 3_000, -3_000]
+
+
+def by_arrows(doc: FakeDocument, offset: int, key_ms: float) -> int:
+    backend = RecordingBackend(doc, per_char=key_ms / 1000)
+    backend.press("left" if offset < 0 else "right", presses=abs(offset))
+    return abs(offset)
+
+
+def by_text_range(doc: FakeDocument, offset: int) -> int:
+    target = UIATarget(doc, FakeTextPattern(doc), "text", "bench")
+    WindowsUIABackend().place_caret(target, offset)
+    return 1
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--key-ms", type=float, default=0.3, help="simulated cost per key event")
+    args = parser.parse_args(argv)
+
+    text = ("GhostWriter 測試 caret line.\n" * (DOC_CHARS // 26 + 1))[:DOC_CHARS]
+
+    print(f"{'offset':>8} | {'arrows ms':>10} {'events':>7} | {'range ms':>9} {'calls':>6} | caret")
+    print("-" * 58)
+    for offset in DISTANCES:
+        start = DOC_CHARS // 2
+        arrow_doc = FakeDocument(text=text, caret=start)
+        t0 = time.perf_counter()
+        events = by_arrows(arrow_doc, offset, args.key_ms)
+        arrow_ms = (time.perf_counter() - t0) * 1000
+
+        range_doc = FakeDocument(text=text, caret=start)
+        t0 = time.perf_counter()
+        calls = by_text_range(range_doc, offset)
+        range_ms = (time.perf_counter() - t0) * 1000
+
+        expected = min(max(start + offset, 0), len(text))
+        assert arrow_doc.caret == range_doc.caret == expected, (offset, arrow_doc.caret, range_doc.caret)
+        print(f"{offset:>8} | {arrow_ms:>10.2f} {events:>7} | {range_ms:>9.3f} {calls:>6} | {expected}")
+
+
+if __name__ == "__main__":
+    main()
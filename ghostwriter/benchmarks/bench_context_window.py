@@ -0,0 +1,97 @@
+"""Context window extraction benchmark.
+
+Compares the old full-DocumentRange read (pull everything before/after the
+caret, sanitize it, then slice) with the bounded window reader used by
+WindowsUIABackend, on synthetic documents of growing size.  The last
+column reads a PAGE-character page far from the caret (the expanded phone
+preview), which must cost the same wherever it is.
+
+Usage (from the ghostwriter directory):
+    python benchmarks/bench_context_window.py
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_grabber import (  # noqa: E402
+    ENDPOINT_END,
+    ENDPOINT_START,
+    WindowsUIABackend,
+    _sanitize_text,
+)
+from fakes import FakeDocument, FakeTextPattern  # noqa: E402
+from uia_worker import UIATarget  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+ROUNDS = 50
+CHARS = 50
+PAGE = 400
+
+
+def full_document_read(pattern: FakeTextPattern, chars_before: int, chars_after: int) -> tuple[str, str]:
+    """The pre-bounded strategy, kept here as the baseline."""
+    caret_range = pattern.GetSelection()[0]
+
+    before_range = pattern.DocumentRange.Clone()
+    before_range.MoveEndpointByRange(ENDPOINT_END, caret_range, ENDPOINT_START)
+    before = _sanitize_text(before_range.GetText(-1))[-chars_before:]
+
+    after_range = pattern.DocumentRange.Clone()
+    after_range.MoveEndpointByRange(ENDPOINT_START, caret_range, ENDPOINT_END)
+    after = _sanitize_text(after_range.GetText(-1))[:chars_after]
+    return before, after
+
+
+def make_document(size: int) -> FakeDocument:
+    line = "GhostWriter 測試 line with some text ￼ and more words.\n"
+    text = (line * (size // len(line) + 1))[:size]
+    return FakeDocument(text=text, caret=size // 2)
+
+
+def measure(fn, doc: FakeDocument) -> tuple[float, float]:
+    doc.chars_read = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    return elapsed * 1000.0, doc.chars_read / ROUNDS
+
+
+def main() -> None:
+    backend = WindowsUIABackend()
+    print(f"{'doc chars':>10} | {'full ms':>9} {'full read':>10} | {'bounded ms':>10} {'bounded read':>12} | {'page ms':>8} {'page read':>9}")
+    print("-" * 84)
+    for size in SIZES:
+        doc = make_document(size)
+        pattern = FakeTextPattern(doc)
+        target = UIATarget(doc, pattern, "text", "bench")
+
+        full_ms, full_read = measure(lambda: full_document_read(pattern, CHARS, CHARS), doc)
+        bounded_ms, bounded_read = measure(lambda: backend.read_context(target, CHARS, CHARS), doc)
+
+        # Both strategies must agree on the visible window.
+        expected = full_document_read(pattern, CHARS, CHARS)
+        ctx = backend.read_context(target, CHARS, CHARS)
+        assert (ctx["before"], ctx["after"]) == expected, (size, ctx, expected)
+
+        # A page a quarter of the document before the caret
+        offset = -(size // 4)
+        page_ms, page_read = measure(lambda: backend.read_page(target, offset, PAGE), doc)
+        page = backend.read_page(target, offset, PAGE)
+        start = doc.caret + offset
+        # (a page before the caret stops at the caret)
+        assert page["text"] == _sanitize_text(doc.text[start:start + min(PAGE, -offset)]), size
+
+        print(
+            f"{size:>10} | {full_ms:>9.3f} {full_read:>10.0f} | {bounded_ms:>10.3f} {bounded_read:>12.0f}"
+            f" | {page_ms:>8.3f} {page_read:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
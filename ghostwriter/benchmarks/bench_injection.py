@@ -0,0 +1,102 @@
+"""Injection backend throughput benchmark.
+
+Types ASCII, CJK and mixed samples through each requested backend and
+prints characters per second from injector.injection_stats().  Real
+backends type into whatever window has focus: run under Xvfb (xtest) or
+with an empty Notepad focused (sendinput/pyautogui).
+
+`--plan` instead compares the old all-or-nothing path choice with the
+injection planner on a pyautogui-like fake (ASCII-only typing with a
+per-character delay, Ctrl+V into a fake clipboard with a per-call delay)
+and checks the document ends up with exactly the injected text.
+
+Usage (from the ghostwriter directory):
+    python benchmarks/bench_injection.py [backend ...]   # default: recording
+    python benchmarks/bench_injection.py --plan
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clipboard_session  # noqa: E402
+import injector  # noqa: E402
+from fakes import FakeClipboard, FakeDocument, RecordingBackend  # noqa: E402
+
+SAMPLES = {
+    "ascii": "The quick brown fox jumps over the lazy dog. " * 4,
+    "cjk": "手機變成電腦的第二鍵盤與智慧觸控板，語音輸入的神器。" * 4,
+    "mixed": "Meeting at 3pm 在會議室 with the 設計團隊 😀 ok. " * 4,
+}
+ROUNDS = 20
+
+
+def run(name: str) -> None:
+    backend = injector.create_backend(name)
+    injector.set_backend(backend)
+    injector._throughput.clear()
+    for label, text in SAMPLES.items():
+        for _ in range(ROUNDS):
+            result = injector.inject_text(text)
+            if not result.get("ok"):
+                print(f"  {name}/{label}: FAILED {result}")
+                return
+        stats = injector.injection_stats()
+        path = result["mode"]
+        print(f"  {name:<10} {label:<6} via {path:<10} {stats[path]['chars_per_sec']:>12,.0f} chars/s")
+        injector._throughput.clear()
+    injector.set_backend(None)
+
+
+PLAN_SAMPLES = {
+    "char": "a",
+    "word": "hello ",
+    "ascii": "The quick brown fox jumps over the lazy dog.",
+    "cjk": "第二鍵盤與智慧觸控板",
+    "mixed": "Meeting at 3pm 在會議室 with the 設計團隊 😀 ok.",
+    "emoji": "Sounds good to me, see you at the station tomorrow 👍",
+}
+PLAN_ROUNDS = 8
+
+
+def run_plan() -> None:
+    """Old path choice vs planner on a pyautogui-like fake backend."""
+    clipboard = FakeClipboard()
+    clipboard_session.set_clipboard_session(clipboard_session.ClipboardSession(clipboard, idle_timeout=0.05))
+    print(f"  {'sample':<6} {'chars':>5} {'old ms':>8} {'plan ms':>8}  plan")
+    for label, text in PLAN_SAMPLES.items():
+        row = []
+        for planner in (False, True):
+            injector.INJECT_PLANNER = planner
+            injector.cost_model = injector.CostModel()
+            doc = FakeDocument(text="")
+            # ~pyautogui.write at interval=0.002 and a 12 ms clipboard round trip
+            backend = RecordingBackend(doc, per_call=0.012, per_char=0.002, unicode_native=False, clipboard=clipboard)
+            injector.set_backend(backend)
+            t0 = time.perf_counter()
+            for _ in range(PLAN_ROUNDS):
+                result = injector.inject_text(text, app="bench")
+                assert result.get("ok"), result
+            row.append((time.perf_counter() - t0) * 1000 / PLAN_ROUNDS)
+            assert doc.text == text * PLAN_ROUNDS, (label, planner, doc.text)
+        shown = " + ".join(f"{path}:{len(part)}" for path, part in injector.cost_model.plan(text, backend, "bench"))
+        print(f"  {label:<6} {len(text):>5} {row[0]:>8.1f} {row[1]:>8.1f}  {shown}")
+    injector.set_backend(None)
+    clipboard_session.set_clipboard_session(None)
+
+
+def main() -> None:
+    if sys.argv[1:] == ["--plan"]:
+        run_plan()
+        return
+    names = sys.argv[1:] or ["recording"]
+    for name in names:
+        run(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+"""End-to-end server benchmark on a plain Linux box.
+
+Runs the real server.py Socket.IO app on a local port with fakes in place
+of the desktop: a RecordingBackend editing a FakeDocument stands in for
+inject_text, and a FakeContextProvider over the same document stands in
+for get_cursor_context.  Both take configurable latency.  A scripted
+client (benchmarks/sio_client.py, same protocol as static/sio4lite.js)
+replays typing, dictation, backspace and revise traces and measures, per
+trace:
+
+  - events/s from first send to last trace reply
+  - end-to-end latency (send -> `trace` event) p50/p95/p99
+  - context_update count, and how many real (fake) context grabs ran; with
+    SHADOW_CONTEXT=1 (the default) most updates come from the shadow copy
+  - thread count and memory (RSS; Python heap with --heap) sampled over time;
+    Engine.IO ping tasks of closed connections linger up to ping_interval
+    (25 s), so back-to-back runs show one extra thread each
+  - keystrokes the fake backend received (characters typed + keys pressed)
+  - whether the fake document ended up with the expected text (with
+    --clients N, N clients replay the trace at once into the same document;
+    their words may interleave but never their letters, so the check is
+    that the document holds the same words as N copies of the expected
+    text.  The backspace trace cannot pass this: every client deletes at
+    the one shared caret, whoever typed the text in front of it; nor can
+    revise, where one client's utterance interrupts another's)
+
+Usage (from the ghostwriter directory):
+    python benchmarks/bench_server.py [trace ...] [--mode threading|asgi|both]
+        [--protocol events|ops] [--speed 0] [--inject-ms 2] [--per-char-ms 0]
+        [--grab-ms 5] [--repeat 3] [--clients 1] [--heap] [--json out.json]
+
+--protocol events sends one text_input/key_command event per trace step;
+ops batches them like static/app.js does (binary edit_ops, at most two
+batches in flight, coalescing while it waits) and times each step until
+the ops_ack of the batch that carried it.
+
+--mode both runs each server mode in its own process, one after the other;
+with --inject-ms 0 --grab-ms 0 the difference is per-event server overhead.
+--heap turns on tracemalloc, which slows every allocation several-fold, so
+leave it off when comparing throughput.
+
+--speed scales the recorded inter-event delays (1 = real time, 0 = as fast
+as possible).  Traces: typing, dictation, backspace, revise, revise-keys
+(default: all).  revise replays a speech recognizer's interim hypotheses
+as `dictation` events (the server types only what changed); revise-keys
+sends the same hypotheses the old way, as backspaces plus retyped text.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("INJECT_BACKEND", "recording")
+# The fakes below are installed in this process, so keep desktop calls here
+os.environ["DESKTOP_WORKER"] = "0"
+
+import asgi_server  # noqa: E402
+import injector  # noqa: E402
+import server  # noqa: E402
+from edit_ops import EditBatch, EditOp, encode_batch  # noqa: E402
+from dictation import tail_diff  # noqa: E402
+from fakes import FakeContextProvider, FakeDocument, RecordingBackend  # noqa: E402
+from metrics import metrics  # noqa: E402
+from sio_client import SioClient  # noqa: E402
+from timing import wait_until  # noqa: E402
+
+# (delay before sending in seconds, event, payload)
+Event = Tuple[float, str, Dict[str, Any]]
+
+SENTENCE = "The quick brown fox jumps over the lazy dog while 手機 types into the PC. "
+# Interim hypotheses of a speech recognizer, one list per utterance
+UTTERANCES = [
+    ["I", "I scream", "ice cream", "ice cream for", "ice cream for desert", "Ice cream for dessert."],
+    ["meet", "meet me", "meet me at", "meet me at 3", "meet me at three", "meet me at three p", "Meet me at 3 PM."],
+    ["今天", "今天天氣", "今天天氣很好", "今天天氣很好。"],
+    ["send the", "send the notes", "send the notes to every", "send the notes to everyone", "Send the notes to everyone."],
+]
+DICTATION = (
+    "今天下午三點 在會議室 跟設計團隊 討論 新版首頁 的配色 and the onboarding flow "
+    "please send the notes to everyone 謝謝"
+).split()
+
+
+# ── Traces ───────────────────────────────────────────────────
+
+def typing_trace(rounds: int = 4, cadence: float = 0.06, seed: int = 7) -> List[Event]:
+    """Char-by-char stream typing with occasional typo + backspace."""
+    rng = random.Random(seed)
+    events: List[Event] = []
+    for _ in range(rounds):
+        for ch in SENTENCE:
+            if rng.random() < 0.08:
+                events.append((cadence, "text_input", {"text": "x", "mode": "stream"}))
+                events.append((cadence * 2, "key_command", {"key": "backspace"}))
+            events.append((cadence * rng.uniform(0.5, 1.5), "text_input", {"text": ch, "mode": "stream"}))
+    return events
+
+
+def dictation_trace(rounds: int = 6, pause: float = 0.4) -> List[Event]:
+    """Voice input: phrases of a few words committed in one payload each."""
+    events: List[Event] = []
+    for _ in range(rounds):
+        for i in range(0, len(DICTATION), 3):
+            phrase = " ".join(DICTATION[i:i + 3]) + " "
+            events.append((pause, "text_input", {"text": phrase, "mode": "batch"}))
+    return events
+
+
+def backspace_trace(rounds: int = 6, burst: int = 40, cadence: float = 0.03) -> List[Event]:
+    """Type a burst, then hold backspace over most of it."""
+    events: List[Event] = []
+    for _ in range(rounds):
+        events.append((0.2, "text_input", {"text": SENTENCE[:burst], "mode": "batch"}))
+        for _ in range(burst - 5):
+            events.append((cadence, "key_command", {"key": "backspace"}))
+    return events
+
+
+def hypotheses(rounds: int) -> List[Tuple[str, str, bool]]:
+    """(utterance id, hypothesis, final) in the order a recognizer emits them."""
+    steps = []
+    for r in range(rounds):
+        for j, utterance in enumerate(UTTERANCES):
+            for k, text in enumerate(utterance):
+                final = k == len(utterance) - 1
+                steps.append((f"{r}.{j}", text + " " if final else text, final))
+    return steps
+
+
+def revise_trace(rounds: int = 4, cadence: float = 0.12) -> List[Event]:
+    """Dictation mode: every interim hypothesis sent whole."""
+    return [(cadence, "dictation", {"u": u, "text": text, "final": final}) for u, text, final in hypotheses(rounds)]
+
+
+def revise_keys_trace(rounds: int = 4, cadence: float = 0.12) -> List[Event]:
+    """The same hypotheses as stream-mode backspaces and retyped text."""
+    events: List[Event] = []
+    typed: Dict[str, str] = {}
+    for u, text, _ in hypotheses(rounds):
+        deleted, inserted = tail_diff(typed.get(u, ""), text)
+        typed[u] = text
+        delay = cadence
+        for _ in range(deleted):
+            events.append((delay, "key_command", {"key": "backspace"}))
+            delay = 0.0
+        if inserted:
+            events.append((delay, "text_input", {"text": inserted, "mode": "stream"}))
+    return events
+
+
+TRACES = {
+    "typing": typing_trace,
+    "dictation": dictation_trace,
+    "backspace": backspace_trace,
+    "revise": revise_trace,
+    "revise-keys": revise_keys_trace,
+}
+
+
+def words(text: str) -> List[str]:
+    """Latin words/numbers, plus every other non-space char on its own."""
+    return sorted(re.findall(r"[A-Za-z0-9]+|\S", text))
+
+
+def expected_text(events: List[Event]) -> str:
+    doc = FakeDocument()
+    backend = RecordingBackend(doc)
+    typed: Dict[str, str] = {}
+    for _, event, payload in events:
+        if event == "text_input":
+            backend.type_text(payload["text"])
+        elif event == "key_command":
+            backend.press(payload["key"])
+        elif event == "dictation":
+            deleted, inserted = tail_diff(typed.get(payload["u"], ""), payload["text"])
+            typed[payload["u"]] = payload["text"]
+            if deleted:
+                backend.press("backspace", deleted)
+            backend.type_text(inserted)
+    return doc.text
+
+
+def keystrokes(backend: RecordingBackend) -> int:
+    """Characters typed plus keys pressed (a chord counts once)."""
+    count = 0
+    for kind, arg in list(backend.calls):
+        count += len(arg) if kind == "type" else arg[1] if kind == "press" else 1
+    return count
+
+
+# ── Batched edit ops ─────────────────────────────────────────
+
+class EditSender:
+    """Client-side edit batching, as in static/app.js.
+
+    Steps are coalesced into the pending batch while `window` batches are
+    in flight; `on_acked(trace_ids)` is called for every acknowledged batch.
+    """
+
+    def __init__(self, client: SioClient, on_acked: Any, window: int = 2) -> None:
+        self.client = client
+        self.on_acked = on_acked
+        self.window = window
+        self.seq = 0
+        self.batches = 0
+        self.retries = 0
+        self._queue: List[EditOp] = []
+        self._queue_ids: List[int] = []
+        self._in_flight: Dict[int, Tuple[bytes, List[int]]] = {}
+        self._lock = threading.Lock()
+        self._retrying = False
+        client.on("ops_ack", self._on_ack)
+
+    def add(self, event: str, payload: Dict[str, Any], trace_id: int) -> None:
+        if event == "text_input":
+            op = EditOp("insert", text=payload["text"], mode=payload.get("mode", "stream"))
+        else:
+            op = EditOp("delete", direction="back", count=1)
+        with self._lock:
+            last = self._queue[-1] if self._queue else None
+            if last is not None and last.kind == op.kind == "insert" and last.mode == op.mode:
+                last.text += op.text
+            elif last is not None and last.kind == op.kind == "delete":
+                last.count += op.count
+            else:
+                self._queue.append(op)
+            self._queue_ids.append(trace_id)
+            self._pump()
+
+    def _pump(self) -> None:
+        while self._queue and not self._retrying and len(self._in_flight) < self.window:
+            self.seq += 1
+            data = encode_batch(EditBatch(self.seq, self._queue))
+            self._in_flight[self.seq] = (data, self._queue_ids)
+            self._queue, self._queue_ids = [], []
+            self.batches += 1
+            self.client.emit("edit_ops", data)
+
+    def _resend(self) -> None:
+        with self._lock:
+            self._retrying = False
+            for seq in sorted(self._in_flight):
+                self.client.emit("edit_ops", self._in_flight[seq][0])
+            self._pump()
+
+    def _on_ack(self, ack: Dict[str, Any]) -> None:
+        with self._lock:
+            if not ack.get("ok") and ack.get("code") in ("QUEUE_FULL", "OUT_OF_ORDER"):
+                if not self._retrying:
+                    self._retrying = True
+                    self.retries += 1
+                    threading.Timer(0.05, self._resend).start()
+                return
+            entry = self._in_flight.pop(ack.get("seq"), None)
+            self._pump()
+        if entry is not None:
+            self.on_acked(entry[1])
+
+
+# ── Sampling ─────────────────────────────────────────────────
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Sampler:
+    """Samples thread count and memory every `interval` seconds."""
+
+    def __init__(self, interval: float = 0.25) -> None:
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-sampler", daemon=True)
+        self._t0 = time.monotonic()
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> List[Dict[str, float]]:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while True:
+            heap, _ = tracemalloc.get_traced_memory()
+            self.samples.append({
+                "t": round(time.monotonic() - self._t0, 3),
+                "threads": threading.active_count(),
+                "rss_mb": round(rss_bytes() / 1e6, 2),
+                "heap_mb": round(heap / 1e6, 3),
+            })
+            if self._stop.wait(self.interval):
+                return
+
+
+# ── Runner ───────────────────────────────────────────────────
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str) -> str:
+    port = free_port()
+    if mode == "asgi":
+        target, args = asgi_server.serve, (server, "127.0.0.1", port)
+        kwargs: Dict[str, Any] = {}
+    else:
+        target, args = server.socketio.run, (server.app,)
+        kwargs = {"host": "127.0.0.1", "port": port, "allow_unsafe_werkzeug": True, "log_output": False,
+                  "request_handler": server.NoDelayRequestHandler}
+    thread = threading.Thread(target=target, args=args, kwargs=kwargs, name="bench-server", daemon=True)
+    thread.start()
+
+    def listening() -> bool:
+        with socket.socket() as s:
+            return s.connect_ex(("127.0.0.1", port)) == 0
+
+    if not wait_until(listening, 10.0, interval=0.05):
+        raise RuntimeError("server did not start")
+    return f"http://127.0.0.1:{port}"
+
+
+def run_trace(url: str, name: str, events: List[Event], args: argparse.Namespace) -> Dict[str, Any]:
+    doc = FakeDocument()
+    backend = RecordingBackend(doc, per_call=args.inject_ms / 1000, per_char=args.per_char_ms / 1000)
+    injector.set_backend(backend)
+    provider = FakeContextProvider(doc, latency=args.grab_ms / 1000)
+    server.set_context_provider(provider)
+
+    # Trace ids are unique across clients: client k sends k * len(events) + i
+    sent: Dict[int, float] = {}
+    latencies: List[float] = []
+    contexts = [0]
+    direct = [0]
+    last_reply = [0.0]
+    lock = threading.Lock()
+
+    def on_trace(payload: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        with lock:
+            for trace_id in payload.get("ids", []):
+                start = sent.pop(trace_id, None)
+                if start is not None:
+                    latencies.append((now - start) * 1000)
+            last_reply[0] = now
+
+    def on_context(payload: Any) -> None:
+        with lock:
+            contexts[0] += 1
+
+    clients = []
+    editors: List[EditSender] = []
+    for _ in range(args.clients):
+        client = SioClient(url)
+        client.on("context_update", on_context)
+        if args.protocol == "ops":
+            editors.append(EditSender(client, lambda ids: on_trace({"ids": ids})))
+        # Dictation events are traced like the old events in either protocol
+        client.on("trace", on_trace)
+        client.connect()
+        clients.append(client)
+
+    def replay(k: int, client: SioClient) -> None:
+        for i, (delay, event, payload) in enumerate(events):
+            if args.speed > 0:
+                time.sleep(delay / args.speed)
+            trace_id = k * len(events) + i
+            with lock:
+                sent[trace_id] = time.perf_counter()
+            if editors and event != "dictation":
+                editors[k].add(event, payload, trace_id)
+            else:
+                direct[0] += 1
+                client.emit(event, dict(payload, trace=trace_id, t=time.time() * 1000))
+
+    sampler = Sampler().start()
+    t0 = time.perf_counter()
+    senders = [
+        threading.Thread(target=replay, args=(k, client), name=f"bench-client-{k}", daemon=True)
+        for k, client in enumerate(clients)
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    send_done = time.perf_counter()
+
+    complete = wait_until(lambda: not sent, 30.0)
+    # Let trailing context grabs land before sampling the document
+    # (a post-inject grab may poll up to the 0.4 s inject_settle ceiling)
+    time.sleep(0.6 + args.grab_ms / 1000 * 2)
+    for client in clients:
+        client.close()
+    # Connection threads wind down after close; sample once they have
+    time.sleep(0.3)
+    samples = sampler.stop()
+
+    elapsed = max(last_reply[0], send_done) - t0
+    final = doc.text
+    expected = expected_text(events)
+    if args.clients > 1:
+        text_ok = words(final) == words(expected * args.clients)
+    else:
+        text_ok = final == expected
+    total = len(events) * args.clients
+    result = {
+        "trace": name,
+        "clients": args.clients,
+        "events": total,
+        "lost": len(sent),
+        "complete": complete,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+        "context_updates": contexts[0],
+        "grabs": provider.calls,
+        "keys": keystrokes(backend),
+        "batches": sum(e.batches for e in editors) + direct[0],
+        "retries": sum(e.retries for e in editors),
+        "threads_max": max(s["threads"] for s in samples),
+        "threads_end": samples[-1]["threads"],
+        "rss_mb_start": samples[0]["rss_mb"],
+        "rss_mb_end": samples[-1]["rss_mb"],
+        "heap_mb_max": max(s["heap_mb"] for s in samples),
+        "text_ok": text_ok,
+        "samples": samples,
+    }
+    return result
+
+
+def print_result(r: Dict[str, Any]) -> None:
+    print(
+        f"  {r['trace']:<11} {r['events']:>5} ev {r['events_per_s']:>8.1f} ev/s  "
+        f"p50 {r['p50_ms']:>7.2f}  p95 {r['p95_ms']:>7.2f}  p99 {r['p99_ms']:>7.2f} ms  "
+        f"ctx {r['context_updates']:>4}  grabs {r['grabs']:>4}  keys {r['keys']:>5}  msgs {r['batches']:>5}  threads {r['threads_max']:>3} (end {r['threads_end']})  "
+        f"rss {r['rss_mb_start']:.1f}->{r['rss_mb_end']:.1f} MB  "
+        + (f"heap<= {r['heap_mb_max']:.2f} MB  " if r['heap_mb_max'] else "") +
+        f"{'ok' if r['text_ok'] and r['complete'] else 'MISMATCH' if r['complete'] else 'LOST %d' % r['lost']}"
+    )
+
+
+def compare_modes(args: argparse.Namespace) -> None:
+    """Run each server mode in a fresh process so thread counts don't mix."""
+    for mode in ("threading", "asgi"):
+        cmd = [
+            sys.executable, os.path.abspath(__file__), *args.traces,
+            "--mode", mode,
+            "--protocol", args.protocol,
+            "--speed", str(args.speed),
+            "--inject-ms", str(args.inject_ms),
+            "--per-char-ms", str(args.per_char_ms),
+            "--grab-ms", str(args.grab_ms),
+            "--repeat", str(args.repeat),
+            "--clients", str(args.clients),
+        ]
+        if args.heap:
+            cmd.append("--heap")
+        if args.json:
+            root, ext = os.path.splitext(args.json)
+            cmd += ["--json", f"{root}.{mode}{ext or '.json'}"]
+        subprocess.run(cmd, check=False)
+        print()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("traces", nargs="*", help=f"any of {', '.join(TRACES)} (default: all)")
+    parser.add_argument("--mode", default="threading", choices=["threading", "asgi", "both"])
+    parser.add_argument("--protocol", default="events", choices=["events", "ops"])
+    parser.add_argument("--speed", type=float, default=0.0, help="delay scale, 0 = flat out")
+    parser.add_argument("--inject-ms", type=float, default=2.0, help="fake inject latency per call")
+    parser.add_argument("--per-char-ms", type=float, default=0.0, help="fake inject latency per char")
+    parser.add_argument("--grab-ms", type=float, default=5.0, help="fake context grab latency")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=1, help="clients replaying each trace at once")
+    parser.add_argument("--heap", action="store_true", help="trace Python heap size (slow)")
+    parser.add_argument("--json", help="write all results (with samples) to this file")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.traces if name not in TRACES]
+    if unknown:
+        parser.error(f"unknown trace(s): {', '.join(unknown)}")
+
+    if args.mode == "both":
+        compare_modes(args)
+        return
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    if args.heap:
+        tracemalloc.start()
+    url = start_server(args.mode)
+    print(
+        f"{args.mode} server {url}  inject {args.inject_ms} ms/call + {args.per_char_ms} ms/char  "
+        f"grab {args.grab_ms} ms  speed {args.speed or 'max'}  clients {args.clients}  protocol {args.protocol}"
+    )
+
+    results = []
+    for name in args.traces or list(TRACES):
+        events = TRACES[name]()
+        for _ in range(args.repeat):
+            result = run_trace(url, name, events, args)
+            print_result(result)
+            results.append(result)
+
+    latency = metrics.snapshot()
+    print("\nserver-side (all runs):")
+    for metric in ("uplink_ms", "queue_wait_ms", "inject_ms", "server_ms", "grab_ms", "emit_ms"):
+        for label, q in sorted(latency.get(metric, {}).items()):
+            print(f"  {metric:<14} {label:<16} n={q['count']:<6} p50 {q['p50']:>7.2f}  p95 {q['p95']:>7.2f}  p99 {q['p99']:>7.2f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "server": latency}, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
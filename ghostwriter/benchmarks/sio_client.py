@@ -0,0 +1,144 @@
+"""Scripted Engine.IO v4 / Socket.IO v4 client for benchmarks.
+
+Speaks the same subset as static/sio4lite.js: WebSocket transport only,
+"40" CONNECT, "42[event, data]" events, binary events for bytes payloads
+(or top-level bytes fields), answering pings with pongs.  Received events are handed to `on(event, fn)` callbacks on the
+reader thread.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import simple_websocket
+
+
+class SioClient:
+    def __init__(self, url: str) -> None:
+        # http://host:port -> ws://host:port/socket.io/?EIO=4&transport=websocket
+        base = url.rstrip("/").replace("http://", "ws://").replace("https://", "wss://")
+        self.url = base + "/socket.io/?EIO=4&transport=websocket"
+        self.sid: Optional[str] = None
+        self.connected = threading.Event()
+        self.closed = threading.Event()
+        self.received = 0
+        self._handlers: Dict[str, List[Callable[[Any], None]]] = {}
+        self._ws: Optional[simple_websocket.Client] = None
+        self._auth: Optional[Dict[str, Any]] = None
+        self._send_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Public API ───────────────────────────────────────────
+
+    def on(self, event: str, fn: Callable[[Any], None]) -> None:
+        self._handlers.setdefault(event, []).append(fn)
+
+    def connect(self, timeout: float = 5.0, auth: Optional[Dict[str, Any]] = None) -> None:
+        self._ws = simple_websocket.Client.connect(self.url)
+        # simple_websocket's handshake can read the server's first frame
+        # together with the 101 response and leave it parked until more
+        # bytes arrive; process anything already buffered.
+        self._ws.connected = self._ws._handle_events()
+        # Like browsers: binary events go out as two frames, which Nagle
+        # would otherwise hold back for the server's delayed ACK
+        self._ws.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._auth = auth
+        self._thread = threading.Thread(target=self._read_loop, name="sio-client", daemon=True)
+        self._thread.start()
+        if not self.connected.wait(timeout):
+            raise TimeoutError(f"Socket.IO connect to {self.url} timed out")
+
+    def emit(self, event: str, data: Any = None) -> None:
+        attachments: List[bytes] = []
+        if isinstance(data, bytes):
+            attachments.append(data)
+            data = {"_placeholder": True, "num": 0}
+        elif isinstance(data, dict) and any(isinstance(v, bytes) for v in data.values()):
+            data = dict(data)
+            for key, value in data.items():
+                if isinstance(value, bytes):
+                    data[key] = {"_placeholder": True, "num": len(attachments)}
+                    attachments.append(value)
+        packet = [event] if data is None else [event, data]
+        body = json.dumps(packet, ensure_ascii=False, separators=(",", ":"))
+        if not attachments:
+            self._send("42" + body)
+            return
+        with self._send_lock:
+            self._ws.send(f"45{len(attachments)}-" + body)
+            for attachment in attachments:
+                self._ws.send(attachment)
+
+    def close(self) -> None:
+        if self._ws is None:
+            return
+        try:
+            self._send("41")
+            self._ws.close()
+        except Exception:
+            pass
+        self.closed.wait(2.0)
+
+    # ── Internals ────────────────────────────────────────────
+
+    def _send(self, frame: str) -> None:
+        with self._send_lock:
+            self._ws.send(frame)
+
+    def _dispatch(self, event: str, data: Any) -> None:
+        for fn in self._handlers.get(event, []):
+            fn(data)
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                frame = self._ws.receive()
+                if frame is None:
+                    break
+                if isinstance(frame, bytes):
+                    continue
+                self._handle_frame(frame)
+        except (simple_websocket.ConnectionClosed, OSError):
+            pass
+        finally:
+            self.connected.clear()
+            self.closed.set()
+            self._dispatch("disconnect", None)
+
+    def _handle_frame(self, frame: str) -> None:
+        kind = frame[:1]
+        if kind == "0":
+            # Engine.IO open -> Socket.IO CONNECT
+            connect = "40" if self._auth is None else "40" + json.dumps(self._auth)
+            self._send(connect)
+        elif kind == "2":
+            self._send("3")
+        elif kind == "1":
+            self._ws.close()
+        elif kind == "4":
+            self._handle_packet(frame[1:])
+
+    def _handle_packet(self, packet: str) -> None:
+        kind = packet[:1]
+        if kind == "0":
+            try:
+                self.sid = json.loads(packet[1:]).get("sid")
+            except ValueError:
+                pass
+            self.connected.set()
+            self._dispatch("connect", None)
+        elif kind == "1":
+            self._ws.close()
+        elif kind == "2":
+            try:
+                payload = json.loads(packet[1:])
+            except ValueError:
+                return
+            self.received += 1
+            self._dispatch(payload[0], payload[1] if len(payload) > 1 else None)
+        elif kind == "4":
+            self._dispatch("connect_error", packet[1:])
+
@@ -0,0 +1,413 @@
+"""Shared clipboard ownership for GhostWriter.
+
+Pasting Unicode text and grabbing selections both borrow the user's
+clipboard.  Saving and restoring it around every single call means several
+clipboard round trips per second during a dictation burst.  A
+`ClipboardSession` takes the clipboard once, lets consecutive pastes and
+grabs reuse it, and restores the original contents (all formats, not just
+text) once the clipboard has been idle for `idle_timeout` seconds.
+
+If the user copies something while we hold the clipboard, their copy wins:
+after the last hold the restore is skipped, and between two holds their
+contents are snapshotted in place of the original, so the next paste does
+not wipe them and the eventual restore brings them back.
+
+The restore is pending in this process until it runs.  A `listener` is
+told what it would restore, so that if the process is killed meanwhile
+(the desktop worker, see worker_process.py) another one can `adopt` it.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import pyperclip
+
+try:
+    from .timing import wait_until
+except ImportError:
+    from timing import wait_until
+
+log = logging.getLogger("ghostwriter.clipboard")
+
+
+class ClipboardBackend(ABC):
+    """Raw clipboard access used by `ClipboardSession`."""
+
+    @abstractmethod
+    def snapshot(self) -> Any:
+        """Capture the current contents (opaque; passed back to restore)."""
+
+    @abstractmethod
+    def restore(self, snapshot: Any) -> None:
+        """Put back contents captured by `snapshot`."""
+
+    @abstractmethod
+    def get_text(self) -> str:
+        """Current text contents ("" if there is no text)."""
+
+    @abstractmethod
+    def set_text(self, text: str) -> None:
+        """Replace the contents with `text`."""
+
+    def sequence(self) -> Optional[int]:
+        """Change counter of the clipboard, or None if the platform has none."""
+        return None
+
+
+class PyperclipBackend(ClipboardBackend):
+    """Text-only clipboard via pyperclip (non-Windows fallback)."""
+
+    def snapshot(self) -> Any:
+        return pyperclip.paste()
+
+    def restore(self, snapshot: Any) -> None:
+        pyperclip.copy(snapshot or "")
+
+    def get_text(self) -> str:
+        return pyperclip.paste() or ""
+
+    def set_text(self, text: str) -> None:
+        pyperclip.copy(text)
+
+
+class WindowsClipboardBackend(ClipboardBackend):  # pragma: no cover - Windows only
+    """Win32 clipboard via ctypes; snapshots every HGLOBAL-backed format,
+    plus enhanced metafiles (copied out as their bits)."""
+
+    CF_UNICODETEXT = 13
+    CF_ENHMETAFILE = 14
+    GMEM_MOVEABLE = 0x0002
+    # Formats whose data is a GDI/handle object, not plain global memory.
+    # Windows re-synthesizes CF_BITMAP from CF_DIB and CF_METAFILEPICT from
+    # CF_ENHMETAFILE, which is snapshotted separately; the palette and the
+    # display-only formats are dropped.
+    HANDLE_FORMATS = {2, 3, 9, 0x80, 0x82, 0x83, 0x8E}
+    # CF_PRIVATEFIRST..LAST and CF_GDIOBJFIRST..LAST: owner-defined handles
+    PRIVATE_RANGES = (range(0x0200, 0x0300), range(0x0300, 0x0400))
+    OPEN_RETRIES = 20
+
+    def __init__(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        self._ctypes = ctypes
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._user32.GetClipboardData.restype = wintypes.HANDLE
+        self._user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+        self._user32.SetClipboardData.restype = wintypes.HANDLE
+        self._user32.GetClipboardSequenceNumber.restype = wintypes.DWORD
+        self._kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        self._kernel32.GlobalLock.restype = ctypes.c_void_p
+        self._kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+        self._kernel32.GlobalSize.argtypes = [wintypes.HGLOBAL]
+        self._kernel32.GlobalSize.restype = ctypes.c_size_t
+        self._kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        self._kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+        self._kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+        self._kernel32.GlobalFree.restype = wintypes.HGLOBAL
+        self._gdi32 = ctypes.windll.gdi32
+        self._gdi32.GetEnhMetaFileBits.argtypes = [wintypes.HANDLE, wintypes.UINT, ctypes.c_void_p]
+        self._gdi32.GetEnhMetaFileBits.restype = wintypes.UINT
+        self._gdi32.SetEnhMetaFileBits.argtypes = [wintypes.UINT, ctypes.c_char_p]
+        self._gdi32.SetEnhMetaFileBits.restype = wintypes.HANDLE
+        self._gdi32.DeleteEnhMetaFile.argtypes = [wintypes.HANDLE]
+
+    @contextmanager
+    def _opened(self) -> Iterator[None]:
+        for _ in range(self.OPEN_RETRIES):
+            if self._user32.OpenClipboard(None):
+                break
+            # Another process holds the clipboard; it is released within ms
+            time.sleep(0.005)
+        else:
+            raise OSError("OpenClipboard failed")
+        try:
+            yield
+        finally:
+            self._user32.CloseClipboard()
+
+    def _copyable(self, fmt: int) -> bool:
+        if fmt in self.HANDLE_FORMATS:
+            return False
+        return not any(fmt in private for private in self.PRIVATE_RANGES)
+
+    def _read(self, fmt: int) -> Optional[bytes]:
+        handle = self._user32.GetClipboardData(fmt)
+        if not handle:
+            return None
+        if fmt == self.CF_ENHMETAFILE:
+            size = self._gdi32.GetEnhMetaFileBits(handle, 0, None)
+            if not size:
+                return None
+            buf = self._ctypes.create_string_buffer(size)
+            if not self._gdi32.GetEnhMetaFileBits(handle, size, buf):
+                return None
+            return buf.raw
+        size = self._kernel32.GlobalSize(handle)
+        ptr = self._kernel32.GlobalLock(handle)
+        if not ptr:
+            return None
+        try:
+            return self._ctypes.string_at(ptr, size)
+        finally:
+            self._kernel32.GlobalUnlock(handle)
+
+    def _write(self, fmt: int, data: bytes) -> bool:
+        """Put `data` on the open clipboard as `fmt`; False if Windows refused."""
+        if fmt == self.CF_ENHMETAFILE:
+            emf = self._gdi32.SetEnhMetaFileBits(len(data), data)
+            if not emf:
+                return False
+            if not self._user32.SetClipboardData(fmt, emf):
+                self._gdi32.DeleteEnhMetaFile(emf)
+                return False
+            return True
+        handle = self._kernel32.GlobalAlloc(self.GMEM_MOVEABLE, max(len(data), 1))
+        if not handle:
+            return False
+        ptr = self._kernel32.GlobalLock(handle)
+        if not ptr:
+            self._kernel32.GlobalFree(handle)
+            return False
+        self._ctypes.memmove(ptr, data, len(data))
+        self._kernel32.GlobalUnlock(handle)
+        # The clipboard owns the memory once SetClipboardData succeeds
+        if not self._user32.SetClipboardData(fmt, handle):
+            self._kernel32.GlobalFree(handle)
+            return False
+        return True
+
+    def snapshot(self) -> Any:
+        formats: List[Tuple[int, bytes]] = []
+        with self._opened():
+            fmt = self._user32.EnumClipboardFormats(0)
+            while fmt:
+                if self._copyable(fmt):
+                    data = self._read(fmt)
+                    if data is not None:
+                        formats.append((fmt, data))
+                fmt = self._user32.EnumClipboardFormats(fmt)
+        return formats
+
+    def restore(self, snapshot: Any) -> None:
+        with self._opened():
+            self._user32.EmptyClipboard()
+            failed = [fmt for fmt, data in snapshot or [] if not self._write(fmt, data)]
+        if failed:
+            log.warning(f"[clipboard] could not restore formats {failed}")
+
+    def get_text(self) -> str:
+        with self._opened():
+            data = self._read(self.CF_UNICODETEXT)
+        if not data:
+            return ""
+        return data.decode("utf-16-le", errors="ignore").split("\x00", 1)[0]
+
+    def set_text(self, text: str) -> None:
+        with self._opened():
+            self._user32.EmptyClipboard()
+            if not self._write(self.CF_UNICODETEXT, (text + "\x00").encode("utf-16-le")):
+                raise OSError("SetClipboardData failed")
+
+    def sequence(self) -> Optional[int]:
+        return int(self._user32.GetClipboardSequenceNumber())
+
+
+class ClipboardSession:
+    """Holds the clipboard across a burst and restores it once when idle."""
+
+    def __init__(self, backend: Optional[ClipboardBackend] = None, idle_timeout: float = 1.5) -> None:
+        self.backend = backend or PyperclipBackend()
+        self.idle_timeout = idle_timeout
+        self._lock = threading.RLock()
+        self._owned = False
+        self._saved: Any = None
+        self._last_seq: Optional[int] = None
+        self._last_text: Optional[str] = None
+        self._timer: Optional[threading.Timer] = None
+        # listener(key, value): "saved" is the snapshot a restore would put
+        # back (None once none is pending); "left" is (sequence, text) of what
+        # the last hold left on the clipboard (None while a hold writes to it)
+        self.listener: Optional[Callable[[str, Any], None]] = None
+
+        self.holds = 0
+        self.saves = 0
+        self.restores = 0
+        self.skipped_restores = 0
+
+    @contextmanager
+    def hold(self) -> Iterator["ClipboardSession"]:
+        """Borrow the clipboard for one paste/grab; serialises clipboard users."""
+        with self._lock:
+            # A pending restore timer means we are between holds (not nested)
+            between = self._timer is not None
+            self._cancel_timer()
+            if self._owned and between and self._changed_by_user():
+                # The user copied something since our last paste/grab; that
+                # is what to give back now, not the pre-session contents
+                log.info("[clipboard] changed by user between holds, re-saving")
+                self._owned = False
+                self.skipped_restores += 1
+            if not self._owned:
+                try:
+                    self._saved = self.backend.snapshot()
+                except Exception as exc:
+                    log.debug(f"[clipboard] snapshot failed: {exc}")
+                    self._saved = None
+                self._owned = True
+                self.saves += 1
+                self._notify("saved", self._saved)
+            self.holds += 1
+            self._notify("left", None)
+            try:
+                yield self
+            finally:
+                # Remember what we left behind so a later user copy is detectable
+                self._last_seq = self.backend.sequence()
+                if self._last_seq is None:
+                    try:
+                        self._last_text = self.backend.get_text()
+                    except Exception:
+                        self._last_text = None
+                self._notify("left", (self._last_seq, self._last_text))
+                self._schedule_restore()
+
+    def get_text(self) -> str:
+        return self.backend.get_text()
+
+    def set_text(self, text: str) -> None:
+        self.backend.set_text(text)
+
+    def sequence(self) -> Optional[int]:
+        return self.backend.sequence()
+
+    def marker(self) -> Tuple[str, Any]:
+        """Cheap token describing the current contents, for `wait_for_change`."""
+        seq = self.backend.sequence()
+        if seq is not None:
+            return ("seq", seq)
+        return ("text", self.backend.get_text())
+
+    def wait_for_change(self, marker: Tuple[str, Any], timeout: float) -> bool:
+        """Poll until the clipboard differs from `marker` or `timeout` passes."""
+        kind, value = marker
+        if kind == "seq":
+            return wait_until(lambda: self.backend.sequence() != value, timeout)
+        # Text polling goes through pyperclip (a subprocess on Linux): go slower
+        return wait_until(lambda: self.backend.get_text() != value, timeout, interval=0.01)
+
+    def flush(self) -> None:
+        """Restore the original clipboard now if we still hold it."""
+        with self._lock:
+            self._cancel_timer()
+            self._restore_locked()
+
+    def adopt(self, saved: Any, left: Optional[Tuple[Optional[int], Optional[str]]]) -> None:
+        """Run a restore another process left pending when it died.
+
+        `saved` and `left` are the last values its listener reported.  The
+        user's own copy since `left` still wins; with `left` None the other
+        process died mid-hold, so the clipboard is ours to put back.
+        """
+        with self._lock:
+            if self._owned or saved is None:
+                return
+            self._owned, self._saved = True, saved
+            self._last_seq, self._last_text = left if left is not None else (None, None)
+            self._restore_locked()
+
+    def stats(self) -> dict:
+        return {
+            "owned": self._owned,
+            "holds": self.holds,
+            "saves": self.saves,
+            "restores": self.restores,
+            "skipped_restores": self.skipped_restores,
+        }
+
+    # ── Internals ────────────────────────────────────────────
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_restore(self) -> None:
+        self._timer = threading.Timer(self.idle_timeout, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _notify(self, key: str, value: Any) -> None:
+        if self.listener is None:
+            return
+        try:
+            self.listener(key, value)
+        except Exception as exc:
+            log.debug(f"[clipboard] listener failed: {exc}")
+
+    def _changed_by_user(self) -> bool:
+        seq = self.backend.sequence()
+        if seq is not None and self._last_seq is not None:
+            return seq != self._last_seq
+        if self._last_text is None:
+            return False
+        try:
+            return self.backend.get_text() != self._last_text
+        except Exception:
+            return False
+
+    def _restore_locked(self) -> None:
+        if not self._owned:
+            return
+        try:
+            if self._changed_by_user():
+                self.skipped_restores += 1
+                log.info("[clipboard] changed by user during session, not restoring")
+            elif self._saved is not None:
+                self.backend.restore(self._saved)
+                self.restores += 1
+        except Exception as exc:
+            log.warning(f"[clipboard] restore failed: {exc}")
+        finally:
+            self._owned = False
+            self._saved = None
+            self._last_seq = None
+            self._last_text = None
+            self._notify("saved", None)
+
+
+_session: Optional[ClipboardSession] = None
+_session_lock = threading.Lock()
+
+
+def get_clipboard_session() -> ClipboardSession:
+    """Return the process-wide session shared by injector and context_grabber."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            backend: ClipboardBackend
+            if sys.platform == "win32":
+                backend = WindowsClipboardBackend()
+            else:
+                backend = PyperclipBackend()
+            _session = ClipboardSession(backend)
+            atexit.register(_session.flush)
+        return _session
+
+
+def set_clipboard_session(session: Optional[ClipboardSession]) -> None:
+    """Replace the shared session (None re-creates it on next use)."""
+    global _session
+    with _session_lock:
+        if _session is not None and _session is not session:
+            _session.flush()
+        _session = session
@@ -0,0 +1,202 @@
+"""Event-driven context change notifications for GhostWriter.
+
+Instead of the phone polling for context, an event source reports when the
+foreground target changed (focus moved, text edited, selection/caret
+moved).  Events are throttled and turned into context grabs by the server,
+and the delta sync only emits when the grabbed context actually differs.
+
+Event kinds passed to callbacks: "focus", "text", "selection".
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Set
+
+log = logging.getLogger("ghostwriter.events")
+
+EventCallback = Callable[[str], None]
+
+
+class ContextEventSource(ABC):
+    """Produces target-change events.  `start` must not block."""
+
+    @abstractmethod
+    def start(self, callback: EventCallback) -> None:
+        """Begin calling `callback(kind)` for each event."""
+
+    @abstractmethod
+    def stop(self) -> None:
+        """Stop delivering events."""
+
+
+class EventThrottle:
+    """Collapse bursts of events into at most one call per `interval` seconds.
+
+    The first event of a quiet period fires immediately; events inside the
+    window are merged into one trailing call with the union of their kinds.
+    """
+
+    def __init__(self, callback: Callable[[Set[str]], None], interval: float = 0.15) -> None:
+        self._callback = callback
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._last_fire = 0.0
+        self._pending: Set[str] = set()
+        self._timer: Optional[threading.Timer] = None
+        self.received = 0
+        self.fired = 0
+
+    def __call__(self, kind: str) -> None:
+        with self._lock:
+            self.received += 1
+            self._pending.add(kind)
+            if self._timer is not None:
+                return
+            wait = self._last_fire + self._interval - time.monotonic()
+            if wait > 0:
+                self._timer = threading.Timer(wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            kinds = self._pending
+            self._pending = set()
+            if not kinds:
+                return
+            self._last_fire = time.monotonic()
+            self.fired += 1
+        try:
+            self._callback(kinds)
+        except Exception as exc:
+            log.warning(f"[events] callback failed: {exc}")
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = set()
+
+
+class WinEventSource(ContextEventSource):
+    """Foreground focus/text/selection events via SetWinEventHook.
+
+    WinEvents are the out-of-process feed UI Automation itself proxies for
+    Win32 and most browser/Office controls.  Only events belonging to the
+    foreground window are forwarded.
+    """
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_FOCUS = 0x8005
+    EVENT_OBJECT_LOCATIONCHANGE = 0x800B
+    EVENT_OBJECT_VALUECHANGE = 0x800E
+    EVENT_OBJECT_TEXTSELECTIONCHANGED = 0x8014
+    OBJID_CARET = -8
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+    WM_QUIT = 0x0012
+    GA_ROOT = 2
+
+    def __init__(self) -> None:
+        self._callback: Optional[EventCallback] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id = 0
+        self._proc = None  # keep the ctypes callback alive
+
+    def start(self, callback: EventCallback) -> None:
+        if self._thread is not None:
+            return
+        self._callback = callback
+        self._thread = threading.Thread(target=self._run, name="ghostwriter-winevents", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        self._thread = None
+        if thread is None or not self._thread_id:
+            return
+        import ctypes
+        ctypes.windll.user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+        thread.join(timeout=2.0)
+
+    def _classify(self, event: int, id_object: int) -> Optional[str]:
+        if event in (self.EVENT_SYSTEM_FOREGROUND, self.EVENT_OBJECT_FOCUS):
+            return "focus"
+        if event == self.EVENT_OBJECT_VALUECHANGE:
+            return "text"
+        if event == self.EVENT_OBJECT_TEXTSELECTIONCHANGED:
+            return "selection"
+        if event == self.EVENT_OBJECT_LOCATIONCHANGE and id_object == self.OBJID_CARET:
+            return "selection"
+        return None
+
+    def _run(self) -> None:  # pragma: no cover - Windows only
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        self._thread_id = kernel32.GetCurrentThreadId()
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None,
+            wintypes.HANDLE,
+            wintypes.DWORD,
+            wintypes.HWND,
+            wintypes.LONG,
+            wintypes.LONG,
+            wintypes.DWORD,
+            wintypes.DWORD,
+        )
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.GetAncestor.restype = wintypes.HWND
+        user32.GetForegroundWindow.restype = wintypes.HWND
+
+        def handle(hook, event, hwnd, id_object, id_child, thread, timestamp):
+            kind = self._classify(event, id_object)
+            if kind is None or self._callback is None:
+                return
+            if hwnd and kind != "focus":
+                if user32.GetAncestor(hwnd, self.GA_ROOT) != user32.GetForegroundWindow():
+                    return
+            self._callback(kind)
+
+        self._proc = WinEventProc(handle)
+        flags = self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS
+        hooks = [
+            user32.SetWinEventHook(self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, 0, self._proc, 0, 0, flags),
+            user32.SetWinEventHook(self.EVENT_OBJECT_FOCUS, self.EVENT_OBJECT_FOCUS, 0, self._proc, 0, 0, flags),
+            user32.SetWinEventHook(self.EVENT_OBJECT_LOCATIONCHANGE, self.EVENT_OBJECT_VALUECHANGE, 0, self._proc, 0, 0, flags),
+            user32.SetWinEventHook(self.EVENT_OBJECT_TEXTSELECTIONCHANGED, self.EVENT_OBJECT_TEXTSELECTIONCHANGED, 0, self._proc, 0, 0, flags),
+        ]
+        if not any(hooks):
+            log.warning("[events] SetWinEventHook failed, push mode disabled")
+            return
+        log.info("[events] WinEvent hooks installed")
+
+        # Out-of-context hooks are delivered through this thread's message loop
+        msg = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            for hook in hooks:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+
+
+def create_event_source() -> Optional[ContextEventSource]:
+    """Return the platform event source, or None if push mode is unavailable."""
+    if sys.platform == "win32":
+        return WinEventSource()
+    return None
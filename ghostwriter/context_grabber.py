@@ -9,12 +9,11 @@ Handles Windows cp950 encoding issues by sanitizing Unicode output.
 from __future__ import annotations
 
 import logging
+import os
+import threading
 import time
 import re
-from typing import Any, Dict
-
-import pyperclip
-import pyautogui
+from typing import Any, Dict, Hashable, Optional
 
 try:
     import uiautomation as auto
@@ -22,8 +21,35 @@ try:
 except ImportError:
     UIA_AVAILABLE = False
 
+try:
+    from .uia_worker import UIABackend, UIAStillRunning, UIATarget, UIAWorker
+    from .clipboard_session import get_clipboard_session
+    from .injector import get_backend, press_key
+    from .timing import profiles
+    from .strategy_cache import strategies
+except ImportError:
+    from uia_worker import UIABackend, UIAStillRunning, UIATarget, UIAWorker
+    from clipboard_session import get_clipboard_session
+    from injector import get_backend, press_key
+    from timing import profiles
+    from strategy_cache import strategies
+
 log = logging.getLogger("ghostwriter.context")
 
+# UIA enum values (TextPatternRangeEndpoint / TextUnit), usable without the
+# uiautomation package so the window reader also works on fake ranges.
+ENDPOINT_START = 0
+ENDPOINT_END = 1
+UNIT_CHARACTER = 0
+UNIT_LINE = 3
+
+# Tried in this order (the last one that worked for the app goes first)
+CONTEXT_STRATEGIES = ("uia", "clipboard")
+
+# Extra characters fetched on each side so that sanitizing (which drops
+# U+FFFC and friends) does not leave the window short.
+_WINDOW_SLACK = 8
+
 
 def _sanitize_text(text: str) -> str:
     """Remove problematic Unicode characters that crash cp950 encoding.
@@ -41,6 +67,93 @@ def _sanitize_text(text: str) -> str:
     return cleaned
 
 
+def _read_text_window(caret_range: Any, before: int, after: int, unit: int = UNIT_CHARACTER) -> tuple[str, str]:
+    """Read at most `before`/`after` units of text on each side of the caret.
+
+    Only the two small ranges next to the caret are materialised, so the
+    cost does not depend on the size of the document.  The explicit
+    waitTime=0 skips uiautomation's default 0.5 s sleep after each move.
+    """
+    by_char = unit == UNIT_CHARACTER
+    slack = _WINDOW_SLACK if by_char else 0
+
+    before_text = ""
+    if before > 0:
+        try:
+            rng = caret_range.Clone()
+            # Collapse onto caret start, then extend the start backwards
+            rng.MoveEndpointByRange(ENDPOINT_END, caret_range, ENDPOINT_START, waitTime=0)
+            rng.MoveEndpointByUnit(ENDPOINT_START, unit, -(before + slack), waitTime=0)
+            cleaned = _sanitize_text(rng.GetText(before + slack if by_char else -1))
+            before_text = cleaned[-before:] if by_char else cleaned
+        except Exception as e:
+            log.debug(f"Before text failed: {e}")
+
+    after_text = ""
+    if after > 0:
+        try:
+            rng = caret_range.Clone()
+            # Collapse onto caret end, then extend the end forwards
+            rng.MoveEndpointByRange(ENDPOINT_START, caret_range, ENDPOINT_END, waitTime=0)
+            rng.MoveEndpointByUnit(ENDPOINT_END, unit, after + slack, waitTime=0)
+            cleaned = _sanitize_text(rng.GetText(after + slack if by_char else -1))
+            after_text = cleaned[:after] if by_char else cleaned
+        except Exception as e:
+            log.debug(f"After text failed: {e}")
+
+    return before_text, after_text
+
+
+def _place_caret(caret_range: Any, offset: int) -> int:
+    """Move the caret `offset` characters with one TextRange move + select.
+
+    Negative offsets are measured from the start of the current selection,
+    others from its end, like pressing Left/Right on a selection.  One UIA
+    round trip regardless of distance, instead of one key event per char.
+    """
+    rng = caret_range.Clone()
+    if offset < 0:
+        rng.MoveEndpointByRange(ENDPOINT_END, caret_range, ENDPOINT_START, waitTime=0)
+    else:
+        rng.MoveEndpointByRange(ENDPOINT_START, caret_range, ENDPOINT_END, waitTime=0)
+    moved = rng.Move(UNIT_CHARACTER, offset, waitTime=0) if offset else 0
+    rng.Select(waitTime=0)
+    return moved
+
+
+def _read_text_page(caret_range: Any, offset: int, size: int) -> Dict[str, Any]:
+    """Read up to `size` characters starting `offset` characters from the caret.
+
+    Offsets count like `_place_caret`: negative ones back from the selection
+    start (a page never runs into the selection), others forward from its
+    end.  A move and one bounded GetText, wherever the page is.
+
+    `start`/`end` in the result are the document span really read, in the
+    same units as `offset` and as counted by the TextRange moves, not by
+    the returned text: sanitizing drops characters and the phone measures
+    strings in UTF-16, so it must chain pages on these, not on lengths.
+    `edge` is True when the page was cut short by the start or end of the
+    document.
+    """
+    rng = caret_range.Clone()
+    if offset < 0:
+        rng.MoveEndpointByRange(ENDPOINT_END, caret_range, ENDPOINT_START, waitTime=0)
+        size = min(size, -offset)
+    else:
+        rng.MoveEndpointByRange(ENDPOINT_START, caret_range, ENDPOINT_END, waitTime=0)
+    moved = rng.Move(UNIT_CHARACTER, offset, waitTime=0) if offset else 0
+    if offset >= 0 and moved < offset:
+        return {"start": moved, "end": moved, "text": "", "edge": True}
+    # Clamped at the document start: the page begins there instead
+    wanted = size - (moved - offset)
+    if wanted <= 0:
+        return {"start": moved, "end": moved, "text": "", "edge": True}
+    spanned = rng.MoveEndpointByUnit(ENDPOINT_END, UNIT_CHARACTER, wanted, waitTime=0)
+    raw = rng.GetText(wanted)
+    edge = moved != offset or (offset >= 0 and spanned < wanted)
+    return {"start": moved, "end": moved + spanned, "text": _sanitize_text(raw), "edge": edge}
+
+
 def _get_foreground_app_name() -> str:
     """Get the name of the foreground window."""
     try:
@@ -55,236 +168,443 @@ def _get_foreground_app_name() -> str:
         return "Unknown"
 
 
-def _grab_selected_text_clipboard() -> str:
-    """Grab currently selected text using clipboard (Ctrl+C)."""
+def _get_foreground_process_name() -> str:
+    """Executable name of the foreground window's process (e.g. "wechat.exe")."""
     try:
-        # Save current clipboard
-        original = ""
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        hwnd = user32.GetForegroundWindow()
+        pid = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        handle = kernel32.OpenProcess(0x1000, False, pid.value)  # QUERY_LIMITED_INFORMATION
+        if not handle:
+            return "unknown"
         try:
-            original = pyperclip.paste()
-        except Exception:
-            pass
+            size = wintypes.DWORD(260)
+            buf = ctypes.create_unicode_buffer(size.value)
+            if not kernel32.QueryFullProcessImageNameW(handle, 0, buf, ctypes.byref(size)):
+                return "unknown"
+            return os.path.basename(buf.value).lower()
+        finally:
+            kernel32.CloseHandle(handle)
+    except Exception:
+        return "unknown"
 
-        # Clear clipboard then copy selection
-        pyperclip.copy("")
-        time.sleep(0.02)
-        pyautogui.hotkey("ctrl", "c")
-        time.sleep(0.12)  # Wait for clipboard to populate
 
-        selected = pyperclip.paste()
+def foreground_process() -> str:
+    """Executable name of the foreground app ("unknown" where it can't be read)."""
+    return _get_foreground_process_name()
 
-        # Restore original clipboard
-        try:
-            pyperclip.copy(original)
-        except Exception:
-            pass
 
-        return _sanitize_text(selected) if selected else ""
+def _get_focus_window() -> tuple[str, int]:
+    """Class name and handle of the focused window (e.g. "RICHEDIT50W").
+
+    Read with GetGUIThreadInfo, so it costs no UI Automation call; falls
+    back to the foreground window when the focus owner is unknown.
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class GUITHREADINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.DWORD), ("flags", wintypes.DWORD),
+                        ("hwndActive", wintypes.HWND), ("hwndFocus", wintypes.HWND),
+                        ("hwndCapture", wintypes.HWND), ("hwndMenuOwner", wintypes.HWND),
+                        ("hwndMoveSize", wintypes.HWND), ("hwndCaret", wintypes.HWND),
+                        ("rcCaret", wintypes.RECT)]
+
+        user32 = ctypes.windll.user32
+        hwnd = user32.GetForegroundWindow()
+        tid = user32.GetWindowThreadProcessId(hwnd, None)
+        info = GUITHREADINFO(cbSize=ctypes.sizeof(GUITHREADINFO))
+        if tid and user32.GetGUIThreadInfo(tid, ctypes.byref(info)) and info.hwndFocus:
+            hwnd = info.hwndFocus
+        buf = ctypes.create_unicode_buffer(256)
+        user32.GetClassNameW(hwnd, buf, 256)
+        return buf.value, int(hwnd or 0)
+    except Exception:
+        return "", 0
+
+
+def _get_focus_id(hwnd: int) -> Hashable:
+    """Identity of the focused element: its UIA runtime id, else `hwnd`.
+
+    Chrome, Electron, WPF and UWP host a whole window of controls in one
+    hwnd, so the handle alone does not change when focus moves between
+    their fields.
+    """
+    worker = get_uia_worker()
+    if worker is None:
+        return hwnd
+    try:
+        return worker.focus_key(timeout=0.5)
     except Exception as e:
-        log.debug(f"Clipboard grab failed: {e}")
-        return ""
+        log.debug(f"UIA focus id failed: {e}")
+        return hwnd
 
 
-def _try_uia_context(chars_before: int = 50, chars_after: int = 50) -> Dict[str, Any] | None:
-    """Try to get text context using the uiautomation package.
-    
-    Walks up the control tree (up to 3 levels) to find a control
-    that exposes TextPattern.
-    
-    Returns a context dict on success, or None on failure.
+def _copy_and_wait(clipboard: Any, app: str, op: str, keys: tuple, always_copies: bool = True) -> bool:
+    """Press the copy hotkeys and wait until the clipboard changes.
+
+    The deadline comes from the app's learned latency profile; observed
+    latencies feed back into it.  Returns False if nothing was copied.
+
+    `always_copies=False` is for keys that legitimately copy nothing (Ctrl+C
+    with no selection): running out the deadline then says nothing about
+    the app's speed, so it is not counted as a miss.
+    """
+    marker = clipboard.marker()
+    start = time.monotonic()
+    backend = get_backend()
+    for combo in keys:
+        # Key events are queued in order, so no sleep is needed between them
+        backend.hotkey(*combo)
+    if clipboard.wait_for_change(marker, profiles.timeout(app, op)):
+        profiles.observe(app, op, time.monotonic() - start)
+        return True
+    if always_copies:
+        profiles.miss(app, op)
+    return False
+
+
+def _grab_selected_text_clipboard(app: Optional[str] = None) -> Optional[str]:
+    """Grab currently selected text using clipboard (Ctrl+C).
+
+    Returns "" when nothing was copied (usually: no selection), None if the
+    clipboard could not be used at all.
     """
-    if not UIA_AVAILABLE:
-        return None
-        
     try:
-        # COM initialization for background threads
-        with auto.UIAutomationInitializerInThread():
-            # Get focused control
-            focused = auto.GetFocusedControl()
-            if not focused:
-                return None
-
-            app_name = focused.Name or ""
-            class_name = focused.ClassName or ""
-            display_name = f"{app_name} ({class_name})" if app_name else class_name
-
-            # Try TextPattern on focused element and walk up parents
-            pattern = None
-            targets = [focused]
-            parent = focused
-            for _ in range(3):
-                parent = parent.GetParentControl()
-                if parent:
-                    targets.append(parent)
-
-            for ctrl in targets:
-                try:
-                    tp = ctrl.GetTextPattern()
-                except AttributeError:
-                    # Some control types (GroupControl) use GetPattern instead
-                    try:
-                        tp = ctrl.GetPattern(10014)  # UIA_TextPatternId = 10014
-                    except Exception:
-                        tp = None
-                if tp:
-                    pattern = tp
-                    break
-
-            if not pattern:
-                # Fallback: Try ValuePattern (e.g. Chrome Address Bar, simple inputs)
-                # ValuePattern gives full text but NO cursor position. 
-                # We will assume cursor is at the end to allow appending.
-                for ctrl in targets:
-                    try:
-                        vp = ctrl.GetValuePattern()
-                        if vp:
-                            raw_val = vp.Value
-                            val = _sanitize_text(raw_val)
-                            # Return full value as 'before' text context
-                            return {
-                                "supported": True,
-                                "app_name": display_name,
-                                "before": val[-chars_before:] if val else "",
-                                "after": "",
-                                "selected": "",
-                                "fallback": "ValuePattern" 
-                            }
-                    except Exception:
-                        pass
-                
-                return None
-
-            # Get selection ranges
-            try:
-                selection = pattern.GetSelection()
-            except Exception as e:
-                log.debug(f"GetSelection failed: {e}")
-                return None
+        app = app or _get_foreground_process_name()
+        # The shared session saves/restores the user's clipboard for us
+        with get_clipboard_session().hold() as clipboard:
+            # Clear clipboard then copy selection.  Ctrl+C with no selection
+            # usually leaves the clipboard untouched, so the wait runs to its
+            # deadline; that is the common case, not a slow app.
+            clipboard.set_text("")
+            if not _copy_and_wait(clipboard, app, "copy", (("ctrl", "c"),), always_copies=False):
+                return ""
+
+            selected = clipboard.get_text()
 
-            if not selection or len(selection) == 0:
-                return None
+        return _sanitize_text(selected) if selected else ""
+    except Exception as e:
+        log.debug(f"Clipboard grab failed: {e}")
+        return None
 
-            caret_range = selection[0]
 
-            # Get selected text
-            selected_text = ""
-            try:
-                raw = caret_range.GetText(-1)
-                selected_text = _sanitize_text(raw)
-            except Exception as e:
-                log.debug(f"Selected text failed: {e}")
+class WindowsUIABackend(UIABackend):
+    """UIABackend implemented with the `uiautomation` package."""
+
+    def __init__(self) -> None:
+        self._initializer = None
 
-            # Get text before caret using DocumentRange
-            before_text = ""
+    def initialize(self) -> None:
+        # COM initialization for the worker thread, done once for its lifetime
+        self._initializer = auto.UIAutomationInitializerInThread()
+
+    def shutdown(self) -> None:
+        if self._initializer is not None:
+            self._initializer.Uninitialize()
+            self._initializer = None
+
+    def focused_element(self) -> Any:
+        return auto.GetFocusedControl()
+
+    def focus_key(self, element: Any) -> Hashable:
+        try:
+            runtime_id = tuple(element.GetRuntimeId() or ())
+        except Exception:
+            runtime_id = ()
+        try:
+            hwnd = element.NativeWindowHandle
+        except Exception:
+            hwnd = 0
+        return (runtime_id, hwnd)
+
+    def resolve_target(self, element: Any) -> Optional[UIATarget]:
+        """Walk up the control tree (up to 3 levels) to find a control
+        that exposes TextPattern, falling back to ValuePattern."""
+        app_name = element.Name or ""
+        class_name = element.ClassName or ""
+        display_name = f"{app_name} ({class_name})" if app_name else class_name
+
+        # Try TextPattern on focused element and walk up parents
+        targets = [element]
+        parent = element
+        for _ in range(3):
+            parent = parent.GetParentControl()
+            if not parent:
+                break
+            targets.append(parent)
+
+        for ctrl in targets:
             try:
-                doc_range = pattern.DocumentRange
-                before_range = doc_range.Clone()
-                # Set before_range.End = caret_range.Start
-                before_range.MoveEndpointByRange(
-                    auto.TextPatternRangeEndpoint.End,
-                    caret_range,
-                    auto.TextPatternRangeEndpoint.Start
-                )
-                raw_before = before_range.GetText(-1)
-                cleaned = _sanitize_text(raw_before)
-                before_text = cleaned[-chars_before:] if cleaned else ""
-            except Exception as e:
-                log.debug(f"Before text failed: {e}")
-
-            # Get text after caret using DocumentRange
-            after_text = ""
+                tp = ctrl.GetTextPattern()
+            except AttributeError:
+                # Some control types (GroupControl) use GetPattern instead
+                try:
+                    tp = ctrl.GetPattern(10014)  # UIA_TextPatternId = 10014
+                except Exception:
+                    tp = None
+            except Exception:
+                tp = None
+            if tp:
+                return UIATarget(ctrl, tp, "text", display_name)
+
+        # Fallback: Try ValuePattern (e.g. Chrome Address Bar, simple inputs)
+        for ctrl in targets:
             try:
-                doc_range = pattern.DocumentRange
-                after_range = doc_range.Clone()
-                # Set after_range.Start = caret_range.End
-                after_range.MoveEndpointByRange(
-                    auto.TextPatternRangeEndpoint.Start,
-                    caret_range,
-                    auto.TextPatternRangeEndpoint.End
-                )
-                raw_after = after_text = "" # placeholder to avoid unbound issues
-                raw_after = after_range.GetText(-1)
-                cleaned = _sanitize_text(raw_after)
-                after_text = cleaned[:chars_after] if cleaned else ""
-            except Exception as e:
-                log.debug(f"After text failed: {e}")
+                vp = ctrl.GetValuePattern()
+            except Exception:
+                vp = None
+            if vp:
+                return UIATarget(ctrl, vp, "value", display_name)
 
+        return None
+
+    def read_context(self, target: UIATarget, chars_before: int, chars_after: int, unit: int = UNIT_CHARACTER) -> Optional[Dict[str, Any]]:
+        if target.kind == "value":
+            # ValuePattern gives full text but NO cursor position.
+            # We will assume cursor is at the end to allow appending.
+            val = _sanitize_text(target.pattern.Value)
             return {
                 "supported": True,
-                "app_name": display_name,
-                "before": before_text,
-                "after": after_text,
-                "selected": selected_text,
+                "app_name": target.display_name,
+                "before": val[-chars_before:] if val else "",
+                "after": "",
+                "selected": "",
+                "fallback": "ValuePattern",
             }
 
+        pattern = target.pattern
+
+        # Get selection ranges (errors propagate so the worker re-resolves)
+        selection = pattern.GetSelection()
+        if not selection or len(selection) == 0:
+            return None
+
+        caret_range = selection[0]
+
+        # Get selected text
+        selected_text = ""
+        try:
+            raw = caret_range.GetText(-1)
+            selected_text = _sanitize_text(raw)
+        except Exception as e:
+            log.debug(f"Selected text failed: {e}")
+
+        before_text, after_text = _read_text_window(caret_range, chars_before, chars_after, unit)
+
+        return {
+            "supported": True,
+            "app_name": target.display_name,
+            "before": before_text,
+            "after": after_text,
+            "selected": selected_text,
+        }
+
+
+    def place_caret(self, target: UIATarget, offset: int) -> Optional[int]:
+        if target.kind != "text":
+            # ValuePattern has no caret to place
+            return None
+        selection = target.pattern.GetSelection()
+        if not selection or len(selection) == 0:
+            return None
+        return _place_caret(selection[0], offset)
+
+    def read_page(self, target: UIATarget, offset: int, size: int) -> Optional[Dict[str, Any]]:
+        if target.kind == "value":
+            # No caret: like read_context, treat the end of the value as the caret
+            val = _sanitize_text(target.pattern.Value)
+            if offset >= 0:
+                return {"start": 0, "end": 0, "text": "", "edge": True}
+            start = max(len(val) + offset, 0)
+            end = max(len(val) + offset + min(size, -offset), 0)
+            return {"start": start - len(val), "end": end - len(val), "text": val[start:end], "edge": start == 0}
+        selection = target.pattern.GetSelection()
+        if not selection or len(selection) == 0:
+            return None
+        return _read_text_page(selection[0], offset, size)
+
+
+_uia_worker: Optional[UIAWorker] = None
+_uia_worker_lock = threading.Lock()
+
+
+def get_uia_worker() -> Optional[UIAWorker]:
+    """Return the shared UIA worker, creating it on first use."""
+    global _uia_worker
+    if not UIA_AVAILABLE:
+        return None
+    with _uia_worker_lock:
+        if _uia_worker is None:
+            _uia_worker = UIAWorker(WindowsUIABackend())
+            _uia_worker.start()
+        return _uia_worker
+
+
+def warm_up(timeout: float = 10.0) -> bool:
+    """Start the UIA worker and initialise COM on it before the first grab."""
+    worker = get_uia_worker()
+    if worker is None:
+        return False
+    worker.submit(lambda: None).result(timeout=timeout)
+    return True
+
+
+def _try_uia_context(chars_before: int = 50, chars_after: int = 50, unit: int = UNIT_CHARACTER) -> Dict[str, Any] | None:
+    """Try to get text context using the uiautomation package.
+    
+    Runs on the shared UIA worker, which reuses the pattern-bearing control
+    until focus changes.
+    
+    Returns a context dict on success, or None on failure.
+    """
+    worker = get_uia_worker()
+    if worker is None:
+        return None
+
+    try:
+        return worker.get_context(chars_before, chars_after, unit)
     except Exception as e:
         log.debug(f"UIA context failed: {e}")
         return None
 
 
-def get_cursor_context(chars_before: int = 50, chars_after: int = 50, force: bool = False) -> Dict[str, Any]:
+def get_context_page(offset: int, size: int) -> Dict[str, Any]:
+    """One page of text around the caret for the phone's expanded preview.
+
+    See `_read_text_page` for how offsets count.  Only UI Automation can
+    read away from the caret; other apps answer NOT_SUPPORTED.
+    """
+    worker = get_uia_worker()
+    page = None
+    if worker is not None:
+        try:
+            page = worker.read_page(offset, size)
+        except Exception as e:
+            log.debug(f"UIA page read failed: {e}")
+    if page is None:
+        return {
+            "ok": False,
+            "code": "NOT_SUPPORTED",
+            "message": "此應用程式無法讀取更多內容",
+            "start": offset,
+            "end": offset,
+            "text": "",
+            "edge": True,
+        }
+    return dict(page, ok=True)
+
+
+def place_caret(offset: int, timeout: float = 2.0) -> Dict[str, Any]:
+    """Move the PC caret `offset` characters (negative = left).
+
+    Uses the cached TextPattern range on the UIA worker when the focused
+    control has one; otherwise falls back to one batched run of arrow keys.
+    A UIA move that timed out after it started may still land, so it gets
+    no arrow-key fallback (that would move the caret twice).
+    """
+    if offset == 0:
+        return {"ok": True, "mode": "noop", "moved": 0}
+    worker = get_uia_worker()
+    if worker is not None:
+        try:
+            moved = worker.place_caret(offset, timeout=timeout)
+        except UIAStillRunning as e:
+            log.warning(f"[caret] UIA placement still running, not falling back: {e}")
+            return {"ok": False, "code": "CARET_BUSY", "message": "游標移動逾時", "detail": str(e)}
+        except Exception as e:
+            log.debug(f"UIA caret placement failed: {e}")
+            moved = None
+        if moved is not None:
+            return {"ok": True, "mode": "uia", "moved": moved}
+    result = press_key("left" if offset < 0 else "right", presses=abs(offset))
+    if result.get("ok"):
+        result = dict(result, mode="keys", moved=offset)
+    return result
+
+
+def get_cursor_context(chars_before: int = 50, chars_after: int = 50, force: bool = False, unit: int = UNIT_CHARACTER) -> Dict[str, Any]:
     """
     Grab text context around the cursor.
+
+    chars_before/chars_after are counted in `unit` (UNIT_CHARACTER or
+    UNIT_LINE) and only that window is read from the target app.
     
     Strategy:
     1. Try uiautomation (TextPattern/ValuePattern).
     2. Try Manual Selection (Clipboard).
     3. If force=True AND nothing else worked: Try Automatic Ctrl+A (Brute Force).
+
+    Steps 1-2 follow the per-app strategy cache: the one that last worked
+    for this (process, focused window class) goes first, and ones that
+    failed recently are skipped until their back-off expires or focus
+    moves to another element.  A forced grab probes everything.  Ctrl+C
+    with nothing selected tells us nothing, so it backs off like a failure.
     """
     app_name = _get_foreground_app_name()
+    app = _get_foreground_process_name()
+    focus_class, focus_hwnd = _get_focus_window()
+    key = (app, focus_class)
+    focus_id = _get_focus_id(focus_hwnd)
+    strategies.focus(key, focus_id)
+    # Which control this context belongs to (the shadow copy is kept per target)
+    target = f"{focus_hwnd:x}/{focus_id}"
+
+    plan = CONTEXT_STRATEGIES if force else strategies.plan(key, CONTEXT_STRATEGIES)
+    for strategy in plan:
+        if strategy == "uia":
+            # Strategy 1: Full UIA context
+            uia_result = _try_uia_context(chars_before, chars_after, unit)
+            if uia_result is not None:
+                log.info(
+                    f"[context] UIA OK app={uia_result.get('app_name','?')[:30]} "
+                    f"before={len(uia_result.get('before',''))} "
+                    f"after={len(uia_result.get('after',''))}"
+                )
+                uia_result["strategy"] = "uia"
+                uia_result["target"] = target
+                strategies.success(key, "uia")
+                return uia_result
+        elif strategy == "clipboard":
+            # Strategy 2: Manual Selection Fallback (if user manually selected text)
+            selected = _grab_selected_text_clipboard(app)
+            if selected:
+                log.info(f"[context] Clipboard OK app={app_name} selected_len={len(selected)}")
+                strategies.success(key, "clipboard")
+                return {
+                    "supported": True,
+                    "app_name": app_name,
+                    "before": "",
+                    "after": "",
+                    "selected": selected,
+                    "strategy": "clipboard",
+                    "target": target,
+                }
+        strategies.failure(key, strategy)
 
-    # Strategy 1: Full UIA context
-    uia_result = _try_uia_context(chars_before, chars_after)
-    if uia_result is not None:
-        log.info(
-            f"[context] UIA OK app={uia_result.get('app_name','?')[:30]} "
-            f"before={len(uia_result.get('before',''))} "
-            f"after={len(uia_result.get('after',''))}"
-        )
-        return uia_result
-
-    # Strategy 2: Manual Selection Fallback (if user manually selected text)
-    selected = _grab_selected_text_clipboard()
-    if selected:
-        log.info(f"[context] Clipboard OK app={app_name} selected_len={len(selected)}")
-        return {
-            "supported": True,
-            "app_name": app_name,
-            "before": "",
-            "after": "",
-            "selected": selected,
-        }
+    if len(plan) < len(CONTEXT_STRATEGIES):
+        log.debug(f"[context] skipped {sorted(set(CONTEXT_STRATEGIES) - set(plan))} for {app}/{focus_class}")
 
     # Strategy 3: Force Grab (Ctrl+A)
     # Only if force=True requested by user
     if force:
         try:
             log.info(f"[context] Attempting FORCE GRAB on {app_name}")
-            # Save clipboard
-            original = ""
-            try:
-                original = pyperclip.paste()
-            except Exception:
-                pass
-                
-            # Simulate Ctrl+A -> Ctrl+C
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.05)
-            pyautogui.hotkey('ctrl', 'c')
-            time.sleep(0.05)
-            
-            # Get content
-            full_text = pyperclip.paste()
-            full_text = _sanitize_text(full_text)
-            
+            with get_clipboard_session().hold() as clipboard:
+                clipboard.set_text("")
+                # Simulate Ctrl+A -> Ctrl+C
+                copied = _copy_and_wait(clipboard, app, "force_copy", (("ctrl", "a"), ("ctrl", "c")))
+
+                # Get content
+                full_text = _sanitize_text(clipboard.get_text()) if copied else ""
+
             # Deselect (move cursor to end)
-            pyautogui.press('right')
-            
-            # Restore clipboard
-            try:
-                pyperclip.copy(original)
-            except Exception:
-                pass
+            get_backend().press("right")
 
             if full_text:
                 log.info(f"[context] ForceGrab OK app={app_name} len={len(full_text)}")
@@ -294,7 +614,9 @@ def get_cursor_context(chars_before: int = 50, chars_after: int = 50, force: boo
                     "before": full_text[-chars_before:], # Assume cursor at end
                     "after": "",
                     "selected": "",
-                    "fallback": "ForceGrab"
+                    "fallback": "ForceGrab",
+                    "strategy": "force",
+                    "target": target,
                 }
         except Exception as e:
             log.warning(f"Force grab failed: {e}")
@@ -307,4 +629,6 @@ def get_cursor_context(chars_before: int = 50, chars_after: int = 50, force: boo
         "before": "",
         "after": "",
         "selected": "",
+        "strategy": "none",
+        "target": target,
     }
@@ -0,0 +1,104 @@
+"""Paged context around the PC caret for GhostWriter.
+
+Context grabs stay small (50 characters each side) so the hot path is
+cheap.  When the phone preview is expanded and scrolled, it asks for more
+text in pages addressed by offset from the caret: negative offsets count
+back from the selection start, the others forward from its end, the same
+way as caret moves.  A page is fetched lazily, on request only.
+
+Pages are cached per document version.  The version changes whenever
+the text the phones see changes: a grab or shadow edit with different
+before/after/selected text, or an edit the shadow could not follow.  Every
+context sent to the phones carries its version as "pv", and a page answer
+carries the version it was read at, so a client never stitches pages from
+two different versions together.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PageFetch = Callable[[int, int], Dict[str, Any]]
+
+
+def _signature(ctx: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        ctx.get("supported"),
+        ctx.get("app_name"),
+        ctx.get("before", "").replace("\r", ""),
+        ctx.get("after", "").replace("\r", ""),
+        ctx.get("selected", "").replace("\r", ""),
+    )
+
+
+class ContextPages:
+    """Document version counter plus an LRU of pages read at that version.
+
+    `fetch(offset, size)` reads one page from the PC (see
+    context_grabber.get_context_page) and may block; callers run `get` off
+    the event thread.
+    """
+
+    def __init__(self, fetch: PageFetch, max_pages: int = 64) -> None:
+        self.fetch = fetch
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._version = 0
+        self._signature: Optional[Tuple[Any, ...]] = None
+        self._pages: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.fetches = 0
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def observe(self, ctx: Dict[str, Any]) -> int:
+        """Note a context about to be shown; returns its version."""
+        signature = _signature(ctx)
+        with self._lock:
+            if signature != self._signature:
+                self._signature = signature
+                self._bump_locked()
+            return self._version
+
+    def touch(self) -> int:
+        """The text changed in a way we did not see (e.g. an unmodelled key)."""
+        with self._lock:
+            self._signature = None
+            self._bump_locked()
+            return self._version
+
+    def _bump_locked(self) -> None:
+        self._version += 1
+        self._pages.clear()
+
+    def get(self, offset: int, size: int) -> Dict[str, Any]:
+        """The page [offset, offset + size) around the caret at the current version."""
+        key = (offset, size)
+        with self._lock:
+            version = self._version
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+
+        result = self.fetch(offset, size)
+        page = dict(result, v=version, req=offset, size=size)
+        with self._lock:
+            self.fetches += 1
+            # Only cache what is still current; the text may have moved on
+            if result.get("ok") and self._version == version:
+                self._pages[key] = page
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": self._version, "cached": len(self._pages), "hits": self.hits, "fetches": self.fetches}
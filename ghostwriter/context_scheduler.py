@@ -0,0 +1,174 @@
+"""Single-flight context grab scheduling for GhostWriter.
+
+The phones ask for context from many places (input debounce, auto-sync
+timer, cursor clicks, post-inject pushes).  Running a UIA/clipboard grab for
+each of them makes grabs overlap and fight over COM and the clipboard, and
+with several clients connected it would multiply the UIA work by the number
+of phones.  All clients look at the same PC cursor, so there is at most one
+grab in flight for everyone: requests that arrive meanwhile collapse into a
+single follow-up grab, and every result fans out to all subscribed clients.
+A result is dropped instead of emitted only when the text changed under the
+grab while it ran (an edit, a focus change, a shadow publish) or a force
+grab is queued behind it; a plain request meanwhile just gets the follow-up
+grab, so steady polling never starves a client of answers.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Set
+
+log = logging.getLogger("ghostwriter.scheduler")
+
+
+class ContextScheduler:
+    """Shared, latest-wins scheduler around a blocking grab function.
+
+    `grab(force, hint)` returns a context dict (`hint` is the text just
+    injected, if any, so the grab can wait for it to show up),
+    `deliver(sid, ctx)` sends it to one client, `spawn(fn, *args)` starts a
+    background task and `sleep(seconds)` waits inside one
+    (transport.spawn / transport.sleep).
+    """
+
+    def __init__(
+        self,
+        grab: Callable[[bool, Optional[str]], Dict[str, Any]],
+        deliver: Callable[[str, Dict[str, Any]], None],
+        spawn: Callable[..., Any],
+        sleep: Callable[[float], None],
+    ) -> None:
+        self._grab = grab
+        self._deliver = deliver
+        self._spawn = spawn
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._subscribers: Set[str] = set()
+
+        self._running = False
+        self._pending = False
+        self._pending_force = False
+        self._pending_delay = 0.0
+        self._pending_hint: Optional[str] = None
+        self._generation = 0
+
+        self.grabs = 0
+        self.requests = 0
+
+    def request(
+        self,
+        sid: Optional[str] = None,
+        force: bool = False,
+        delay: float = 0.0,
+        hint: Optional[str] = None,
+        supersede: bool = False,
+    ) -> None:
+        """Ask for a fresh context, optionally after `delay` seconds.
+
+        `sid` (if given) is subscribed to the result; with no sid the grab is
+        for the clients already subscribed (e.g. a focus-change event).
+        `supersede` says the PC text changed since a grab in flight started,
+        so its result is stale; an injection `hint` implies it, and so does
+        `force` (the forced grab's answer is the one to show).
+        """
+        with self._lock:
+            if sid is not None:
+                self._subscribers.add(sid)
+            if not self._subscribers:
+                return
+            self.requests += 1
+            if supersede or force or hint is not None:
+                self._generation += 1
+            if self._running:
+                self._pending = True
+                self._pending_force = self._pending_force or force
+                self._pending_delay = max(self._pending_delay, delay)
+                self._pending_hint = hint or self._pending_hint
+                return
+            self._running = True
+        self._spawn(self._run, force, delay, hint)
+
+    def subscribe(self, sid: str) -> None:
+        """Send `sid` the results of grabs already scheduled, without a new one."""
+        with self._lock:
+            self._subscribers.add(sid)
+
+    def publish(self, ctx: Dict[str, Any], sid: Optional[str] = None) -> None:
+        """Fan out a context that did not come from a grab (see shadow_doc.py).
+
+        A grab in flight now predates it, so its result is dropped as stale.
+        """
+        with self._lock:
+            if sid is not None:
+                self._subscribers.add(sid)
+            self._generation += 1
+            subscribers = list(self._subscribers)
+        for target in subscribers:
+            try:
+                self._deliver(target, ctx)
+            except Exception as exc:
+                log.warning(f"[scheduler] deliver to sid={target} failed: {exc}")
+
+    def forget(self, sid: str) -> None:
+        """Unsubscribe a disconnected client; it gets no further results."""
+        with self._lock:
+            self._subscribers.discard(sid)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "requests": self.requests,
+                "grabs": self.grabs,
+                "running": self._running,
+            }
+
+    def _run(self, force: bool, delay: float, hint: Optional[str]) -> None:
+        while True:
+            if delay > 0:
+                self._sleep(delay)
+
+            with self._lock:
+                # Anything queued up to now is answered by the grab below.
+                force = force or self._pending_force
+                hint = self._pending_hint or hint
+                self._pending = False
+                self._pending_force = False
+                self._pending_delay = 0.0
+                self._pending_hint = None
+                generation = self._generation
+                self.grabs += 1
+
+            try:
+                ctx = self._grab(force, hint)
+            except Exception as exc:
+                log.warning(f"[scheduler] grab failed: {exc}")
+                ctx = None
+
+            with self._lock:
+                stale = self._generation != generation
+                follow_up = self._pending and bool(self._subscribers)
+                if follow_up:
+                    next_force = self._pending_force
+                    delay = self._pending_delay
+                else:
+                    self._running = False
+                    self._pending = False
+                subscribers = list(self._subscribers)
+
+            # A forced grab is explicit and has side effects (Ctrl+A), so its
+            # result is always shown; plain grabs superseded mid-flight are not.
+            if ctx is not None and (not stale or force):
+                for sid in subscribers:
+                    try:
+                        self._deliver(sid, ctx)
+                    except Exception as exc:
+                        log.warning(f"[scheduler] deliver to sid={sid} failed: {exc}")
+            elif stale:
+                log.debug("[scheduler] dropped stale context")
+
+            if not follow_up:
+                return
+            force = next_force
+            hint = None
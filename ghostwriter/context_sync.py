@@ -0,0 +1,129 @@
+"""Versioned delta encoding for context_update messages.
+
+The server remembers the last context it sent to each client.  Unchanged
+contexts are not re-sent; changed ones go out as a compact diff against the
+previous version.  Long string fields are trimmed to their changed middle
+part.  Wire format:
+
+    {"v": 3, "full": {...context...}}            full snapshot
+    {"v": 4, "base": 3, "delta": {...}}          diff against version 3
+
+In a delta, each changed key maps to either its new value, `null` (key
+removed) or, for strings, `{"p": kept_prefix_len, "s": kept_suffix_len,
+"t": replacement}`.  The lengths count UTF-16 code units, which is what
+JavaScript string offsets are, and never split a surrogate pair.  A client whose version does not match `base` asks for
+a full snapshot with `context_resync`.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# Strings shorter than this are sent whole; a diff would not be smaller.
+MIN_DIFF_LEN = 16
+
+
+def utf16_len(text: str) -> int:
+    """Length of `text` in UTF-16 code units (JavaScript's `.length`)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def diff_text(old: str, new: str) -> Dict[str, Any]:
+    """Describe `new` as `old` with its common prefix/suffix kept.
+
+    The match runs over code points, so the kept parts end on character
+    boundaries; their lengths are then given in UTF-16 units.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return {
+        "p": utf16_len(old[:prefix]),
+        "s": utf16_len(old[len(old) - suffix:]),
+        "t": new[prefix:len(new) - suffix],
+    }
+
+
+def apply_text_diff(old: str, diff: Dict[str, Any]) -> str:
+    """Apply a `diff_text` result the way the phone does (UTF-16 offsets)."""
+    units = old.encode("utf-16-le")
+    head = units[:2 * diff["p"]].decode("utf-16-le")
+    tail = units[len(units) - 2 * diff["s"]:].decode("utf-16-le")
+    return head + diff["t"] + tail
+
+
+def diff_context(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    delta: Dict[str, Any] = {}
+    for key in set(old) | set(new):
+        before = old.get(key)
+        after = new.get(key)
+        if key in old and key in new and before == after:
+            continue
+        if key not in new:
+            delta[key] = None
+        elif isinstance(before, str) and isinstance(after, str) and max(len(before), len(after)) >= MIN_DIFF_LEN:
+            delta[key] = diff_text(before, after)
+        else:
+            delta[key] = after
+    return delta
+
+
+@dataclass
+class _Sent:
+    version: int
+    ctx: Dict[str, Any]
+
+
+class ContextSync:
+    """Tracks the last context sent to each client and encodes updates."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sent: Dict[str, _Sent] = {}
+
+    def encode(self, sid: str, ctx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the message to send for `ctx`, or None if nothing changed."""
+        ctx = dict(ctx)
+        with self._lock:
+            last = self._sent.get(sid)
+            if last is None:
+                self._sent[sid] = _Sent(1, ctx)
+                return {"v": 1, "full": ctx}
+            if ctx == last.ctx:
+                return None
+            version = last.version + 1
+            delta = diff_context(last.ctx, ctx)
+            self._sent[sid] = _Sent(version, ctx)
+            return {"v": version, "base": last.version, "delta": delta}
+
+    def snapshot(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Full message for the last context sent to `sid` (for resyncs)."""
+        with self._lock:
+            last = self._sent.get(sid)
+            if last is None:
+                return None
+            return {"v": last.version, "full": dict(last.ctx)}
+
+    def last_context(self, sid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            last = self._sent.get(sid)
+            return dict(last.ctx) if last else None
+
+    def move(self, old_sid: str, new_sid: str) -> bool:
+        """Continue `old_sid`'s versions on `new_sid` (a resumed session)."""
+        with self._lock:
+            last = self._sent.pop(old_sid, None)
+            if last is None:
+                return False
+            self._sent[new_sid] = last
+            return True
+
+    def forget(self, sid: str) -> None:
+        with self._lock:
+            self._sent.pop(sid, None)
@@ -0,0 +1,192 @@
+"""Desktop calls (input injection and context reads) for GhostWriter.
+
+`DesktopService` is everything the server asks of the desktop: typing,
+keys, caret moves, context grabs and pages.  `Desktop` is what the server
+calls.  Without a worker it runs the service in-process, as before; with a
+`worker_process.SupervisedWorker` it forwards each call to the service in
+the worker process, with a deadline, and turns a hung or restarting worker
+into a fast failure:
+
+  * injection and keys answer {"ok": False, "code": "TIMEOUT", ...}
+    ("WORKER_DOWN" while the worker restarts),
+  * a context grab answers an unsupported context with strategy "timeout",
+    which the phone shows as "PC not responding" rather than waiting,
+  * a page read answers like an app that cannot be paged.
+
+Input goes on the worker's "input" lane and reads on its "context" lane,
+so a grab stuck in a frozen app does not hold up typing into another one.
+
+A worker killed while it holds the clipboard never restores it; it
+publishes its pending restore, and `Desktop` runs it in the server instead.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .injector import cost_model, get_backend, inject_text, injection_stats, press_hotkey, press_key
+    from .context_grabber import get_context_page, get_cursor_context, place_caret, warm_up as warm_up_uia
+    from .clipboard_session import get_clipboard_session
+    from .timing import profiles
+    from .strategy_cache import strategies
+    from .worker_process import SupervisedWorker, WorkerError
+except ImportError:
+    from injector import cost_model, get_backend, inject_text, injection_stats, press_hotkey, press_key
+    from context_grabber import get_context_page, get_cursor_context, place_caret, warm_up as warm_up_uia
+    from clipboard_session import get_clipboard_session
+    from timing import profiles
+    from strategy_cache import strategies
+    from worker_process import SupervisedWorker, WorkerError
+
+log = logging.getLogger("ghostwriter.desktop")
+
+
+class DesktopService:
+    """The desktop calls, run wherever the backends live."""
+
+    def ping(self) -> bool:
+        return True
+
+    def attach_worker(self, publish: Callable[[str, Any], None]) -> None:
+        """In the worker: report pending clipboard restores to the server."""
+        get_clipboard_session().listener = lambda key, value: publish(f"clipboard.{key}", value)
+
+    def warm_up(self) -> bool:
+        get_backend()
+        # The first read also makes pyperclip pick its mechanism on Linux
+        get_clipboard_session().marker()
+        return warm_up_uia()
+
+    def inject_text(self, text: str, app: str = "") -> Dict[str, Any]:
+        return inject_text(text, app=app)
+
+    def press_key(self, key: str, presses: int = 1) -> Dict[str, Any]:
+        return press_key(key, presses=presses)
+
+    def press_hotkey(self, *keys: str) -> Dict[str, Any]:
+        return press_hotkey(*keys)
+
+    def place_caret(self, offset: int) -> Dict[str, Any]:
+        return place_caret(offset)
+
+    def get_cursor_context(self, force: bool = False) -> Dict[str, Any]:
+        return get_cursor_context(force=force)
+
+    def get_context_page(self, offset: int, size: int) -> Dict[str, Any]:
+        return get_context_page(offset, size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "throughput": injection_stats(),
+            "inject_costs": cost_model.snapshot(),
+            "clipboard": get_clipboard_session().stats(),
+            "timing": profiles.snapshot(),
+            "strategies": strategies.snapshot(),
+        }
+
+
+class Desktop:
+    """Server-side front for the desktop calls, in-process or via a worker.
+
+    Deadlines: `context_timeout` for grabs and pages, `input_timeout` plus
+    `per_char` seconds per character for injection.
+    """
+
+    def __init__(
+        self,
+        worker: Optional[SupervisedWorker] = None,
+        input_timeout: float = 3.0,
+        per_char: float = 0.02,
+        context_timeout: float = 2.0,
+    ) -> None:
+        self.worker = worker
+        self.service = DesktopService() if worker is None else None
+        if worker is not None and worker.on_lost is None:
+            worker.on_lost = self._on_worker_lost
+        self.input_timeout = input_timeout
+        self.per_char = per_char
+        self.context_timeout = context_timeout
+
+    def _call(self, lane: str, method: str, *args: Any, timeout: float) -> Any:
+        if self.worker is None:
+            return getattr(self.service, method)(*args)
+        return self.worker.call(lane, method, *args, timeout=timeout)
+
+    # ── Input lane ───────────────────────────────────────────
+
+    def _input(self, method: str, *args: Any, chars: int = 1) -> Dict[str, Any]:
+        try:
+            return self._call("input", method, *args, timeout=self.input_timeout + self.per_char * chars)
+        except WorkerError as exc:
+            log.warning(f"[desktop] {method} failed: {exc}")
+            return {"ok": False, "code": exc.code, "message": "電腦端無回應", "detail": str(exc)}
+
+    def inject_text(self, text: str, app: str = "") -> Dict[str, Any]:
+        return self._input("inject_text", text, app, chars=len(text))
+
+    def press_key(self, key: str, presses: int = 1) -> Dict[str, Any]:
+        return self._input("press_key", key, presses, chars=presses)
+
+    def press_hotkey(self, *keys: str) -> Dict[str, Any]:
+        return self._input("press_hotkey", *keys)
+
+    def place_caret(self, offset: int) -> Dict[str, Any]:
+        return self._input("place_caret", offset, chars=abs(offset))
+
+    # ── Context lane ─────────────────────────────────────────
+
+    def get_cursor_context(self, force: bool = False) -> Dict[str, Any]:
+        try:
+            return self._call("context", "get_cursor_context", force, timeout=self.context_timeout)
+        except WorkerError as exc:
+            log.warning(f"[desktop] context grab failed: {exc}")
+            return {
+                "supported": False,
+                "app_name": "",
+                "reason": "PC app is not responding",
+                "before": "",
+                "after": "",
+                "selected": "",
+                "strategy": "timeout",
+            }
+
+    def get_context_page(self, offset: int, size: int) -> Dict[str, Any]:
+        try:
+            return self._call("context", "get_context_page", offset, size, timeout=self.context_timeout)
+        except WorkerError as exc:
+            log.warning(f"[desktop] page read failed: {exc}")
+            return {
+                "ok": False,
+                "code": "TIMEOUT",
+                "message": "電腦端無回應",
+                "start": offset,
+                "end": offset,
+                "text": "",
+                "edge": True,
+            }
+
+    # ── Lifecycle / stats ────────────────────────────────────
+
+    def _on_worker_lost(self, state: Dict[str, Any]) -> None:
+        """The worker was killed: finish the clipboard restore it left pending."""
+        saved = state.get("clipboard.saved")
+        if saved is not None:
+            log.warning("[desktop] worker was holding the clipboard, restoring it here")
+            get_clipboard_session().adopt(saved, state.get("clipboard.left"))
+
+    def warm_up(self) -> bool:
+        """Start the backends (in the worker: start it and wait until it is up)."""
+        if self.worker is None:
+            return self.service.warm_up()
+        if not self.worker.wait_ready(self.worker.startup_timeout):
+            raise WorkerError("desktop worker did not start")
+        return self.worker.call("context", "warm_up", timeout=self.worker.startup_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend stats from wherever the backends run ({} if unreachable)."""
+        try:
+            return self._call("context", "stats", timeout=self.context_timeout)
+        except WorkerError:
+            return {}
@@ -0,0 +1,167 @@
+"""Dictation hypotheses typed as tail edits for GhostWriter.
+
+Phone speech recognizers show interim text and keep revising it until the
+utterance is final ("I scream" -> "ice cream").  In dictation mode the phone
+sends the whole current hypothesis for an utterance every time it changes,
+and the server types only the difference from what it already typed for
+that utterance: backspace back to the longest common prefix, then the new
+tail.  A revision that only appends costs no backspaces at all.
+
+One PC caret means at most one open utterance.  Anything else that types
+or moves the caret (another op from any client, another utterance, a
+different foreground app) closes it, since backspacing from there would hit
+text that is not ours.  Later revisions of a closed utterance are refused
+(the phone then starts a new one), except a repeat of the text already
+typed, which is a harmless resend after a reconnect.  An utterance whose
+keystrokes failed part way is closed with no known text, so even that
+repeat is refused.
+
+Because every message carries the full hypothesis, resending one is
+idempotent, and queued revisions of the same utterance can be collapsed
+into the newest (see InjectionWorker._next_op).
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+def tail_diff(old: str, new: str) -> Tuple[int, str]:
+    """(characters to backspace from the end of `old`, text to type after)."""
+    n = min(len(old), len(new))
+    i = 0
+    while i < n and old[i] == new[i]:
+        i += 1
+    return len(old) - i, new[i:]
+
+
+@dataclass
+class Utterance:
+    sid: Optional[str]
+    id: str
+    app: str
+    typed: str = ""
+    revisions: int = 0
+
+
+class DictationTracker:
+    """The open utterance and what has been typed for it.
+
+    `revise` and `commit` run on the injection thread, around the actual
+    keystrokes; `move`, `forget` and `stats` come from handler threads.
+    """
+
+    def __init__(self, max_closed: int = 16) -> None:
+        self.max_closed = max_closed
+        self._lock = threading.Lock()
+        self._open: Optional[Utterance] = None
+        # (sid, utterance id) -> text typed when it closed (None: unknown)
+        self._closed: "OrderedDict[Tuple[Optional[str], str], Optional[str]]" = OrderedDict()
+
+        self.revisions = 0
+        self.refused = 0
+        self.interrupted = 0
+        self.failed = 0
+        self.deleted = 0
+        self.inserted = 0
+        # Keystrokes the same revisions would cost by retyping every hypothesis
+        self.retype_keys = 0
+
+    def revise(self, sid: Optional[str], uid: str, hypothesis: str, app: str = "") -> Optional[Tuple[int, str]]:
+        """Plan the edit that turns utterance `uid` into `hypothesis`.
+
+        Returns (backspaces, text), or None if the utterance is closed.
+        Opens the utterance (closing any other) if it is new.
+        """
+        with self._lock:
+            if (sid, uid) in self._closed:
+                if self._closed[(sid, uid)] == hypothesis:
+                    return 0, ""
+                self.refused += 1
+                return None
+            current = self._open
+            if current is not None and (current.sid, current.id) == (sid, uid) and current.app != app:
+                # Focus moved to another app; our text is not at the caret
+                self._close_locked()
+                self.interrupted += 1
+                self.refused += 1
+                return None
+            if current is None or (current.sid, current.id) != (sid, uid):
+                if current is not None:
+                    self._close_locked()
+                    self.interrupted += 1
+                self._open = Utterance(sid, uid, app)
+            return tail_diff(self._open.typed, hypothesis)
+
+    def commit(self, deleted: int, inserted: str, final: bool = False) -> None:
+        """Record the edit `revise` planned, once it has been typed."""
+        with self._lock:
+            current = self._open
+            if current is None:
+                return
+            typed = current.typed[:len(current.typed) - deleted] + inserted
+            self.revisions += 1
+            self.deleted += deleted
+            self.inserted += len(inserted)
+            self.retype_keys += len(current.typed) + len(typed)
+            current.typed = typed
+            current.revisions += 1
+            if final:
+                self._close_locked()
+
+    def interrupt(self) -> None:
+        """Something else typed or moved the caret: close the open utterance."""
+        with self._lock:
+            if self._open is not None:
+                self._close_locked()
+                self.interrupted += 1
+
+    def fail(self, deleted: int = 0) -> None:
+        """The edit `revise` planned failed after `deleted` backspaces.
+
+        What is on screen is no longer known: the utterance closes and any
+        later revision of it is refused, even a repeat of the old text.
+        """
+        with self._lock:
+            if self._open is not None:
+                self.deleted += deleted
+                self.failed += 1
+                self._close_locked(known=False)
+
+    def _close_locked(self, known: bool = True) -> None:
+        current, self._open = self._open, None
+        self._closed[(current.sid, current.id)] = current.typed if known else None
+        while len(self._closed) > self.max_closed:
+            self._closed.popitem(last=False)
+
+    def move(self, old_sid: Optional[str], new_sid: Optional[str]) -> None:
+        """A phone resumed on a new sid; its utterances go with it."""
+        with self._lock:
+            if self._open is not None and self._open.sid == old_sid:
+                self._open.sid = new_sid
+            for key in [key for key in self._closed if key[0] == old_sid]:
+                self._closed[(new_sid, key[1])] = self._closed.pop(key)
+
+    def forget(self, sid: Optional[str]) -> None:
+        with self._lock:
+            if self._open is not None and self._open.sid == sid:
+                self._open = None
+            for key in [key for key in self._closed if key[0] == sid]:
+                del self._closed[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self._open.id if self._open is not None else None,
+                "revisions": self.revisions,
+                "refused": self.refused,
+                "interrupted": self.interrupted,
+                "failed": self.failed,
+                "deleted": self.deleted,
+                "inserted": self.inserted,
+                "keys": self.deleted + self.inserted,
+                "retype_keys": self.retype_keys,
+            }
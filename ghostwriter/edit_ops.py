@@ -0,0 +1,291 @@
+"""Batched edit operations for GhostWriter.
+
+Instead of one Socket.IO event per keystroke (`text_input`, `key_command`,
+`move_cursor`), a client can send a whole burst of editing as one
+`edit_ops` event: a sequence number plus a list of insert, delete, move and
+key-chord ops.  The server answers every batch with an `ops_ack` carrying
+the same seq, which is what the client paces itself on.  The ack comes once
+every op in the batch has run: `{"ok": true}`, or the code of the first op
+that failed and its `index` in the batch (see BatchResult).  When the
+desktop did not answer an op (TIMEOUT, WORKER_DOWN) the ack comes at once
+with `"retry": true`: the ops before `index` ran, and the client resends
+the batch from there (see server._retry_edits).
+
+A batch arrives in one of two encodings:
+
+JSON (easy to produce by hand, used when tracing):
+    {"seq": 7, "ops": [
+        {"op": "insert", "text": "hello", "mode": "stream"},
+        {"op": "delete", "n": 2},                  # backspace x2
+        {"op": "delete", "n": 1, "dir": "forward"},
+        {"op": "move", "dir": "left", "n": 3},
+        {"op": "key", "keys": ["ctrl", "a"]}]}
+
+Binary (what static/sio4lite.js sends as a Socket.IO binary attachment),
+either as the whole payload or as `{"b": <bytes>, "t": ..., "trace": ...}`:
+    u8 version (1), varint seq, then ops until the end of the buffer:
+      0x01/0x02/0x03  insert stream/batch/replace: varint len, UTF-8 text
+      0x10/0x11       delete back/forward: varint n
+      0x20..0x25      move left/right/up/down/home/end: varint n
+      0x30            key chord: u8 count, then per key u8 len + ASCII name
+Varints are unsigned LEB128.  A typical typing burst costs a few bytes per
+op instead of a ~40 byte JSON event per keystroke.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+VERSION = 1
+MAX_OPS = 512
+MAX_COUNT = 10000
+MAX_TEXT = 64 * 1024
+
+INSERT_MODES = ("stream", "batch", "replace")
+DELETE_DIRS = ("back", "forward")
+MOVE_DIRS = ("left", "right", "up", "down", "home", "end")
+
+_INSERT = 0x01
+_DELETE = 0x10
+_MOVE = 0x20
+_KEY = 0x30
+
+MODIFIERS = {"ctrl", "shift", "alt", "win"}
+# Named keys every injection backend knows, plus single letters/digits
+NAMED_KEYS = {
+    "backspace", "tab", "enter", "esc", "space", "pageup", "pagedown",
+    "end", "home", "left", "up", "right", "down", "insert", "delete",
+} | MODIFIERS
+
+
+class EditOpError(ValueError):
+    """A malformed batch; `code` is sent back to the client."""
+
+    def __init__(self, message: str, code: str = "BAD_OPS") -> None:
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class EditOp:
+    """One edit: kind is "insert", "delete", "move" or "key"."""
+
+    kind: str
+    text: str = ""
+    mode: str = "stream"
+    direction: str = ""
+    count: int = 1
+    keys: Tuple[str, ...] = ()
+
+
+@dataclass
+class EditBatch:
+    seq: int
+    ops: List[EditOp] = field(default_factory=list)
+    # Tracing fields from a JSON wrapper (see server._traced)
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+class BatchResult:
+    """Results of one accepted batch's ops, collected as they run.
+
+    Ops are queued (and possibly merged) individually; each carries
+    `(result, index)` and reports back through `record`.  Only the injection
+    thread records.
+    """
+
+    def __init__(self, seq: int, size: int) -> None:
+        self.seq = seq
+        self.remaining = size
+        self.failed: Optional[Tuple[int, Dict[str, Any]]] = None
+
+    def record(self, index: int, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Note op `index`'s result; returns the ack once the whole batch has run."""
+        if not result.get("ok", False) and (self.failed is None or index < self.failed[0]):
+            self.failed = (index, result)
+        self.remaining -= 1
+        if self.remaining > 0:
+            return None
+        if self.failed is None:
+            return {"ok": True}
+        index, failure = self.failed
+        return {
+            "ok": False,
+            "code": failure.get("code", "INJECT_ERR"),
+            "index": index,
+            "message": failure.get("message", ""),
+        }
+
+
+# ── Validation ───────────────────────────────────────────────
+
+def _check_count(n: Any) -> int:
+    if isinstance(n, bool) or not isinstance(n, int) or not 1 <= n <= MAX_COUNT:
+        raise EditOpError(f"bad count: {n!r}")
+    return n
+
+
+def _check_keys(keys: Any) -> Tuple[str, ...]:
+    if not isinstance(keys, (list, tuple)) or not 1 <= len(keys) <= 4:
+        raise EditOpError(f"bad key chord: {keys!r}")
+    names = []
+    for key in keys:
+        if not isinstance(key, str):
+            raise EditOpError(f"bad key: {key!r}")
+        key = key.lower()
+        if key not in NAMED_KEYS and not (len(key) == 1 and key.isascii() and key.isalnum()):
+            raise EditOpError(f"unsupported key: {key}", code="BAD_KEY")
+        names.append(key)
+    return tuple(names)
+
+
+def _check_seq(seq: Any) -> int:
+    if isinstance(seq, bool) or not isinstance(seq, int) or seq < 0:
+        raise EditOpError(f"bad seq: {seq!r}")
+    return seq
+
+
+# ── JSON encoding ────────────────────────────────────────────
+
+def _op_from_json(item: Any) -> EditOp:
+    if not isinstance(item, dict):
+        raise EditOpError(f"bad op: {item!r}")
+    kind = item.get("op")
+    if kind == "insert":
+        text, mode = item.get("text"), item.get("mode", "stream")
+        if not isinstance(text, str) or not text or len(text) > MAX_TEXT:
+            raise EditOpError("bad insert text")
+        if mode not in INSERT_MODES:
+            raise EditOpError(f"bad insert mode: {mode!r}")
+        return EditOp("insert", text=text, mode=mode)
+    if kind == "delete":
+        direction = item.get("dir", "back")
+        if direction not in DELETE_DIRS:
+            raise EditOpError(f"bad delete dir: {direction!r}")
+        return EditOp("delete", direction=direction, count=_check_count(item.get("n", 1)))
+    if kind == "move":
+        direction = item.get("dir")
+        if direction not in MOVE_DIRS:
+            raise EditOpError(f"bad move dir: {direction!r}")
+        return EditOp("move", direction=direction, count=_check_count(item.get("n", 1)))
+    if kind == "key":
+        return EditOp("key", keys=_check_keys(item.get("keys")))
+    raise EditOpError(f"unknown op: {kind!r}")
+
+
+def parse_batch(payload: Any) -> EditBatch:
+    """Decode an `edit_ops` payload in either encoding.  Raises EditOpError."""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return decode_batch(bytes(payload))
+    if not isinstance(payload, dict):
+        raise EditOpError("invalid payload", code="BAD_PAYLOAD")
+    meta = {k: payload[k] for k in ("t", "trace") if k in payload}
+    if isinstance(payload.get("b"), (bytes, bytearray, memoryview)):
+        batch = decode_batch(bytes(payload["b"]))
+        batch.meta = meta
+        return batch
+    ops = payload.get("ops")
+    if not isinstance(ops, list) or len(ops) > MAX_OPS:
+        raise EditOpError("bad ops list")
+    return EditBatch(_check_seq(payload.get("seq")), [_op_from_json(item) for item in ops], meta)
+
+
+# ── Binary encoding ──────────────────────────────────────────
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _get_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        if pos >= len(data) or shift > 28:
+            raise EditOpError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def encode_batch(batch: EditBatch) -> bytes:
+    """Binary form of `batch` (mirrors encodeEditOps in static/sio4lite.js)."""
+    out = bytearray([VERSION])
+    _put_varint(out, batch.seq)
+    for op in batch.ops:
+        if op.kind == "insert":
+            raw = op.text.encode("utf-8")
+            out.append(_INSERT + INSERT_MODES.index(op.mode))
+            _put_varint(out, len(raw))
+            out += raw
+        elif op.kind == "delete":
+            out.append(_DELETE + DELETE_DIRS.index(op.direction or "back"))
+            _put_varint(out, op.count)
+        elif op.kind == "move":
+            out.append(_MOVE + MOVE_DIRS.index(op.direction))
+            _put_varint(out, op.count)
+        elif op.kind == "key":
+            out += bytes([_KEY, len(op.keys)])
+            for key in op.keys:
+                name = key.encode("ascii")
+                out.append(len(name))
+                out += name
+        else:
+            raise EditOpError(f"unknown op: {op.kind!r}")
+    return bytes(out)
+
+
+def decode_batch(data: bytes) -> EditBatch:
+    if not data or data[0] != VERSION:
+        raise EditOpError("unsupported edit_ops version")
+    seq, pos = _get_varint(data, 1)
+    ops: List[EditOp] = []
+    while pos < len(data):
+        if len(ops) >= MAX_OPS:
+            raise EditOpError("too many ops")
+        tag = data[pos]
+        pos += 1
+        if _INSERT <= tag < _INSERT + len(INSERT_MODES):
+            size, pos = _get_varint(data, pos)
+            if size == 0 or size > MAX_TEXT * 4 or pos + size > len(data):
+                raise EditOpError("bad insert text")
+            try:
+                text = data[pos:pos + size].decode("utf-8")
+            except UnicodeDecodeError:
+                raise EditOpError("insert text is not UTF-8")
+            pos += size
+            ops.append(EditOp("insert", text=text, mode=INSERT_MODES[tag - _INSERT]))
+        elif _DELETE <= tag < _DELETE + len(DELETE_DIRS):
+            n, pos = _get_varint(data, pos)
+            ops.append(EditOp("delete", direction=DELETE_DIRS[tag - _DELETE], count=_check_count(n)))
+        elif _MOVE <= tag < _MOVE + len(MOVE_DIRS):
+            n, pos = _get_varint(data, pos)
+            ops.append(EditOp("move", direction=MOVE_DIRS[tag - _MOVE], count=_check_count(n)))
+        elif tag == _KEY:
+            if pos >= len(data):
+                raise EditOpError("truncated key chord")
+            count = data[pos]
+            pos += 1
+            keys = []
+            for _ in range(count):
+                if pos >= len(data) or pos + 1 + data[pos] > len(data):
+                    raise EditOpError("truncated key chord")
+                size = data[pos]
+                try:
+                    keys.append(data[pos + 1:pos + 1 + size].decode("ascii"))
+                except UnicodeDecodeError:
+                    raise EditOpError("bad key name")
+                pos += 1 + size
+            ops.append(EditOp("key", keys=_check_keys(keys)))
+        else:
+            raise EditOpError(f"unknown op tag: {tag:#x}")
+    return EditBatch(seq, ops)
@@ -0,0 +1,460 @@
+"""In-memory stand-ins for GhostWriter's platform backends.
+
+These implement the same interfaces as the Windows backends so the
+scheduling, caching and protocol layers can be exercised (and benchmarked)
+on machines without a desktop session.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    from .uia_worker import UIABackend, UIATarget
+    from .context_events import ContextEventSource, EventCallback
+    from .injector import InjectionBackend
+    from .clipboard_session import ClipboardBackend, ClipboardSession
+except ImportError:
+    from uia_worker import UIABackend, UIATarget
+    from context_events import ContextEventSource, EventCallback
+    from injector import InjectionBackend
+    from clipboard_session import ClipboardBackend, ClipboardSession
+
+
+@dataclass
+class FakeDocument:
+    """A text buffer with a caret, standing in for a focused edit control."""
+
+    text: str = ""
+    caret: int = 0
+    selection_end: Optional[int] = None
+    name: str = "Fake Document"
+    class_name: str = "FakeEdit"
+    runtime_id: Hashable = 1
+    has_text_pattern: bool = True
+    # False with has_text_pattern=False: no pattern at all (resolves to None)
+    has_value_pattern: bool = True
+    chars_read: int = field(default=0, repr=False)
+
+
+class FakeUIABackend(UIABackend):
+    """UIABackend over a `FakeDocument`; switch `focused` to simulate focus changes."""
+
+    def __init__(self, document: Optional[FakeDocument] = None) -> None:
+        self.focused: Optional[FakeDocument] = document
+        self.initialized = 0
+        self.resolves = 0
+
+    def initialize(self) -> None:
+        self.initialized += 1
+
+    def focused_element(self) -> Any:
+        return self.focused
+
+    def focus_key(self, element: Any) -> Hashable:
+        return element.runtime_id
+
+    def resolve_target(self, element: Any) -> Optional[UIATarget]:
+        self.resolves += 1
+        if not (element.has_text_pattern or element.has_value_pattern):
+            return None
+        kind = "text" if element.has_text_pattern else "value"
+        return UIATarget(element, element, kind, f"{element.name} ({element.class_name})")
+
+    def read_context(self, target: UIATarget, chars_before: int, chars_after: int, unit: int = 0) -> Optional[Dict[str, Any]]:
+        doc: FakeDocument = target.control
+        start = doc.caret
+        end = doc.selection_end if doc.selection_end is not None else doc.caret
+        before = doc.text[max(0, start - chars_before):start]
+        after = doc.text[end:end + chars_after]
+        selected = doc.text[start:end]
+        doc.chars_read += len(before) + len(after) + len(selected)
+        return {
+            "supported": True,
+            "app_name": target.display_name,
+            "before": before,
+            "after": after if target.kind == "text" else "",
+            "selected": selected,
+        }
+
+    def place_caret(self, target: UIATarget, offset: int) -> Optional[int]:
+        if target.kind != "text":
+            return None
+        doc: FakeDocument = target.control
+        end = doc.selection_end if doc.selection_end is not None else doc.caret
+        anchor = doc.caret if offset < 0 else end
+        pos = min(max(anchor + offset, 0), len(doc.text))
+        doc.caret, doc.selection_end = pos, None
+        return pos - anchor
+
+    def read_page(self, target: UIATarget, offset: int, size: int) -> Optional[Dict[str, Any]]:
+        if target.kind != "text":
+            return None
+        doc: FakeDocument = target.control
+        if offset < 0:
+            anchor = doc.caret
+            start = max(anchor + offset, 0)
+            stop = max(anchor + offset + min(size, -offset), start)
+            edge = anchor + offset < 0
+        else:
+            anchor = doc.selection_end if doc.selection_end is not None else doc.caret
+            start = min(anchor + offset, len(doc.text))
+            stop = min(start + size, len(doc.text))
+            edge = anchor + offset + size > len(doc.text)
+        text = doc.text[start:stop]
+        doc.chars_read += len(text)
+        return {"start": start - anchor, "end": stop - anchor, "text": text, "edge": edge}
+
+
+class FakeTextRange:
+    """Minimal IUIAutomationTextRange over a `FakeDocument`.
+
+    Mirrors the uiautomation.TextRange methods GhostWriter calls and counts
+    the characters returned by GetText in `document.chars_read`.
+    """
+
+    def __init__(self, document: FakeDocument, start: int, end: int) -> None:
+        self.document = document
+        self.start = start
+        self.end = end
+
+    def Clone(self) -> "FakeTextRange":
+        return FakeTextRange(self.document, self.start, self.end)
+
+    def GetText(self, maxLength: int = -1) -> str:
+        text = self.document.text[self.start:self.end]
+        if maxLength >= 0:
+            text = text[:maxLength]
+        self.document.chars_read += len(text)
+        return text
+
+    def MoveEndpointByRange(self, srcEndPoint: int, textRange: "FakeTextRange", targetEndPoint: int, waitTime: float = 0) -> bool:
+        pos = textRange.start if targetEndPoint == 0 else textRange.end
+        if srcEndPoint == 0:
+            self.start = pos
+            self.end = max(self.end, pos)
+        else:
+            self.end = pos
+            self.start = min(self.start, pos)
+        return True
+
+    def _step(self, pos: int, unit: int, count: int) -> tuple[int, int]:
+        text = self.document.text
+        if unit != 3:  # characters
+            target = min(max(pos + count, 0), len(text))
+            return target, abs(target - pos)
+        moved = 0
+        if count < 0:
+            while moved < -count and pos > 0:
+                pos = text.rfind("\n", 0, pos - 1) + 1
+                moved += 1
+        else:
+            while moved < count and pos < len(text):
+                nl = text.find("\n", pos)
+                pos = len(text) if nl < 0 else nl + 1
+                moved += 1
+        return pos, moved
+
+    def Move(self, unit: int, count: int, waitTime: float = 0) -> int:
+        # Collapses onto the start, then moves the (degenerate) range
+        pos, moved = self._step(self.start, unit, count)
+        self.start = self.end = pos
+        return moved if count >= 0 else -moved
+
+    def Select(self, waitTime: float = 0) -> bool:
+        self.document.caret = self.start
+        self.document.selection_end = self.end if self.end != self.start else None
+        return True
+
+    def MoveEndpointByUnit(self, endPoint: int, unit: int, count: int, waitTime: float = 0) -> int:
+        if endPoint == 0:
+            self.start, moved = self._step(self.start, unit, count)
+            self.end = max(self.end, self.start)
+        else:
+            self.end, moved = self._step(self.end, unit, count)
+            self.start = min(self.start, self.end)
+        return moved if count >= 0 else -moved
+
+
+class FakeTextPattern:
+    """Minimal TextPattern exposing DocumentRange and GetSelection."""
+
+    def __init__(self, document: FakeDocument) -> None:
+        self.document = document
+
+    @property
+    def DocumentRange(self) -> FakeTextRange:
+        return FakeTextRange(self.document, 0, len(self.document.text))
+
+    def GetSelection(self) -> list:
+        doc = self.document
+        end = doc.selection_end if doc.selection_end is not None else doc.caret
+        return [FakeTextRange(doc, doc.caret, end)]
+
+
+class ScriptedEventSource(ContextEventSource):
+    """Replays a script of `(delay_seconds, kind)` events on a thread.
+
+    An optional `action` per step (third tuple item) runs just before the
+    event fires, e.g. to edit a `FakeDocument` or switch focus.
+    """
+
+    def __init__(self, script: Iterable[Tuple[Any, ...]]) -> None:
+        self.script = list(script)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.done = threading.Event()
+
+    def start(self, callback: EventCallback) -> None:
+        self._thread = threading.Thread(target=self._run, args=(callback,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self, callback: EventCallback) -> None:
+        for step in self.script:
+            delay, kind = step[0], step[1]
+            if self._stopped.wait(delay):
+                break
+            if len(step) > 2 and step[2] is not None:
+                step[2]()
+            callback(kind)
+        self.done.set()
+
+
+class RecordingBackend(InjectionBackend):
+    """InjectionBackend that records calls and optionally edits a FakeDocument.
+
+    `per_call` and `per_char` add simulated latency (seconds) so throughput
+    and queueing behaviour can be measured without a desktop.  With
+    `unicode_native=False` it types ASCII only, like pyautogui; pass a
+    `clipboard` (the one behind the clipboard session) to let Ctrl+V paste.
+    """
+
+    name = "recording"
+
+    def __init__(
+        self,
+        document: Optional[FakeDocument] = None,
+        per_call: float = 0.0,
+        per_char: float = 0.0,
+        unicode_native: bool = True,
+        clipboard: Optional["FakeClipboard"] = None,
+    ) -> None:
+        self.document = document
+        self.per_call = per_call
+        self.per_char = per_char
+        self.unicode_native = unicode_native
+        self.clipboard = clipboard
+        self.can_paste = clipboard is not None
+        self.calls: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _delay(self, chars: int) -> None:
+        delay = self.per_call + self.per_char * chars
+        if delay > 0:
+            time.sleep(delay)
+
+    def _insert(self, text: str) -> None:
+        doc = self.document
+        if doc is not None:
+            end = doc.selection_end if doc.selection_end is not None else doc.caret
+            doc.text = doc.text[:doc.caret] + text + doc.text[end:]
+            doc.caret += len(text)
+            doc.selection_end = None
+
+    def type_text(self, text: str) -> None:
+        if not self.unicode_native and not text.isascii():
+            raise ValueError(f"Cannot type non-ASCII text: {text!r}")
+        self._delay(len(text))
+        with self._lock:
+            self.calls.append(("type", text))
+            self._insert(text)
+
+    def press(self, key: str, presses: int = 1) -> None:
+        self._delay(presses)
+        with self._lock:
+            self.calls.append(("press", (key, presses)))
+            doc = self.document
+            if doc is None:
+                return
+            for _ in range(presses):
+                if key == "backspace" and doc.caret > 0:
+                    doc.text = doc.text[:doc.caret - 1] + doc.text[doc.caret:]
+                    doc.caret -= 1
+                elif key == "delete":
+                    doc.text = doc.text[:doc.caret] + doc.text[doc.caret + 1:]
+                elif key == "left":
+                    doc.caret = max(0, doc.caret - 1)
+                elif key == "right":
+                    doc.caret = min(len(doc.text), doc.caret + 1)
+                doc.selection_end = None
+
+    def hotkey(self, *keys: str) -> None:
+        self._delay(1)
+        with self._lock:
+            self.calls.append(("hotkey", keys))
+            if keys == ("ctrl", "v") and self.clipboard is not None:
+                self._insert(self.clipboard.text)
+
+    @property
+    def typed(self) -> str:
+        with self._lock:
+            return "".join(arg for kind, arg in self.calls if kind == "type")
+
+
+class FakeContextProvider:
+    """Stand-in for context_grabber.get_cursor_context over a FakeDocument.
+
+    Share the document with a RecordingBackend so injected text shows up in
+    later grabs.  `latency` (seconds) is slept on every call.
+    """
+
+    def __init__(self, document: FakeDocument, latency: float = 0.0) -> None:
+        self.document = document
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, chars_before: int = 50, chars_after: int = 50, force: bool = False, unit: int = 0) -> Dict[str, Any]:
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        doc = self.document
+        text, start = doc.text, doc.caret
+        end = doc.selection_end if doc.selection_end is not None else start
+        doc.chars_read += min(start, chars_before) + chars_after
+        return {
+            "supported": True,
+            "app_name": f"{doc.name} ({doc.class_name})",
+            "before": text[max(0, start - chars_before):start],
+            "after": text[end:end + chars_after],
+            "selected": text[start:end],
+            "strategy": "uia",
+            "target": f"{doc.class_name}/{doc.runtime_id}",
+        }
+
+
+class FakeClipboard(ClipboardBackend):
+    """Multi-format in-memory clipboard with a Windows-style sequence number."""
+
+    def __init__(self, formats: Optional[Dict[int, bytes]] = None, text: str = "") -> None:
+        self.formats: Dict[int, bytes] = dict(formats or {})
+        self.text = text
+        self.seq = 1
+        self.writes = 0
+
+    def snapshot(self) -> Any:
+        return (self.text, dict(self.formats))
+
+    def restore(self, snapshot: Any) -> None:
+        self.text, formats = snapshot
+        self.formats = dict(formats)
+        self.seq += 1
+        self.writes += 1
+
+    def get_text(self) -> str:
+        return self.text
+
+    def set_text(self, text: str) -> None:
+        self.text = text
+        self.formats = {}
+        self.seq += 1
+        self.writes += 1
+
+    def sequence(self) -> Optional[int]:
+        return self.seq
+
+
+class FakeDesktopService:
+    """desktop_service.DesktopService over a FakeDocument, for the worker process.
+
+    Run it as `SupervisedWorker("fakes:FakeDesktopService")`.  `hang_next`
+    and `crash` make it misbehave the way a frozen app or a dying backend
+    would, so timeouts and watchdog restarts can be exercised.  `paste`
+    borrows a `FakeClipboard` holding `CLIPBOARD` through a ClipboardSession
+    that reports to the parent like the real service.
+    """
+
+    CLIPBOARD = "copied by the user"
+
+    def __init__(self, text: str = "") -> None:
+        try:
+            from .injector import set_backend
+        except ImportError:
+            from injector import set_backend
+        self.document = FakeDocument(text=text, caret=len(text))
+        self.backend = RecordingBackend(self.document)
+        set_backend(self.backend)
+        self.provider = FakeContextProvider(self.document)
+        self.clipboard = ClipboardSession(FakeClipboard(text=self.CLIPBOARD))
+        # method -> seconds to sleep on its next call
+        self._hangs: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _maybe_hang(self, method: str) -> None:
+        with self._lock:
+            seconds = self._hangs.pop(method, 0.0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def hang_next(self, method: str, seconds: float) -> None:
+        with self._lock:
+            self._hangs[method] = seconds
+
+    def crash(self) -> None:
+        os._exit(3)
+
+    def ping(self) -> int:
+        return os.getpid()
+
+    def attach_worker(self, publish: Callable[[str, Any], None]) -> None:
+        self.clipboard.listener = lambda key, value: publish(f"clipboard.{key}", value)
+
+    def paste(self, text: str) -> Dict[str, Any]:
+        with self.clipboard.hold() as clipboard:
+            clipboard.set_text(text)
+            self._maybe_hang("paste")
+            self.backend.type_text(text)
+        return {"ok": True, "mode": "paste"}
+
+    def warm_up(self) -> bool:
+        return True
+
+    def document_text(self) -> str:
+        return self.document.text
+
+    def inject_text(self, text: str, app: str = "") -> Dict[str, Any]:
+        self._maybe_hang("inject_text")
+        self.backend.type_text(text)
+        return {"ok": True, "mode": "type"}
+
+    def press_key(self, key: str, presses: int = 1) -> Dict[str, Any]:
+        self._maybe_hang("press_key")
+        self.backend.press(key, presses)
+        return {"ok": True, "mode": "key", "key": key}
+
+    def press_hotkey(self, *keys: str) -> Dict[str, Any]:
+        self._maybe_hang("press_hotkey")
+        self.backend.hotkey(*keys)
+        return {"ok": True, "mode": "key", "key": "+".join(keys)}
+
+    def place_caret(self, offset: int) -> Dict[str, Any]:
+        self._maybe_hang("place_caret")
+        self.backend.press("left" if offset < 0 else "right", abs(offset))
+        return {"ok": True, "mode": "keys", "moved": offset}
+
+    def get_cursor_context(self, force: bool = False) -> Dict[str, Any]:
+        self._maybe_hang("get_cursor_context")
+        return self.provider(force=force)
+
+    def get_context_page(self, offset: int, size: int) -> Dict[str, Any]:
+        self._maybe_hang("get_context_page")
+        return {"ok": False, "code": "NOT_SUPPORTED", "message": "此應用程式無法讀取更多內容", "start": offset, "end": offset, "text": "", "edge": True}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": len(self.backend.calls), "grabs": self.provider.calls}
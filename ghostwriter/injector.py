@@ -1,49 +1,672 @@
-"""Keystroke injection engine for GhostWriter."""
+"""Keystroke injection engine for GhostWriter.
+
+Text reaches the target app through a pluggable `InjectionBackend`:
+
+- `SendInputBackend` (Windows): the whole string goes out as native
+  KEYEVENTF_UNICODE key events in one batched SendInput call, no clipboard.
+- `XTestBackend` (Linux/X11): XTest key events, with Unicode characters
+  mapped onto spare keycodes; works under Xvfb.
+- `PyAutoGUIBackend`: the original path (pyautogui.write, which only
+  types ASCII, plus clipboard + Ctrl+V).
+- `fakes.RecordingBackend`: records calls, for headless runs.
+
+Pick one with INJECT_BACKEND=auto|sendinput|xtest|pyautogui|recording.
+
+Each payload is split into ASCII and non-ASCII runs and every run is typed
+or pasted, whichever `CostModel` predicts is cheaper for this backend and
+target app (see "Injection planner" below).  INJECT_PLANNER=0 restores the
+old all-or-nothing choice.
+"""
 
 from __future__ import annotations
 
+import os
+import sys
+import threading
 import time
-from typing import Any, Dict
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import pyautogui
-import pyperclip
+try:
+    from .clipboard_session import get_clipboard_session
+except ImportError:
+    from clipboard_session import get_clipboard_session
 
+INJECT_BACKEND = os.environ.get("INJECT_BACKEND", "auto")
+INJECT_PLANNER = os.environ.get("INJECT_PLANNER", "1") != "0"
 
-def _is_ascii(text: str) -> bool:
-    try:
-        text.encode("ascii")
-        return True
-    except UnicodeEncodeError:
-        return False
 
+# ── Backends ─────────────────────────────────────────────────
 
-def _inject_ascii(text: str) -> Dict[str, Any]:
-    pyautogui.write(text, interval=0.01)
-    return {"ok": True, "mode": "ascii", "text": text}
+class InjectionBackend(ABC):
+    """Emits keystrokes into the focused window."""
 
+    name = "base"
+    # True if type_text can emit any Unicode text without the clipboard
+    unicode_native = False
+    # False if Ctrl+V cannot be used to paste (e.g. fakes without a clipboard)
+    can_paste = True
 
-def _inject_clipboard(text: str) -> Dict[str, Any]:
-    previous_clipboard = pyperclip.paste()
-    try:
-        pyperclip.copy(text)
-        time.sleep(0.01)
-        pyautogui.hotkey("ctrl", "v")
-        return {"ok": True, "mode": "clipboard", "text": text}
-    finally:
-        pyperclip.copy(previous_clipboard)
+    @abstractmethod
+    def type_text(self, text: str) -> None:
+        """Type `text` as-is into the focused window."""
+
+    @abstractmethod
+    def press(self, key: str, presses: int = 1) -> None:
+        """Press and release `key` (a pyautogui key name) `presses` times."""
+
+    @abstractmethod
+    def hotkey(self, *keys: str) -> None:
+        """Press `keys` together, e.g. hotkey("ctrl", "v")."""
+
+    def close(self) -> None:
+        pass
+
+
+class PyAutoGUIBackend(InjectionBackend):
+    """Legacy backend: pyautogui for keys, clipboard paste for non-ASCII."""
+
+    name = "pyautogui"
+
+    def __init__(self) -> None:
+        import pyautogui
+        self._gui = pyautogui
+
+    def type_text(self, text: str) -> None:
+        self._gui.write(text, interval=0.01)
+
+    def press(self, key: str, presses: int = 1) -> None:
+        self._gui.press(key, presses=presses)
+
+    def hotkey(self, *keys: str) -> None:
+        self._gui.hotkey(*keys)
+
+
+class SendInputBackend(InjectionBackend):  # pragma: no cover - Windows only
+    """Native Windows SendInput with KEYEVENTF_UNICODE."""
+
+    name = "sendinput"
+    unicode_native = True
+
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_EXTENDEDKEY = 0x0001
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_UNICODE = 0x0004
+    # Keep single SendInput calls short enough for slow target input queues
+    MAX_EVENTS_PER_CALL = 1000
+
+    VK = {
+        "backspace": 0x08, "tab": 0x09, "enter": 0x0D, "return": 0x0D,
+        "shift": 0x10, "ctrl": 0x11, "alt": 0x12, "esc": 0x1B, "escape": 0x1B,
+        "space": 0x20, "pageup": 0x21, "pagedown": 0x22, "end": 0x23,
+        "home": 0x24, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+        "insert": 0x2D, "delete": 0x2E, "win": 0x5B,
+    }
+    EXTENDED = {"pageup", "pagedown", "end", "home", "left", "up", "right", "down", "insert", "delete"}
+
+    def __init__(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        ULONG_PTR = ctypes.c_size_t
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                        ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                        ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+        class HARDWAREINPUT(ctypes.Structure):
+            _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD), ("wParamH", wintypes.WORD)]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+        self._ctypes = ctypes
+        self._INPUT = INPUT
+        self._KEYBDINPUT = KEYBDINPUT
+        self._send = ctypes.windll.user32.SendInput
+        self._send.argtypes = [wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int]
+        self._send.restype = wintypes.UINT
+
+    def _key_event(self, vk: int, scan: int, flags: int) -> Any:
+        event = self._INPUT(type=self.INPUT_KEYBOARD)
+        event.u.ki = self._KEYBDINPUT(wVk=vk, wScan=scan, dwFlags=flags, time=0, dwExtraInfo=0)
+        return event
+
+    def _vk_events(self, key: str, up: bool) -> Any:
+        key = key.lower()
+        if key in self.VK:
+            vk = self.VK[key]
+        elif len(key) == 1 and key.isalnum():
+            vk = ord(key.upper())
+        else:
+            raise ValueError(f"Unsupported key: {key}")
+        flags = self.KEYEVENTF_EXTENDEDKEY if key in self.EXTENDED else 0
+        if up:
+            flags |= self.KEYEVENTF_KEYUP
+        return self._key_event(vk, 0, flags)
+
+    def _flush(self, events: List[Any]) -> None:
+        for i in range(0, len(events), self.MAX_EVENTS_PER_CALL):
+            batch = events[i:i + self.MAX_EVENTS_PER_CALL]
+            array = (self._INPUT * len(batch))(*batch)
+            sent = self._send(len(batch), array, self._ctypes.sizeof(self._INPUT))
+            if sent != len(batch):
+                # UIPI blocks input into elevated windows
+                raise OSError(f"SendInput injected {sent}/{len(batch)} events")
+
+    def type_text(self, text: str) -> None:
+        events: List[Any] = []
+        text = text.replace("\r\n", "\n")
+        for ch in text:
+            if ch in "\r\n":
+                events.append(self._vk_events("enter", False))
+                events.append(self._vk_events("enter", True))
+                continue
+            if ch == "\t":
+                events.append(self._vk_events("tab", False))
+                events.append(self._vk_events("tab", True))
+                continue
+            data = ch.encode("utf-16-le")
+            # Characters outside the BMP go out as a surrogate pair
+            for j in range(0, len(data), 2):
+                unit = int.from_bytes(data[j:j + 2], "little")
+                events.append(self._key_event(0, unit, self.KEYEVENTF_UNICODE))
+                events.append(self._key_event(0, unit, self.KEYEVENTF_UNICODE | self.KEYEVENTF_KEYUP))
+        self._flush(events)
+
+    def press(self, key: str, presses: int = 1) -> None:
+        events: List[Any] = []
+        for _ in range(presses):
+            events.append(self._vk_events(key, False))
+            events.append(self._vk_events(key, True))
+        self._flush(events)
+
+    def hotkey(self, *keys: str) -> None:
+        events = [self._vk_events(k, False) for k in keys]
+        events += [self._vk_events(k, True) for k in reversed(keys)]
+        self._flush(events)
+
+
+class XTestBackend(InjectionBackend):
+    """X11 XTest backend (python-xlib).
+
+    Characters without a keycode in the current layout are bound to spare
+    (unmapped) keycodes.  Bindings are kept and reused across calls so a
+    repeated character does not trigger another MappingNotify.  They are
+    cleared on close().
+    """
+
+    name = "xtest"
+    unicode_native = True
+
+    KEYSYMS = {
+        "backspace": "BackSpace", "tab": "Tab", "enter": "Return", "return": "Return",
+        "shift": "Shift_L", "ctrl": "Control_L", "alt": "Alt_L", "esc": "Escape",
+        "escape": "Escape", "space": "space", "pageup": "Prior", "pagedown": "Next",
+        "end": "End", "home": "Home", "left": "Left", "up": "Up", "right": "Right",
+        "down": "Down", "insert": "Insert", "delete": "Delete", "win": "Super_L",
+    }
+
+    def __init__(self, display_name: Optional[str] = None) -> None:
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+
+        self._X = X
+        self._XK = XK
+        self._xtest = xtest
+        self._display = display.Display(display_name)
+        if not self._display.has_extension("XTEST"):
+            raise RuntimeError("X server has no XTEST extension")
+
+        first = self._display.display.info.min_keycode
+        count = self._display.display.info.max_keycode - first + 1
+        mapping = self._display.get_keyboard_mapping(first, count)
+        self._width = max(len(row) for row in mapping) if mapping else 1
+        self._spare = [first + i for i, row in enumerate(mapping) if not any(row)]
+        if not self._spare:
+            raise RuntimeError("No spare keycodes available for Unicode input")
+        self._bound: Dict[int, int] = {}  # keysym -> spare keycode, in LRU order
+        self._shift = self._display.keysym_to_keycode(XK.string_to_keysym("Shift_L"))
+
+    @staticmethod
+    def _keysym_for(ch: str) -> int:
+        code = ord(ch)
+        if 0x20 <= code <= 0x7E or 0xA0 <= code <= 0xFF:
+            return code
+        return 0x01000000 | code
+
+    def _keycode_for(self, keysym: int) -> tuple[int, bool]:
+        """Return (keycode, needs_shift), binding a spare keycode if needed."""
+        keycode = self._display.keysym_to_keycode(keysym)
+        if keycode and keycode not in self._bound.values():
+            if self._display.keycode_to_keysym(keycode, 0) == keysym:
+                return keycode, False
+            if self._display.keycode_to_keysym(keycode, 1) == keysym:
+                return keycode, True
+
+        if keysym in self._bound:
+            keycode = self._bound.pop(keysym)
+            self._bound[keysym] = keycode
+            return keycode, False
+
+        if len(self._bound) < len(self._spare):
+            keycode = self._spare[len(self._bound)]
+        else:
+            oldest = next(iter(self._bound))
+            keycode = self._bound.pop(oldest)
+        self._display.change_keyboard_mapping(keycode, [(keysym,) * self._width])
+        self._bound[keysym] = keycode
+        return keycode, False
+
+    def _tap(self, keycode: int, shift: bool = False) -> None:
+        fake = self._xtest.fake_input
+        if shift:
+            fake(self._display, self._X.KeyPress, self._shift)
+        fake(self._display, self._X.KeyPress, keycode)
+        fake(self._display, self._X.KeyRelease, keycode)
+        if shift:
+            fake(self._display, self._X.KeyRelease, self._shift)
+
+    def _named_keycode(self, key: str) -> int:
+        name = self.KEYSYMS.get(key.lower(), key)
+        keysym = self._XK.string_to_keysym(name)
+        keycode = self._display.keysym_to_keycode(keysym) if keysym else 0
+        if not keycode:
+            raise ValueError(f"Unsupported key: {key}")
+        return keycode
+
+    def type_text(self, text: str) -> None:
+        for ch in text.replace("\r\n", "\n"):
+            if ch in "\r\n":
+                self._tap(self._named_keycode("enter"))
+            elif ch == "\t":
+                self._tap(self._named_keycode("tab"))
+            else:
+                self._tap(*self._keycode_for(self._keysym_for(ch)))
+        # One round trip for the whole batch
+        self._display.sync()
+
+    def press(self, key: str, presses: int = 1) -> None:
+        keycode = self._named_keycode(key)
+        for _ in range(presses):
+            self._tap(keycode)
+        self._display.sync()
+
+    def hotkey(self, *keys: str) -> None:
+        codes = [self._named_keycode(k) for k in keys]
+        for code in codes:
+            self._xtest.fake_input(self._display, self._X.KeyPress, code)
+        for code in reversed(codes):
+            self._xtest.fake_input(self._display, self._X.KeyRelease, code)
+        self._display.sync()
+
+    def close(self) -> None:
+        for keycode in self._bound.values():
+            self._display.change_keyboard_mapping(keycode, [(0,) * self._width])
+        self._bound.clear()
+        self._display.sync()
+
+
+def create_backend(name: str = "auto") -> InjectionBackend:
+    """Instantiate a backend by name; "auto" picks the best one available."""
+    if name == "sendinput":
+        return SendInputBackend()
+    if name == "xtest":
+        return XTestBackend()
+    if name == "pyautogui":
+        return PyAutoGUIBackend()
+    if name == "recording":
+        try:
+            from .fakes import RecordingBackend
+        except ImportError:
+            from fakes import RecordingBackend
+        return RecordingBackend()
+    if name != "auto":
+        raise ValueError(f"Unknown injection backend: {name}")
+
+    if sys.platform == "win32":
+        return SendInputBackend()
+    if os.environ.get("DISPLAY"):
+        try:
+            return XTestBackend()
+        except Exception:
+            pass
+    return PyAutoGUIBackend()
+
+
+_backend: Optional[InjectionBackend] = None
+_backend_lock = threading.Lock()
+
+# Per backend/path throughput: {"sendinput": {"chars": n, "seconds": s, "calls": c}}
+_throughput: Dict[str, Dict[str, float]] = {}
+
+
+def get_backend() -> InjectionBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(INJECT_BACKEND)
+        return _backend
+
+
+def set_backend(backend: Optional[InjectionBackend]) -> None:
+    """Replace the active backend (None re-selects from INJECT_BACKEND)."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _backend = backend
+
+
+def _record(path: str, chars: int, seconds: float) -> None:
+    entry = _throughput.setdefault(path, {"chars": 0, "seconds": 0.0, "calls": 0})
+    entry["chars"] += chars
+    entry["seconds"] += seconds
+    entry["calls"] += 1
+
+
+def injection_stats() -> Dict[str, Dict[str, float]]:
+    """Throughput per backend/path in characters per second."""
+    stats = {}
+    for path, entry in _throughput.items():
+        seconds = entry["seconds"]
+        stats[path] = {
+            "chars": entry["chars"],
+            "calls": entry["calls"],
+            "chars_per_sec": round(entry["chars"] / seconds, 1) if seconds > 0 else 0.0,
+        }
+    return stats
+
+
+# ── Injection planner ────────────────────────────────────
+# Typing costs per character and pasting costs mostly per call (set the
+# clipboard, wait for it, Ctrl+V), and pyautogui can only type ASCII.  So a
+# payload is split into runs of ASCII / non-ASCII characters and each run
+# is typed or pasted, whichever the cost model predicts is cheaper; runs
+# next to each other on the same path become one call.  The model starts
+# from per-backend priors and is refitted from every call's measured time,
+# per target app.
+
+TYPED = "typed"
+PASTE = "clipboard"
+
+# (fixed seconds per call, seconds per char) per backend and path/class
+COST_PRIORS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "pyautogui": {"typed:ascii": (0.002, 0.011), "clipboard": (0.06, 0.00001)},
+    "sendinput": {"typed:ascii": (0.0005, 0.00003), "typed:unicode": (0.0005, 0.00003), "clipboard": (0.04, 0.00001)},
+    # New non-ASCII characters cost a keymap change each
+    "xtest": {"typed:ascii": (0.001, 0.0002), "typed:unicode": (0.001, 0.003), "clipboard": (0.04, 0.00001)},
+}
+DEFAULT_PRIORS = {"typed:ascii": (0.001, 0.0001), "typed:unicode": (0.001, 0.0001), "clipboard": (0.05, 0.00001)}
+
+
+def _char_class(ch: str) -> str:
+    return "ascii" if ch < "\x80" else "unicode"
+
+
+def _runs(text: str) -> List[Tuple[str, str]]:
+    """Split text into maximal (class, run) pieces."""
+    runs: List[Tuple[str, str]] = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i == len(text) or _char_class(text[i]) != _char_class(text[start]):
+            runs.append((_char_class(text[start]), text[start:i]))
+            start = i
+    return runs
+
+
+class _LinearFit:
+    """Least squares for seconds = fixed + per_char * chars.
+
+    Measurements decay so the fit follows the app; the prior stays in as two
+    light points, which keeps the slope defined when every call so far had
+    the same length.
+    """
+
+    def __init__(self, fixed: float, per_char: float, decay: float = 0.9, prior_weight: float = 0.5) -> None:
+        self.decay = decay
+        self._prior = [0.0] * 5  # weight, sum x, sum y, sum xx, sum xy
+        self._obs = [0.0] * 5
+        for x in (1.0, 100.0):
+            self._add(self._prior, x, fixed + per_char * x, prior_weight)
+        self.samples = 0
+
+    @staticmethod
+    def _add(sums: List[float], x: float, y: float, w: float) -> None:
+        sums[0] += w
+        sums[1] += w * x
+        sums[2] += w * y
+        sums[3] += w * x * x
+        sums[4] += w * x * y
+
+    def observe(self, chars: int, seconds: float) -> None:
+        self._obs = [v * self.decay for v in self._obs]
+        self._add(self._obs, float(chars), seconds, 1.0)
+        self.samples += 1
+
+    def coefficients(self) -> Tuple[float, float]:
+        w, sx, sy, sxx, sxy = (a + b for a, b in zip(self._prior, self._obs))
+        per_char = (w * sxy - sx * sy) / max(w * sxx - sx * sx, 1e-12)
+        if per_char < 0:
+            return sy / w, 0.0
+        fixed = (sy - per_char * sx) / w
+        if fixed < 0:
+            return 0.0, sxy / sxx
+        return fixed, per_char
+
+    def copy(self) -> "_LinearFit":
+        clone = _LinearFit.__new__(_LinearFit)
+        clone.decay, clone.samples = self.decay, self.samples
+        clone._prior, clone._obs = list(self._prior), list(self._obs)
+        return clone
+
+
+class CostModel:
+    """Predicted injection time per (backend, app, path), learned online.
+
+    Paths are "typed:ascii", "typed:unicode" and "clipboard".  A new app
+    starts from the backend-wide fit, which every measurement also updates.
+    """
+
+    # After a failed paste in an app, how long to stick to typing there
+    PASTE_BACKOFF_S = 60.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fits: Dict[Tuple[str, str, str], _LinearFit] = {}
+        # app -> monotonic time until which pastes are not planned
+        self._paste_blocked_until: Dict[str, float] = {}
+
+    def _fit(self, backend: str, app: str, path: str) -> _LinearFit:
+        key = (backend, app, path)
+        fit = self._fits.get(key)
+        if fit is None:
+            if app:
+                fit = self._fit(backend, "", path).copy()
+            else:
+                fixed, per_char = COST_PRIORS.get(backend, DEFAULT_PRIORS).get(path, DEFAULT_PRIORS[path])
+                fit = _LinearFit(fixed, per_char)
+            self._fits[key] = fit
+        return fit
+
+    def coefficients(self, backend: str, app: str, path: str) -> Tuple[float, float]:
+        with self._lock:
+            return self._fit(backend, app, path).coefficients()
+
+    def observe(self, backend: str, app: str, path: str, chars: int, seconds: float) -> None:
+        with self._lock:
+            if app:
+                self._fit(backend, app, path).observe(chars, seconds)
+            self._fit(backend, "", path).observe(chars, seconds)
+
+    def block_paste(self, app: str = "") -> None:
+        with self._lock:
+            self._paste_blocked_until[app] = time.monotonic() + self.PASTE_BACKOFF_S
+
+    def paste_allowed(self, app: str = "") -> bool:
+        with self._lock:
+            return time.monotonic() >= self._paste_blocked_until.get(app, 0.0)
+
+    @staticmethod
+    def _baseline(text: str, backend: InjectionBackend) -> List[Tuple[str, str]]:
+        """Type it if the backend can, else paste it all (INJECT_PLANNER=0)."""
+        typed = backend.unicode_native or all(c == "ascii" for c, _ in _runs(text))
+        return [(TYPED if typed else PASTE, text)]
+
+    def plan(self, text: str, backend: InjectionBackend, app: str = "") -> List[Tuple[str, str]]:
+        """Cheapest ordered list of (path, text) steps that injects `text`.
+
+        Non-ASCII text on a backend that can only type ASCII needs a paste;
+        if pastes are backed off for `app`, that text is pasted anyway.
+        """
+        if not INJECT_PLANNER:
+            return self._baseline(text, backend)
+
+        runs = _runs(text)
+        paths = [TYPED] + ([PASTE] if backend.can_paste and self.paste_allowed(app) else [])
+        coef = {
+            "typed:ascii": self.coefficients(backend.name, app, "typed:ascii"),
+            "typed:unicode": self.coefficients(backend.name, app, "typed:unicode"),
+            PASTE: self.coefficients(backend.name, app, PASTE),
+        }
+        inf = float("inf")
+        # cost[path]: cheapest plan so far whose last step uses `path`;
+        # back[i][path]: path of run i-1 in that plan
+        cost = {TYPED: 0.0, PASTE: 0.0, None: 0.0}
+        start = True
+        back: List[Dict[str, Optional[str]]] = []
+        for cls, run in runs:
+            new_cost: Dict[Any, float] = {}
+            choice: Dict[str, Optional[str]] = {}
+            for path in paths:
+                if path == TYPED and cls == "unicode" and not backend.unicode_native:
+                    continue
+                fixed, per_char = coef[PASTE if path == PASTE else f"typed:{cls}"]
+                best, best_prev = inf, None
+                for prev in ([None] if start else [TYPED, PASTE]):
+                    if prev not in cost or cost[prev] == inf:
+                        continue
+                    # Continuing the previous step on the same path saves a call
+                    total = cost[prev] + (0.0 if prev == path else fixed) + per_char * len(run)
+                    if total < best:
+                        best, best_prev = total, prev
+                new_cost[path], choice[path] = best, best_prev
+            for path in (TYPED, PASTE):
+                new_cost.setdefault(path, inf)
+            cost, start = new_cost, False
+            back.append(choice)
+        if not runs:
+            return []
+
+        path: Optional[str] = min((TYPED, PASTE), key=lambda p: cost[p])
+        if cost[path] == inf:
+            # No path we may use covers every run
+            return self._baseline(text, backend)
+        chosen: List[str] = []
+        for choice in reversed(back):
+            chosen.append(path)
+            path = choice[path]
+        chosen.reverse()
+
+        steps: List[Tuple[str, str]] = []
+        for path, (_, run) in zip(chosen, runs):
+            if steps and steps[-1][0] == path:
+                steps[-1] = (path, steps[-1][1] + run)
+            else:
+                steps.append((path, run))
+        return steps
 
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{"backend/app": {path: {"fixed_ms", "us_per_char", "samples"}}} for fitted paths."""
+        with self._lock:
+            out: Dict[str, Dict[str, Any]] = {}
+            for (backend, app, path), fit in self._fits.items():
+                if not fit.samples:
+                    continue
+                fixed, per_char = fit.coefficients()
+                out.setdefault(f"{backend}/{app or '*'}", {})[path] = {
+                    "fixed_ms": round(fixed * 1000, 2),
+                    "us_per_char": round(per_char * 1e6, 1),
+                    "samples": fit.samples,
+                }
+            return out
 
-def inject_text(text: str) -> Dict[str, Any]:
-    """Inject text into active window and return structured result."""
+
+cost_model = CostModel()
+
+
+# ── Injection paths ──────────────────────────────────────────
+
+def _paste(clipboard: Any, backend: InjectionBackend, text: str) -> None:
+    before = clipboard.marker()
+    clipboard.set_text(text)
+    # Paste as soon as the new contents are visible instead of a fixed sleep
+    if before != ("text", text):
+        clipboard.wait_for_change(before, timeout=0.05)
+    backend.hotkey("ctrl", "v")
+
+
+def _run_step(backend: InjectionBackend, clipboard: Any, path: str, text: str, app: str = "") -> str:
+    """Inject one planned step; returns the path actually used."""
+    if path == PASTE:
+        try:
+            _paste(clipboard, backend, text)
+            return PASTE
+        except Exception:
+            if not (backend.unicode_native or all(c == "ascii" for c, _ in _runs(text))):
+                raise
+            # Typing gets there too; stop planning pastes here for a while
+            cost_model.block_paste(app)
+    backend.type_text(text)
+    return TYPED
+
+
+def inject_text(text: str, app: str = "") -> Dict[str, Any]:
+    """Inject text into active window and return structured result.
+
+    `app` (the foreground process name) selects the cost model calibration.
+    """
     try:
         if not isinstance(text, str):
             return {"ok": False, "message": "Invalid text payload", "code": "INJECT_ERR"}
         if text == "":
             return {"ok": True, "mode": "noop", "text": ""}
 
-        if _is_ascii(text):
-            return _inject_ascii(text)
-        return _inject_clipboard(text)
+        backend = get_backend()
+        steps = cost_model.plan(text, backend, app)
+        if not backend.can_paste and any(path == PASTE for path, _ in steps):
+            return {
+                "ok": False,
+                "message": "此輸入方式無法輸入這些字元",
+                "code": "INJECT_UNSUPPORTED",
+                "detail": f"{backend.name} types ASCII only and cannot paste",
+            }
+        modes = []
+        # One clipboard hold for the whole plan: saved and restored once
+        hold = get_clipboard_session().hold() if any(path == PASTE for path, _ in steps) else nullcontext(None)
+        with hold as clipboard:
+            for path, part in steps:
+                start = time.perf_counter()
+                used = _run_step(backend, clipboard, path, part, app)
+                elapsed = time.perf_counter() - start
+                classes = {c for c, _ in _runs(part)}
+                if used == PASTE:
+                    cost_model.observe(backend.name, app, PASTE, len(part), elapsed)
+                elif len(classes) == 1:
+                    cost_model.observe(backend.name, app, f"typed:{classes.pop()}", len(part), elapsed)
+                mode = "clipboard" if used == PASTE else backend.name
+                _record(mode, len(part), elapsed)
+                modes.append(mode)
+        mode = modes[0] if len(set(modes)) == 1 else "mixed"
+        return {"ok": True, "mode": mode, "text": text, "steps": len(steps)}
     except Exception as exc:  # pragma: no cover - hardware/system dependent
         return {
             "ok": False,
@@ -51,3 +674,112 @@ def inject_text(text: str) -> Dict[str, Any]:
             "code": "INJECT_ERR",
             "detail": str(exc),
         }
+
+
+# ── Chunked injection ────────────────────────────────────────
+# A long payload injected in one call blocks the injection thread with no
+# way to report progress or stop (pyautogui types ~100 chars/s).  Instead it
+# goes out in chunks sized from the app's measured rate, so each takes
+# about CHUNK_TARGET_S, with a progress callback and a cancel check between
+# chunks.
+
+CHUNK_TARGET_S = float(os.environ.get("INJECT_CHUNK_TARGET", "0.15"))
+
+
+class ChunkPlanner:
+    """Chunk size per app from an EWMA of its injection rate (chars/s)."""
+
+    def __init__(self, target: float = CHUNK_TARGET_S, min_chars: int = 16, max_chars: int = 4000, initial_rate: float = 100.0) -> None:
+        self.target = target
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.initial_rate = initial_rate
+        self._lock = threading.Lock()
+        self._rates: Dict[str, float] = {}
+
+    def size(self, app: str) -> int:
+        with self._lock:
+            rate = self._rates.get(app, self.initial_rate)
+        return int(min(max(rate * self.target, self.min_chars), self.max_chars))
+
+    def observe(self, app: str, chars: int, seconds: float) -> None:
+        if chars <= 0:
+            return
+        rate = chars / max(seconds, 1e-4)
+        with self._lock:
+            old = self._rates.get(app)
+            self._rates[app] = rate if old is None else old * 0.7 + rate * 0.3
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {app: round(rate, 1) for app, rate in self._rates.items()}
+
+
+chunk_planner = ChunkPlanner()
+
+
+def _chunk_end(text: str, start: int, size: int) -> int:
+    """End of the next chunk: at most `size` chars, cut after whitespace if
+    there is some in its second half, never inside a CRLF pair."""
+    end = start + size
+    if end >= len(text):
+        return len(text)
+    for i in range(end, start + size // 2, -1):
+        if text[i - 1].isspace() and not (text[i - 1] == "\r" and text[i] == "\n"):
+            return i
+    if text[end - 1] == "\r" and text[end] == "\n":
+        end += 1
+    return end
+
+
+def inject_stream(
+    text: str,
+    app: str = "",
+    on_chunk: Optional[Callable[[int, int, float], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+    inject: Callable[[str, str], Dict[str, Any]] = inject_text,
+) -> Dict[str, Any]:
+    """Inject `text` chunk by chunk; stops early once `cancelled()` is true.
+
+    `on_chunk(done, total, chars_per_sec)` runs after every chunk, and each
+    chunk goes through `inject(chunk, app)` (the server passes the desktop
+    worker's).  The result's "text" is what was actually injected,
+    "cancelled" whether the rest was dropped.
+    """
+    done = chunks = 0
+    mode = "noop"
+    total = len(text)
+    while done < total:
+        if cancelled is not None and cancelled():
+            return {"ok": True, "mode": mode, "text": text[:done], "chunks": chunks, "cancelled": True}
+        end = _chunk_end(text, done, chunk_planner.size(app))
+        start = time.perf_counter()
+        result = inject(text[done:end], app)
+        elapsed = time.perf_counter() - start
+        if not result.get("ok", False):
+            return dict(result, text=text[:done], chunks=chunks)
+        chunk_planner.observe(app, end - done, elapsed)
+        rate = (end - done) / max(elapsed, 1e-4)
+        mode = result.get("mode", mode)
+        done, chunks = end, chunks + 1
+        if on_chunk is not None:
+            on_chunk(done, total, rate)
+    return {"ok": True, "mode": mode, "text": text, "chunks": chunks, "cancelled": False}
+
+
+def press_key(key: str, presses: int = 1) -> Dict[str, Any]:
+    """Press a named key (backspace, left, ...) `presses` times."""
+    try:
+        get_backend().press(key, presses)
+        return {"ok": True, "mode": "key", "key": key}
+    except Exception as exc:  # pragma: no cover - hardware/system dependent
+        return {"ok": False, "message": "按鍵失敗", "code": "KEY_ERR", "detail": str(exc)}
+
+
+def press_hotkey(*keys: str) -> Dict[str, Any]:
+    """Press a key chord such as ("ctrl", "a")."""
+    try:
+        get_backend().hotkey(*keys)
+        return {"ok": True, "mode": "key", "key": "+".join(keys)}
+    except Exception as exc:  # pragma: no cover - hardware/system dependent
+        return {"ok": False, "message": "按鍵失敗", "code": "KEY_ERR", "detail": str(exc)}
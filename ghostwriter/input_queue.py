@@ -0,0 +1,322 @@
+"""Ordered injection worker for GhostWriter.
+
+Every event that produces keystrokes on the PC (text, key commands, cursor
+moves) is funnelled through one dedicated thread so the target app sees
+each client's input in strict arrival order.  That order is only as good as
+the order ops are submitted in: server.py runs each client's handlers one
+at a time on its connection (Flask-SocketIO `async_handlers=False`; one
+handler thread in the ASGI front end).  Text payloads that pile up
+behind a running injection are merged into a single write before they reach
+the injector.
+
+With several clients connected, each has its own queue and the worker
+serves them round-robin.  It only switches clients at a safe boundary: a
+client that stopped mid-word keeps the stream until it finishes the word or
+goes quiet for `hold_timeout`, so two people typing never interleave
+letters inside each other's words.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("ghostwriter.queue")
+
+
+@dataclass
+class InputOp:
+    """One queued input operation.
+
+    kind is "text", "key", "move" or "dictation" (`text` is the whole
+    hypothesis for `utterance`).  Only the fields relevant to the kind are
+    filled in; `merged` counts how many payloads were folded into it.
+    Timestamps are time.monotonic(); `client_ts` is the client's send time
+    in server-clock epoch ms, and `trace_ids` are echoed back when tracing.
+    `acks` are `(edit_ops.BatchResult, index)` for every batch op this op
+    carries (several once merged); its result is recorded in each.  Ops only
+    merge within one `epoch` (server.py moves a client's epoch on to void
+    what it queued before).
+    """
+
+    kind: str
+    sid: Optional[str] = None
+    text: str = ""
+    mode: str = "stream"
+    key: str = ""
+    direction: str = ""
+    steps: int = 0
+    utterance: str = ""
+    final: bool = False
+    merged: int = 1
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    client_ts: Optional[float] = None
+    trace_ids: List[Any] = field(default_factory=list)
+    acks: List[Tuple[Any, int]] = field(default_factory=list)
+    epoch: int = 0
+
+
+def ends_mid_word(text: str) -> bool:
+    """True if `text` stops inside a word, where another client must not cut in.
+
+    Whitespace and punctuation end a word; so does a CJK character, since
+    those scripts do not separate words with spaces.
+    """
+    if not text:
+        return False
+    ch = text[-1]
+    if not ch.isalnum():
+        return False
+    return unicodedata.east_asian_width(ch) not in ("W", "F")
+
+
+class InjectionWorker:
+    """Single-thread executor with bounded per-client FIFOs and text coalescing.
+
+    `execute(op)` performs the injection and returns the usual result dict
+    (`{"ok": bool, ...}`); `on_done(op, result)` is called on the worker
+    thread afterwards so the caller can emit errors or schedule follow-ups.
+    `maxsize` bounds each client's queue.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[InputOp], Dict[str, Any]],
+        on_done: Optional[Callable[[InputOp, Dict[str, Any]], None]] = None,
+        maxsize: int = 256,
+        max_merge_chars: int = 512,
+        put_timeout: float = 0.5,
+        hold_timeout: float = 0.6,
+    ) -> None:
+        self._execute = execute
+        self._on_done = on_done
+        self._maxsize = maxsize
+        self._max_merge_chars = max_merge_chars
+        self._put_timeout = put_timeout
+        self._hold_timeout = hold_timeout
+
+        # Per-client queues; key order is the round-robin order
+        self._queues: "OrderedDict[Optional[str], Deque[InputOp]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._busy = False
+        # Client that stopped mid-word and keeps the stream until its deadline
+        self._holder: Optional[str] = None
+        self._hold_until = 0.0
+        self._last_sid: Optional[str] = None
+
+        self._submitted = 0
+        self._executed = 0
+        self._merged = 0
+        self._rejected = 0
+        self._switches = 0
+        self._max_depth = 0
+
+    # ── Producer side ────────────────────────────────────────
+
+    def submit(self, op: InputOp) -> bool:
+        """Queue an op.  Returns False if its client's queue stayed full past the timeout."""
+        return self.submit_many([op])
+
+    def submit_many(self, ops: List[InputOp]) -> bool:
+        """Queue ops from one client as a unit: all of them, or none if there is no room."""
+        if not ops:
+            return True
+        self._ensure_started()
+        sid = ops[0].sid
+        deadline = time.monotonic() + self._put_timeout
+        with self._cond:
+            while len(self._queues.get(sid, ())) + len(ops) > self._maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len(ops) > self._maxsize:
+                    self._rejected += len(ops)
+                    return False
+                self._cond.wait(remaining)
+            queue = self._queues.get(sid)
+            if queue is None:
+                queue = self._queues[sid] = deque()
+            queue.extend(ops)
+            self._submitted += len(ops)
+            self._max_depth = max(self._max_depth, self._depth())
+            self._cond.notify_all()
+        return True
+
+    def pending(self, sid: Optional[str]) -> int:
+        """Ops queued for `sid` that have not started yet."""
+        with self._cond:
+            return len(self._queues.get(sid, ()))
+
+    def release(self, sid: Optional[str]) -> None:
+        """Stop holding the stream for `sid` (e.g. it disconnected).
+
+        Ops it already queued are still injected.
+        """
+        with self._cond:
+            if self._holder == sid:
+                self._holder = None
+                self._cond.notify_all()
+
+    def rekey(self, old_sid: Optional[str], new_sid: Optional[str]) -> int:
+        """Hand `old_sid`'s queued ops (and its hold) to `new_sid`, ahead of
+        anything `new_sid` queued; for a client that resumed on a new sid.
+
+        Returns the number of ops moved.
+        """
+        with self._cond:
+            queue = self._queues.pop(old_sid, None)
+            if self._holder == old_sid:
+                self._holder = new_sid
+            if not queue:
+                return 0
+            for op in queue:
+                op.sid = new_sid
+            queue.extend(self._queues.pop(new_sid, ()))
+            self._queues[new_sid] = queue
+            self._cond.notify_all()
+            return len(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "depth": self._depth(),
+                "max_depth": self._max_depth,
+                "clients": {str(sid): len(q) for sid, q in self._queues.items()},
+                "holder": self._holder,
+                "busy": self._busy,
+                "submitted": self._submitted,
+                "executed": self._executed,
+                "merged": self._merged,
+                "rejected": self._rejected,
+                "switches": self._switches,
+            }
+
+    # ── Consumer side ────────────────────────────────────────
+
+    def _depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ghostwriter-inject", daemon=True
+                )
+                self._thread.start()
+
+    def _pick(self) -> Tuple[Optional[str], Optional[float]]:
+        """Choose the client to serve next, or (None, wait) if nobody may run.
+
+        Caller holds the lock.
+        """
+        if self._holder is not None:
+            if self._holder in self._queues:
+                return self._holder, None
+            if not self._queues:
+                return None, None
+            remaining = self._hold_until - time.monotonic()
+            if remaining > 0:
+                # Others are waiting: give the holder a moment to finish its word
+                return None, remaining
+            self._holder = None
+        for sid in self._queues:
+            return sid, None
+        return None, None
+
+    def _next_op(self) -> InputOp:
+        """Pop the next op, folding adjacent text payloads from the same client."""
+        with self._cond:
+            while True:
+                sid, wait = self._pick()
+                if sid is not None:
+                    break
+                self._cond.wait(wait)
+            queue = self._queues[sid]
+            op = queue.popleft()
+            if op.kind == "text":
+                parts = [op.text]
+                size = len(op.text)
+                while queue:
+                    nxt = queue[0]
+                    if (
+                        nxt.kind != "text"
+                        or nxt.mode != op.mode
+                        or nxt.epoch != op.epoch
+                        or size + len(nxt.text) > self._max_merge_chars
+                    ):
+                        break
+                    queue.popleft()
+                    parts.append(nxt.text)
+                    op.trace_ids.extend(nxt.trace_ids)
+                    op.acks.extend(nxt.acks)
+                    size += len(nxt.text)
+                    op.merged += 1
+                if op.merged > 1:
+                    op.text = "".join(parts)
+                    self._merged += op.merged - 1
+            elif op.kind == "dictation":
+                # A newer hypothesis for the same utterance supersedes this one
+                while queue and queue[0].kind == "dictation" and queue[0].utterance == op.utterance:
+                    nxt = queue.popleft()
+                    op.text, op.final = nxt.text, nxt.final
+                    op.trace_ids.extend(nxt.trace_ids)
+                    op.acks.extend(nxt.acks)
+                    op.merged += 1
+                    self._merged += 1
+            if queue:
+                # Served clients go to the back of the rotation
+                self._queues.move_to_end(sid)
+            else:
+                del self._queues[sid]
+
+            if self._last_sid is not None and sid != self._last_sid:
+                self._switches += 1
+            self._last_sid = sid
+            # Text ending inside a word, a backspace while holding, or an
+            # utterance still being dictated keeps the stream; anything else
+            # is a safe point to switch clients.
+            if (
+                (op.kind == "text" and ends_mid_word(op.text))
+                or (op.kind == "key" and self._holder == sid)
+                or (op.kind == "dictation" and not op.final)
+            ):
+                self._holder = sid
+                self._hold_until = time.monotonic() + self._hold_timeout
+            elif self._holder == sid:
+                self._holder = None
+
+            self._busy = True
+            op.started_at = time.monotonic()
+            # Wake producers blocked on a full queue.
+            self._cond.notify_all()
+            return op
+
+    def _run(self) -> None:
+        while True:
+            op = self._next_op()
+            try:
+                result = self._execute(op)
+            except Exception as exc:  # pragma: no cover - backend dependent
+                result = {"ok": False, "message": "注入失敗", "code": "INJECT_ERR", "detail": str(exc)}
+            op.finished_at = time.monotonic()
+            with self._cond:
+                self._busy = False
+                self._executed += 1
+                if self._holder == op.sid:
+                    # The hold runs from when the client's text landed
+                    self._hold_until = op.finished_at + self._hold_timeout
+            if op.merged > 1 and op.kind == "text":
+                log.info(f"[queue] merged {op.merged} payloads into one write len={len(op.text)}")
+            if self._on_done is not None:
+                try:
+                    self._on_done(op, result)
+                except Exception as exc:
+                    log.warning(f"[queue] on_done failed: {exc}")
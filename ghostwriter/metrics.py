@@ -0,0 +1,118 @@
+"""Latency metrics for GhostWriter.
+
+Each traced stage (queue wait, injection, context grab per strategy, emit,
+...) feeds a rolling window of recent samples.  The windows are exposed as
+Prometheus summaries on /metrics and as a plain dict in the `stats` event.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class RollingHistogram:
+    """Last `window` samples plus lifetime count/sum."""
+
+    def __init__(self, window: int = 1024) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self._samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class Metrics:
+    """Registry of rolling histograms keyed by name and labels, plus gauges."""
+
+    def __init__(self, prefix: str = "ghostwriter", window: int = 1024) -> None:
+        self.prefix = prefix
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, RollingHistogram]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def observe(self, name: str, value_ms: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = RollingHistogram(self.window)
+            hist.observe(value_ms)
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a gauge whose value is read at scrape time."""
+        self._gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        with self._lock:
+            for name, series in self._histograms.items():
+                for key, hist in series.items():
+                    label = ",".join(f"{k}={v}" for k, v in key) or "all"
+                    q = hist.quantiles()
+                    out.setdefault(name, {})[label] = {
+                        "count": hist.count,
+                        "p50": round(q[0.5], 2),
+                        "p95": round(q[0.95], 2),
+                        "p99": round(q[0.99], 2),
+                    }
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} summary")
+                for key, hist in series.items():
+                    q = hist.quantiles()
+                    for quantile, value in q.items():
+                        labels = _labels(key, quantile=str(quantile))
+                        lines.append(f"{metric}{labels} {value:.3f}")
+                    labels = _labels(key)
+                    lines.append(f"{metric}_sum{labels} {hist.total:.3f}")
+                    lines.append(f"{metric}_count{labels} {hist.count}")
+        for name, read in sorted(self._gauges.items()):
+            metric = f"{self.prefix}_{name}"
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: LabelKey, quantile: Optional[str] = None) -> str:
+    pairs = list(key)
+    if quantile is not None:
+        pairs.append(("quantile", quantile))
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
@@ -6,25 +6,96 @@ No eventlet/gevent monkey-patching headaches.
 
 from __future__ import annotations
 
+import io
+import itertools
 import socket
 import os
 import sys
+import time
 import logging
-from typing import Any, Dict, List, Optional, Set
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
 
-from flask import Flask, request
-from flask_socketio import SocketIO, disconnect, emit
+# Process start, for the startup timing report
+STARTED = time.perf_counter()
+
+from flask import Flask, Response, request
+from flask_socketio import SocketIO
+from werkzeug.serving import WSGIRequestHandler
 
 try:
-    from .injector import inject_text
-    from .context_grabber import get_cursor_context
+    from .injector import chunk_planner, inject_stream
+    from .edit_ops import BatchResult, EditOp, EditOpError, parse_batch
+    from .context_grabber import foreground_process
+    from .desktop_service import Desktop
+    from .worker_process import SupervisedWorker
+    from .context_pages import ContextPages
+    from .input_queue import InjectionWorker, InputOp
+    from .context_scheduler import ContextScheduler
+    from .context_sync import ContextSync
+    from .shadow_doc import ShadowBuffer
+    from .sessions import SessionRegistry
+    from .dictation import DictationTracker
+    from .context_events import ContextEventSource, EventThrottle, create_event_source
+    from .timing import profiles
+    from .metrics import metrics
+    from .assets import AssetPipeline
+    from .warmup import Warmup
+    from .transport import FlaskSocketIOTransport, Transport
 except ImportError:
-    from injector import inject_text
-    from context_grabber import get_cursor_context
+    from injector import chunk_planner, inject_stream
+    from edit_ops import BatchResult, EditOp, EditOpError, parse_batch
+    from context_grabber import foreground_process
+    from desktop_service import Desktop
+    from worker_process import SupervisedWorker
+    from context_pages import ContextPages
+    from input_queue import InjectionWorker, InputOp
+    from context_scheduler import ContextScheduler
+    from context_sync import ContextSync
+    from shadow_doc import ShadowBuffer
+    from sessions import SessionRegistry
+    from dictation import DictationTracker
+    from context_events import ContextEventSource, EventThrottle, create_event_source
+    from timing import profiles
+    from metrics import metrics
+    from assets import AssetPipeline
+    from warmup import Warmup
+    from transport import FlaskSocketIOTransport, Transport
 
 # ── Configuration ────────────────────────────────────────────
 HOST = os.environ.get("HOST", "0.0.0.0")
 PORT = int(os.environ.get("PORT", "5000"))
+INJECT_QUEUE_SIZE = int(os.environ.get("INJECT_QUEUE_SIZE", "256"))
+# Phones/tablets allowed at once; past this the oldest one is replaced
+MAX_CLIENTS = max(1, int(os.environ.get("MAX_CLIENTS", "4")))
+# How long a dropped phone can reconnect and pick up where it left off
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "120"))
+# A single insert at least this long (a paste, not typing merged in the
+# queue) is injected in chunks with progress and cancel
+INJECT_CHUNK_MIN = int(os.environ.get("INJECT_CHUNK_MIN", "200"))
+# How long a client that stopped mid-word keeps the input stream
+INJECT_HOLD_TIMEOUT = float(os.environ.get("INJECT_HOLD_TIMEOUT", "0.6"))
+# Answer context from a local copy of the caret text between real grabs
+SHADOW_CONTEXT = os.environ.get("SHADOW_CONTEXT", "1") == "1"
+# Quiet time after local edits before a real grab reconciles that copy
+SHADOW_SYNC_DELAY = float(os.environ.get("SHADOW_SYNC_DELAY", "0.8"))
+# Largest page of text a phone may ask for when scrolling the preview
+CONTEXT_PAGE_MAX = int(os.environ.get("CONTEXT_PAGE_MAX", "2000"))
+CONTEXT_PUSH = os.environ.get("CONTEXT_PUSH", "0") == "1"
+CONTEXT_PUSH_INTERVAL = float(os.environ.get("CONTEXT_PUSH_INTERVAL", "0.15"))
+# "threading" (Flask-SocketIO on Werkzeug) or "asgi" (asyncio under uvicorn)
+SERVER_MODE = os.environ.get("SERVER_MODE", "threading")
+ASGI_GRAB_WORKERS = int(os.environ.get("ASGI_GRAB_WORKERS", "2"))
+# Run typing and UI Automation in a supervised worker process, so a hung
+# app cannot freeze the server (on by default on Windows)
+DESKTOP_WORKER = os.environ.get("DESKTOP_WORKER", "1" if sys.platform == "win32" else "0") == "1"
+# Deadlines for worker calls: input (plus WORKER_INPUT_PER_CHAR per character) and context reads
+WORKER_INPUT_TIMEOUT = float(os.environ.get("WORKER_INPUT_TIMEOUT", "3"))
+WORKER_INPUT_PER_CHAR = float(os.environ.get("WORKER_INPUT_PER_CHAR", "0.02"))
+WORKER_CONTEXT_TIMEOUT = float(os.environ.get("WORKER_CONTEXT_TIMEOUT", "2"))
+# How long a context read may overrun before the worker is killed; a kill
+# also fails the typing in flight, so a slow read gets longer than typing
+WORKER_CONTEXT_GRACE = float(os.environ.get("WORKER_CONTEXT_GRACE", "5"))
 
 # ── Logging ──────────────────────────────────────────────────
 logging.basicConfig(
@@ -34,6 +105,10 @@ logging.basicConfig(
 )
 log = logging.getLogger("ghostwriter")
 
+# Backends are initialised in the background by main(); see warmup.py
+warmup = Warmup(started=STARTED)
+warmup.phase("imports", time.perf_counter() - STARTED)
+
 # ── Flask + SocketIO ─────────────────────────────────────────
 app = Flask(__name__, static_folder="static", static_url_path="")
 app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
@@ -44,180 +119,923 @@ socketio = SocketIO(
     cors_allowed_origins="*",
     ping_timeout=60,              # <-- Generous timeout for mobile networks
     ping_interval=25,
+    # Handle each client's events in order on its connection thread; a
+    # thread per event could hand ops to the injection queue out of order.
+    async_handlers=False,
     logger=False,
     engineio_logger=False,
 )
 
-# ── Active client tracking ───────────────────────────────────
-active_sid: Optional[str] = None
-known_sids: Set[str] = set()
+
+
+class NoDelayRequestHandler(WSGIRequestHandler):
+    """Werkzeug connection handler with Nagle's algorithm off.
+
+    A context push right after a trace/ack frame is a second small write;
+    with Nagle on it waits for the phone to ACK the first, which delayed ACK
+    stretches to the phone's next packet.  asyncio (SERVER_MODE=asgi) sets
+    TCP_NODELAY by itself.
+    """
+
+    def setup(self) -> None:
+        super().setup()
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            pass
+
+
+# Where handlers emit to; asgi_server.py swaps in its own
+transport: Transport = FlaskSocketIOTransport(socketio)
+
+# ── Client tracking ─────────────────────────────────────────
+# Connected sids in connection order (oldest first) -> connect time
+clients: Dict[str, float] = {}
+# Next edit_ops seq expected from each client
+edit_seqs: Dict[str, int] = {}
+# A client's current edit epoch (absent: none voided yet).  When the desktop
+# does not answer an op, the client resends from it; the epoch moves on and
+# whatever the client had queued behind it is skipped (see _retry_edits).
+edit_epochs: Dict[str, int] = {}
+_edit_epoch_ids = itertools.count(1)
+_edit_lock = threading.Lock()
+# Desktop failures the client recovers from by resending the batch
+RETRY_CODES = ("TIMEOUT", "WORKER_DOWN")
+# Sessions outlive sockets so a phone can resume after a network blip
+sessions = SessionRegistry(ttl=SESSION_TTL)
+# Chunked injection running for a client: sid -> (job id, cancel flag)
+injections: Dict[str, tuple] = {}
+_injections_lock = threading.Lock()
+_injection_ids = itertools.count(1)
+
+# Set once an event source drives context pushes (clients stop polling)
+push_mode = False
+
+# ── Desktop calls ───────────────────────────────────────────
+# Typing, keys and context reads; in a supervised worker process if enabled
+desktop = Desktop(
+    SupervisedWorker("desktop_service:DesktopService", name="desktop", lane_grace={"context": WORKER_CONTEXT_GRACE})
+    if DESKTOP_WORKER else None,
+    input_timeout=WORKER_INPUT_TIMEOUT,
+    per_char=WORKER_INPUT_PER_CHAR,
+    context_timeout=WORKER_CONTEXT_TIMEOUT,
+)
 
 
 # ── Routes ───────────────────────────────────────────────────
+# index.html, sw.js and /assets/* come from the in-memory asset pipeline:
+# hashed assets are cached for good, the entry points are revalidated on
+# every load so they always name the current hashes.
+_t0 = time.perf_counter()
+assets = AssetPipeline(app.static_folder).build()
+warmup.phase("assets", time.perf_counter() - _t0)
+
+
+def _asset_response(url: str):
+    response = assets.response(
+        url,
+        accept_encoding=request.headers.get("Accept-Encoding", ""),
+        if_none_match=request.headers.get("If-None-Match", ""),
+    )
+    return response if response is not None else ("Not Found", 404)
+
 
 @app.route("/")
 def index():
-    return app.send_static_file("index.html")
+    return _asset_response("/")
+
+
+@app.route("/sw.js")
+def service_worker():
+    return _asset_response("/sw.js")
+
+
+@app.route("/assets/<path:name>")
+def hashed_asset(name: str):
+    return _asset_response("/assets/" + name)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Latency histograms and gauges in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 @app.after_request
-def add_no_cache_headers(response):
-    """Prevent stale cached JS from causing protocol mismatches."""
-    response.headers["Cache-Control"] = "no-store, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+def add_cache_headers(response):
+    """Anything without its own policy (unhashed static paths, /metrics)
+    is revalidated, so a stale copy can never be used as-is."""
+    response.headers.setdefault("Cache-Control", "no-cache")
     return response
 
 
 # ── Socket.IO event handlers ────────────────────────────────
+# Handlers take the client sid explicitly and answer through `transport`,
+# so the threading front end below and asgi_server.py share them.
 
-@socketio.on("connect")
-def on_connect():
-    global active_sid
-
-    sid = request.sid
-    ip = request.remote_addr
+def on_connect(sid: str, ip: Optional[str] = None, auth: Any = None) -> None:
+    """auth: optional {"session": token} from a phone resuming its session."""
     hostname = socket.gethostname()
+    token = auth.get("session") if isinstance(auth, dict) else None
+
+    for stale in sessions.prune():
+        if stale.sid is not None:
+            context_sync.forget(stale.sid)
+            dictation.forget(stale.sid)
+
+    # A resuming phone whose old socket we have not seen close yet
+    previous = sessions.get(token)
+    if previous is not None and previous.sid in clients:
+        log.info(f"[resume] closing stale sid={previous.sid}")
+        _drop_client(previous.sid)
+        try:
+            transport.disconnect(previous.sid)
+        except Exception:
+            pass
 
-    log.info(f"[connect] sid={sid} ip={ip}")
+    log.info(f"[connect] sid={sid} ip={ip} clients={len(clients) + 1}")
 
-    # Single-client mode: if another client is already connected, replace it
-    if active_sid and active_sid != sid:
-        log.info(f"[replace] kicking old sid={active_sid}")
-        emit(
+    # Client limit: replace the oldest connection(s) to make room
+    while len(clients) >= MAX_CLIENTS:
+        oldest = next(iter(clients))
+        log.info(f"[replace] kicking old sid={oldest}")
+        transport.emit(
             "status_update",
             {"status": "replaced", "hostname": hostname},
-            to=active_sid,
+            to=oldest,
         )
+        sessions.close(oldest)
         try:
-            disconnect(active_sid)
+            transport.disconnect(oldest)
         except Exception:
             pass
-        known_sids.discard(active_sid)
+        _drop_client(oldest)
 
-    active_sid = sid
-    known_sids.add(sid)
+    clients[sid] = time.time()
+    session, old_sid = sessions.open(sid, token)
+    resumed = old_sid is not None
+    if resumed:
+        _resume_client(old_sid, sid, session.next_seq)
 
-    emit("status_update", {"status": "connected", "hostname": hostname}, to=sid)
-    log.info(f"[status] sent 'connected' to sid={sid}")
+    transport.emit(
+        "status_update",
+        {
+            "status": "connected",
+            "hostname": hostname,
+            "push": push_mode,
+            "clients": len(clients),
+            "ready": warmup.ready,
+            "session": session.token,
+            "resumed": resumed,
+            "next_seq": session.next_seq,
+        },
+        to=sid,
+    )
+    log.info(f"[status] sent 'connected' to sid={sid}" + (f" (resumed from {old_sid})" if resumed else ""))
 
+    if resumed:
+        # The phone kept its preview; bring it up to date with a delta
+        # instead of a full snapshot, without holding up the handshake
+        context_scheduler.subscribe(sid)
+        context_scheduler.request(sid, delay=SHADOW_SYNC_DELAY)
 
-@socketio.on("disconnect")
-def on_disconnect():
-    global active_sid
 
-    sid = request.sid
+def _resume_client(old_sid: str, sid: str, next_seq: Optional[int]) -> None:
+    """Move what we keep per sid from the phone's old socket to its new one."""
+    if next_seq is not None:
+        with _edit_lock:
+            edit_seqs[sid] = next_seq
+    context_sync.move(old_sid, sid)
+    dictation.move(old_sid, sid)
+    moved = injection_worker.rekey(old_sid, sid)
+    with _injections_lock:
+        job = injections.pop(old_sid, None)
+        if job is not None:
+            injections[sid] = job
+    log.info(f"[resume] sid={old_sid} -> {sid} next_seq={next_seq} queued={moved}")
+
+
+def on_disconnect(sid: str) -> None:
     log.info(f"[disconnect] sid={sid}")
-    known_sids.discard(sid)
-    if active_sid == sid:
-        active_sid = None
+    _drop_client(sid)
+
+
+def _drop_client(sid: str) -> None:
+    clients.pop(sid, None)
+    with _edit_lock:
+        next_seq = edit_seqs.pop(sid, None)
+        edit_epochs.pop(sid, None)
+    context_scheduler.forget(sid)
+    # A resumable session keeps its context versions until it resumes or expires
+    if not sessions.detach(sid, next_seq):
+        context_sync.forget(sid)
+        dictation.forget(sid)
+    # Its queued input is still typed, but it no longer blocks others mid-word
+    injection_worker.release(sid)
 
 
-@socketio.on("text_input")
-def on_text_input(payload: Dict[str, str] | None):
+def on_text_input(sid: str, payload: Dict[str, str] | None) -> None:
     if not isinstance(payload, dict):
-        emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"})
+        transport.emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"}, to=sid)
         return
 
     text = payload.get("text", "")
     mode = payload.get("mode", "stream")
 
     if not isinstance(text, str):
-        emit("error", {"message": "Invalid text", "code": "BAD_TEXT"})
+        transport.emit("error", {"message": "Invalid text", "code": "BAD_TEXT"}, to=sid)
         return
 
     if text == "":
         return
 
     log.info(f"[text_input] mode={mode} text={repr(text)}")
-
-    result = inject_text(text)
-
-    if result.get("ok", False):
-        log.info(f"[inject] OK mode={result.get('mode')} text={repr(text)}")
-        # Auto-push context after injection (Phase 2)
-        socketio.start_background_task(push_context_delayed, sid=request.sid)
-    else:
-        log.warning(f"[inject] FAIL: {result}")
-        emit(
-            "error",
-            {
-                "message": result.get("message", "注入失敗"),
-                "code": result.get("code", "INJECT_ERR"),
-                "detail": result.get("detail", ""),
-                "mode": mode,
-            },
-        )
+    _submit_op(_traced(InputOp(kind="text", sid=sid, text=text, mode=mode), payload))
 
 
-@socketio.on("key_command")
-def on_key_command(payload: Dict[str, Any] | None):
+def on_key_command(sid: str, payload: Dict[str, Any] | None) -> None:
     """Handle special key commands (backspace, etc.)."""
     if not isinstance(payload, dict):
-        emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"})
+        transport.emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"}, to=sid)
         return
 
     key = payload.get("key", "")
-    
+
     # Supported keys
     if key == "backspace":
-        import pyautogui
-        pyautogui.press("backspace")
-        log.info("[key_command] Executed Backspace")
+        _submit_op(_traced(InputOp(kind="key", sid=sid, key=key), payload))
     else:
         log.warning(f"[key_command] Unsupported key: {key}")
 
 
-@socketio.on("move_cursor")
-def on_move_cursor(payload: Dict[str, Any] | None):
-    """Move PC cursor based on mobile preview click."""
+def on_move_cursor(sid: str, payload: Dict[str, Any] | None) -> None:
+    """Move PC cursor based on mobile preview click.
+
+    Accepts {"offset": n} (characters from the caret, negative = left) or
+    the older {"direction": "left"|"right", "steps": n}.
+    """
     if not isinstance(payload, dict):
         return
-    
-    direction = payload.get("direction")
-    steps = payload.get("steps", 0)
-    
-    if direction in ["left", "right"] and steps > 0:
-        import pyautogui
-        # Move the cursor N times
-        pyautogui.press(direction, presses=int(steps))
-        log.info(f"[move_cursor] direction={direction} steps={steps}")
 
+    offset = payload.get("offset")
+    if isinstance(offset, (int, float)) and not isinstance(offset, bool) and int(offset) != 0:
+        direction, steps = ("left" if offset < 0 else "right"), abs(int(offset))
+    else:
+        direction = payload.get("direction")
+        steps = payload.get("steps", 0)
 
-@socketio.on("request_context")
-def on_request_context(payload=None):
-    """Manually request text context from the PC."""
-    sid = getattr(request, "sid", active_sid)
-    if not sid:
+    if direction in ["left", "right"] and isinstance(steps, (int, float)) and steps > 0:
+        _submit_op(_traced(InputOp(kind="move", sid=sid, direction=direction, steps=int(steps)), payload))
+
+
+def on_dictation(sid: str, payload: Any) -> None:
+    """Type the phone's current hypothesis for a dictated utterance.
+
+    payload: {"u": utterance id, "text": whole hypothesis, "final": bool}.
+    Only the change from what was already typed for `u` is injected (see
+    dictation.py).  A closed utterance is answered with a DICTATION_CLOSED
+    error, after which the phone starts a new one.
+    """
+    if not isinstance(payload, dict):
+        transport.emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"}, to=sid)
+        return
+    uid, text = payload.get("u"), payload.get("text")
+    if isinstance(uid, bool) or not isinstance(uid, (str, int)) or not isinstance(text, str):
+        transport.emit("error", {"message": "Invalid dictation", "code": "BAD_DICTATION"}, to=sid)
+        return
+    op = InputOp(kind="dictation", sid=sid, text=text, mode="dictation", utterance=str(uid), final=bool(payload.get("final")))
+    _submit_op(_traced(op, payload))
+
+
+def on_edit_ops(sid: str, payload: Any) -> None:
+    """Queue a batch of edit ops (see edit_ops.py); it is acked once all have run.
+
+    Seqs are go-back-N: a batch past a gap (one we rejected) is refused
+    with OUT_OF_ORDER until the client resends from the gap, and a seq we
+    already queued is acked again as a duplicate without re-injecting.
+    An op the desktop did not answer rewinds the seq to its batch (see
+    _retry_edits).
+    """
+    try:
+        batch = parse_batch(payload)
+    except EditOpError as exc:
+        log.warning(f"[edit_ops] rejected from sid={sid}: {exc}")
+        seq = payload.get("seq") if isinstance(payload, dict) else None
+        _ack_ops(sid, seq, {"ok": False, "code": exc.code, "message": "無效的編輯操作", "detail": str(exc)})
+        return
+
+    with _edit_lock:
+        epoch = edit_epochs.get(sid, 0)
+        expected = edit_seqs.get(sid, batch.seq)
+    if batch.seq < expected:
+        _ack_ops(sid, batch.seq, {"ok": True, "duplicate": True})
+        return
+    if batch.seq > expected:
+        _ack_ops(sid, batch.seq, {"ok": False, "code": "OUT_OF_ORDER", "expected": expected})
+        return
+
+    ops = [_input_op(sid, edit) for edit in batch.ops]
+    if not ops:
+        _advance_seq(sid, epoch, batch.seq)
+        _ack_ops(sid, batch.seq, {"ok": True})
         return
-        
+    results = BatchResult(batch.seq, len(ops))
+    for index, op in enumerate(ops):
+        op.acks.append((results, index))
+        op.epoch = epoch
+    _traced(ops[-1], batch.meta)
+    log.info(f"[edit_ops] sid={sid} seq={batch.seq} ops={len(ops)}")
+    if not injection_worker.submit_many(ops):
+        log.warning(f"[queue] FULL, refused edit_ops seq={batch.seq} from sid={sid}")
+        _ack_ops(sid, batch.seq, {"ok": False, "code": "QUEUE_FULL", "message": "輸入佇列已滿"})
+        return
+    _advance_seq(sid, epoch, batch.seq)
+
+
+def _advance_seq(sid: str, epoch: int, seq: int) -> None:
+    """Expect `seq + 1` next, unless a retry voided the epoch meanwhile
+    (then this batch is skipped and comes again with the resend)."""
+    with _edit_lock:
+        if edit_epochs.get(sid, 0) == epoch:
+            edit_seqs[sid] = seq + 1
+
+
+def _is_voided(op: InputOp) -> bool:
+    """A batch op queued before its client's epoch moved on."""
+    if not op.acks:
+        return False
+    with _edit_lock:
+        return edit_epochs.get(op.sid, op.epoch) != op.epoch
+
+
+def _retry_edits(op: InputOp, result: Dict[str, Any]) -> None:
+    """The desktop did not answer `op`: have the client resend from it.
+
+    Its earliest batch is acked with the op's `index` and `retry`, the
+    client's seq rewinds to that batch, and a new epoch voids everything it
+    queued after the op, so nothing is typed twice or out of order.  The
+    ack goes out under the lock, ahead of any OUT_OF_ORDER the rewind causes.
+    """
+    results, index = min(op.acks, key=lambda ack: (ack[0].seq, ack[1]))
+    log.warning(f"[edit_ops] seq={results.seq} op {index} got {result.get('code')}, client resends from there")
+    with _edit_lock:
+        edit_epochs[op.sid] = next(_edit_epoch_ids)
+        if op.sid in edit_seqs:
+            edit_seqs[op.sid] = min(edit_seqs[op.sid], results.seq)
+        _ack_ops(op.sid, results.seq, {
+            "ok": False,
+            "code": result.get("code"),
+            "index": index,
+            "message": result.get("message", ""),
+            "retry": True,
+        })
+
+
+def _input_op(sid: str, edit: EditOp) -> InputOp:
+    if edit.kind == "insert":
+        return InputOp(kind="text", sid=sid, text=edit.text, mode=edit.mode)
+    if edit.kind == "delete":
+        key = "backspace" if edit.direction == "back" else "delete"
+        return InputOp(kind="key", sid=sid, key=key, steps=edit.count)
+    if edit.kind == "move":
+        return InputOp(kind="move", sid=sid, direction=edit.direction, steps=edit.count)
+    return InputOp(kind="key", sid=sid, key="+".join(edit.keys))
+
+
+def _ack_ops(sid: str, seq: Any, result: Dict[str, Any]) -> None:
+    """Answer an edit_ops batch; `pending` lets the client show queued work."""
+    transport.emit("ops_ack", dict(result, seq=seq, pending=injection_worker.pending(sid)), to=sid)
+
+
+def on_stats(sid: str, payload: Any = None) -> None:
+    """Report injection queue, throughput and clipboard session counters."""
+    # Backend counters live wherever the backends run (maybe the worker)
+    desk = desktop.stats()
+    transport.emit(
+        "stats",
+        {
+            "server": {"mode": transport.mode, "threads": threading.active_count()},
+            "clients": len(clients),
+            "injection": injection_worker.stats(),
+            "context": context_scheduler.stats(),
+            "throughput": desk.get("throughput", {}),
+            "chunk_rates": chunk_planner.snapshot(),
+            "inject_costs": desk.get("inject_costs", {}),
+            "clipboard": desk.get("clipboard", {}),
+            "timing": {**profiles.snapshot(), **desk.get("timing", {})},
+            "strategies": desk.get("strategies", {}),
+            "shadow": shadow.stats(),
+            "pages": context_pages.stats(),
+            "sessions": sessions.stats(),
+            "dictation": dictation.stats(),
+            "latency": metrics.snapshot(),
+            "startup": warmup.snapshot(),
+            "worker": desktop.worker.stats() if desktop.worker else None,
+        },
+        to=sid,
+    )
+
+
+def on_cancel_inject(sid: str, payload: Any = None) -> None:
+    """Stop this client's chunked injection after the chunk in progress.
+
+    payload: optional {"id": n} from inject_progress, so a late cancel does
+    not hit a newer injection.
+    """
+    with _injections_lock:
+        job = injections.get(sid)
+    job_id = payload.get("id") if isinstance(payload, dict) else None
+    if job is None or (job_id is not None and job_id != job[0]):
+        return
+    log.info(f"[inject] cancel id={job[0]} sid={sid}")
+    job[1].set()
+
+
+def on_clock_sync(sid: str, payload: Any = None) -> None:
+    """Echo the client's send time with ours so it can estimate the offset."""
+    t0 = payload.get("t0") if isinstance(payload, dict) else None
+    transport.emit("clock_sync", {"t0": t0, "ts": time.time() * 1000}, to=sid)
+
+
+# ── Injection worker ────────────────────────────────────────
+
+def _traced(op: InputOp, payload: Dict[str, Any]) -> InputOp:
+    """Copy optional tracing fields from a client payload onto `op`.
+
+    `t` is the send time in server-clock epoch ms (the client applies the
+    offset from clock_sync); `trace` is an id echoed back in a trace event.
+    """
+    client_ts = payload.get("t")
+    if isinstance(client_ts, (int, float)):
+        op.client_ts = float(client_ts)
+        metrics.observe("uplink_ms", max(0.0, time.time() * 1000 - op.client_ts))
+    trace_id = payload.get("trace")
+    if trace_id is not None:
+        op.trace_ids.append(trace_id)
+    return op
+
+
+def _submit_op(op: InputOp) -> None:
+    """Queue an input op, reporting back to the client if the queue is full."""
+    if not injection_worker.submit(op):
+        log.warning(f"[queue] FULL, dropped {op.kind} from sid={op.sid}")
+        transport.emit(
+            "error",
+            {
+                "message": "輸入佇列已滿",
+                "code": "QUEUE_FULL",
+                "mode": op.mode,
+            },
+            to=op.sid,
+        )
+
+
+def _inject_chunked(op: InputOp) -> Dict[str, Any]:
+    """Inject a long text in adaptively sized chunks, reporting progress.
+
+    The phone can stop it between chunks with `cancel_inject`; the result's
+    "text" is then only what was typed.  Progress goes to the sid that owns
+    the job, which changes if the phone resumes its session on a new socket.
+    """
+    job_id = next(_injection_ids)
+    cancel = threading.Event()
+    total = len(op.text)
+    if op.sid:
+        with _injections_lock:
+            injections[op.sid] = (job_id, cancel)
+
+    def owner() -> Optional[str]:
+        with _injections_lock:
+            return next((sid for sid, job in injections.items() if job[0] == job_id), None)
+
+    def progress(done: int, total: int, rate: float, to: Optional[str] = None, **extra: Any) -> None:
+        to = to or owner()
+        if to:
+            transport.emit("inject_progress", dict(extra, id=job_id, done=done, total=total, cps=round(rate)), to=to)
+
+    fg_app = foreground_process()
+    progress(0, total, 0.0)
+    try:
+        result = inject_stream(op.text, app=fg_app, on_chunk=progress, cancelled=cancel.is_set, inject=desktop.inject_text)
+    finally:
+        with _injections_lock:
+            last_owner = next((sid for sid, job in injections.items() if job[0] == job_id), None)
+            if last_owner:
+                injections.pop(last_owner)
+    done = len(result.get("text", ""))
+    progress(done, total, 0.0, to=last_owner, finished=True, cancelled=bool(result.get("cancelled")), ok=bool(result.get("ok")))
+    log.info(f"[inject] chunked id={job_id} app={fg_app} {done}/{total} chars in {result.get('chunks', 0)} chunks"
+             + (" (cancelled)" if result.get("cancelled") else ""))
+    return result
+
+
+def _revise_dictation(op: InputOp) -> Dict[str, Any]:
+    """Backspace to where the new hypothesis differs, then type its tail."""
+    plan = dictation.revise(op.sid, op.utterance, op.text, app=foreground_process())
+    if plan is None:
+        return {"ok": False, "code": "DICTATION_CLOSED", "message": "聽寫已中斷，請重新開始", "detail": op.utterance}
+    deleted, inserted = plan
+    if deleted:
+        result = desktop.press_key("backspace", presses=deleted)
+        if not result.get("ok", False):
+            # Some of the backspaces may have landed: the text is unknown now
+            dictation.fail()
+            return result
+    if inserted:
+        result = desktop.inject_text(inserted, app=foreground_process())
+        if not result.get("ok", False):
+            dictation.fail(deleted)
+            return result
+    dictation.commit(deleted, inserted, final=op.final)
+    if deleted or inserted:
+        log.info(f"[dictation] u={op.utterance} -{deleted} +{inserted!r} superseded={op.merged - 1}"
+                 + (" (final)" if op.final else ""))
+    return {"ok": True, "mode": "dictation", "deleted": deleted, "text": inserted}
+
+
+def _execute_op(op: InputOp) -> Dict[str, Any]:
+    """Run one queued op on the injection thread."""
+    if _is_voided(op):
+        return {"ok": False, "code": "VOIDED", "message": "已由重送取代"}
+    if op.kind == "dictation":
+        return _revise_dictation(op)
+    # Anything else typed or moved the caret after the open utterance
+    dictation.interrupt()
+    if op.kind == "text":
+        if op.merged == 1 and len(op.text) >= INJECT_CHUNK_MIN:
+            return _inject_chunked(op)
+        return desktop.inject_text(op.text, app=foreground_process())
+
+    if op.kind == "key":
+        if "+" in op.key:
+            result = desktop.press_hotkey(*op.key.split("+"))
+        else:
+            result = desktop.press_key(op.key, presses=max(1, op.steps))
+        log.info(f"[key_command] Executed {op.key} x{max(1, op.steps)}")
+        return result
+    if op.kind == "move":
+        if op.direction in ("left", "right"):
+            # Place the caret directly (UIA), or one batched run of arrows
+            result = desktop.place_caret(-op.steps if op.direction == "left" else op.steps)
+        else:
+            result = desktop.press_key(op.direction, presses=op.steps)
+        log.info(f"[move_cursor] direction={op.direction} steps={op.steps} via={result.get('mode')}")
+        return result
+    return {"ok": False, "message": "Unknown op", "code": "BAD_OP"}
+
+
+def _record_op_latency(op: InputOp, result: Dict[str, Any]) -> None:
+    """Observe queue wait / inject time and answer the client's trace ids."""
+    queue_ms = (op.started_at - op.enqueued_at) * 1000
+    inject_ms = (op.finished_at - op.started_at) * 1000
+    server_ms = (time.monotonic() - op.enqueued_at) * 1000
+    metrics.observe("queue_wait_ms", queue_ms, kind=op.kind)
+    metrics.observe("inject_ms", inject_ms, kind=op.kind)
+    metrics.observe("server_ms", server_ms, kind=op.kind)
+    if op.trace_ids and op.sid:
+        transport.emit(
+            "trace",
+            {
+                "ids": op.trace_ids,
+                "ok": bool(result.get("ok", False)),
+                "merged": op.merged,
+                "queue_ms": round(queue_ms, 2),
+                "inject_ms": round(inject_ms, 2),
+                "server_ms": round(server_ms, 2),
+            },
+            to=op.sid,
+        )
+
+
+def _shadow_edit(op: InputOp, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Apply a finished op to the shadow context; None if it can't be modelled."""
+    if op.kind == "text":
+        return shadow.insert(result.get("text", op.text))
+    if op.kind == "dictation":
+        ctx = None
+        if result.get("deleted"):
+            ctx = shadow.delete_back(result["deleted"])
+            if ctx is None:
+                return None
+        if result.get("text"):
+            ctx = shadow.insert(result["text"])
+        return ctx
+    count = max(1, op.steps)
+    if op.kind == "key" and op.key == "backspace":
+        return shadow.delete_back(count)
+    if op.kind == "key" and op.key == "delete":
+        return shadow.delete_forward(count)
+    if op.kind == "key" and op.key == "enter":
+        return shadow.insert("\n" * count)
+    if op.kind == "move" and op.direction in ("left", "right"):
+        moved = result.get("moved")
+        if not isinstance(moved, int):
+            moved = -count if op.direction == "left" else count
+        return shadow.move(moved)
+    shadow.invalidate()
+    return None
+
+
+def _on_op_done(op: InputOp, result: Dict[str, Any]) -> None:
+    if result.get("code") == "VOIDED":
+        # Never ran; the client's resend replaces it
+        return
+    _record_op_latency(op, result)
+    retried = bool(op.acks) and result.get("code") in RETRY_CODES
+    if retried:
+        _retry_edits(op, result)
+    else:
+        for results, index in op.acks:
+            ack = results.record(index, result)
+            if ack is not None:
+                if not ack["ok"]:
+                    log.warning(f"[edit_ops] seq={results.seq} op {ack['index']} failed: {ack['code']}")
+                _ack_ops(op.sid, results.seq, ack)
+
+    if result.get("ok", False) and SHADOW_CONTEXT:
+        ctx = _shadow_edit(op, result)
+        if ctx is not None:
+            # Show the edit now; a real grab reconciles once typing pauses
+            context_scheduler.publish(dict(ctx, pv=context_pages.observe(ctx)), op.sid)
+            context_scheduler.request(op.sid, delay=SHADOW_SYNC_DELAY)
+            if op.kind == "text":
+                log.info(f"[inject] OK mode={result.get('mode')} merged={op.merged} text={repr(result.get('text', op.text))} (shadow)")
+            return
+    elif not result.get("ok", False):
+        # Whatever happened on the PC, the shadow no longer knows
+        shadow.invalidate()
+    # The text or caret moved in a way the shadow didn't follow: pages are stale
+    context_pages.touch()
+
+    if op.kind not in ("text", "dictation"):
+        if not result.get("ok", False):
+            log.warning(f"[{op.kind}] FAIL: {result}")
+        return
+
+    if retried:
+        # Not an error yet: the client sends it again
+        return
+
+    if result.get("ok", False):
+        log.info(f"[inject] OK mode={result.get('mode')} merged={op.merged} text={repr(result.get('text', op.text))}")
+        # Auto-push context after injection (Phase 2)
+        if op.sid:
+            # The grab polls until the target app shows what we just typed.
+            context_scheduler.request(op.sid, hint=result.get("text", op.text))
+    else:
+        log.warning(f"[inject] FAIL: {result}")
+        transport.emit(
+            "error",
+            {
+                "message": result.get("message", "注入失敗"),
+                "code": result.get("code", "INJECT_ERR"),
+                "detail": result.get("detail", ""),
+                "mode": op.mode,
+            },
+            to=op.sid,
+        )
+
+
+injection_worker = InjectionWorker(
+    _execute_op,
+    _on_op_done,
+    maxsize=INJECT_QUEUE_SIZE,
+    hold_timeout=INJECT_HOLD_TIMEOUT,
+)
+
+
+def on_request_context(sid: str, payload: Any = None) -> None:
+    """Manually request text context from the PC."""
     force = False
     if isinstance(payload, dict):
         force = payload.get("force", False)
 
-    socketio.start_background_task(run_context_grab, sid=sid, force=force)
+    if not force:
+        # Local edits not yet reconciled: answer from the shadow; the grab
+        # that will reconcile it is already scheduled
+        ctx = shadow.pending()
+        if ctx is not None:
+            context_scheduler.subscribe(sid)
+            deliver_context(sid, dict(ctx, pv=context_pages.version))
+            return
+
+    context_scheduler.request(sid, force=bool(force))
+
+
+def _grab_settled(expect: str) -> Dict[str, Any]:
+    """Grab right after an injection, re-polling until the typed text shows up.
+
+    The deadline is learned per app (timing.profiles "inject_settle").  Only
+    UIA results are re-polled; clipboard strategies have side effects.
+    """
+    start = time.monotonic()
+    ctx = _context_provider()
+    tail = expect.replace("\r", "").strip()[-8:]
+    if not tail or ctx.get("strategy") != "uia":
+        return ctx
+
+    app = ctx.get("app_name", "?")
+    deadline = start + profiles.timeout(app, "inject_settle")
+    while not ctx.get("before", "").replace("\r", "").rstrip().endswith(tail):
+        if time.monotonic() >= deadline:
+            profiles.miss(app, "inject_settle")
+            return ctx
+        transport.sleep(0.01)
+        ctx = _context_provider()
+    profiles.observe(app, "inject_settle", time.monotonic() - start)
+    return ctx
+
+
+def set_context_provider(provider: Optional[Callable[..., Dict[str, Any]]]) -> None:
+    """Swap the context grab implementation (e.g. fakes.FakeContextProvider).
 
+    None restores desktop.get_cursor_context.
+    """
+    global _context_provider
+    _context_provider = provider or desktop.get_cursor_context
 
-def run_context_grab(sid: str, force: bool = False):
+
+_context_provider: Callable[..., Dict[str, Any]] = desktop.get_cursor_context
+
+
+def run_context_grab(force: bool = False, hint: Optional[str] = None) -> Dict[str, Any]:
     """Execution logic for context grab in background."""
-    log.info(f"[request_context] background grab for sid={sid} force={force}")
-    ctx = get_cursor_context(force=force)
-    
+    log.info(f"[request_context] background grab force={force}")
+    epoch = shadow.epoch
+    start = time.monotonic()
+    if hint and not force:
+        ctx = _grab_settled(hint)
+    else:
+        ctx = _context_provider(force=force)
+    shadow.reconcile(ctx, epoch)
+    metrics.observe("grab_ms", (time.monotonic() - start) * 1000, strategy=ctx.get("strategy", "none"))
+    ctx = dict(ctx, pv=context_pages.observe(ctx))
+
     if ctx.get("supported"):
         log.info(f"[context] SUCCESS app={ctx.get('app_name')} before_len={len(ctx.get('before',''))}")
     else:
         # Only log warning if not brute forcing, to keep logs clean
         if not force:
             log.warning(f"[context] FAIL reason={ctx.get('reason')} app={ctx.get('app_name')}")
-    
-    socketio.emit("context_update", ctx, to=sid)
 
+    return ctx
+
+
+def deliver_context(sid: str, ctx: Dict[str, Any]) -> None:
+    """Send `ctx` as a versioned diff, or nothing if the client already has it."""
+    start = time.monotonic()
+    message = context_sync.encode(sid, ctx)
+    if message is None:
+        return
+    transport.emit("context_update", message, to=sid)
+    metrics.observe("emit_ms", (time.monotonic() - start) * 1000, kind="delta" if "delta" in message else "full")
+
+
+def on_context_page(sid: str, payload: Any = None) -> None:
+    """Read one page of text around the caret for the scrolling preview.
+
+    payload: {"offset": n, "size": n}; offsets count from the caret like
+    move_cursor offsets (negative = before the selection).  Answered with a
+    `context_page` event tagged with the document version `v`.
+    """
+    if not isinstance(payload, dict):
+        transport.emit("error", {"message": "Invalid payload", "code": "BAD_PAYLOAD"}, to=sid)
+        return
+    offset, size = payload.get("offset"), payload.get("size")
+    if (
+        isinstance(offset, bool) or not isinstance(offset, int)
+        or isinstance(size, bool) or not isinstance(size, int) or size < 1
+    ):
+        transport.emit("error", {"message": "Invalid page", "code": "BAD_PAGE"}, to=sid)
+        return
+    # The read may block on UIA: keep it off the handler thread
+    transport.spawn(_send_context_page, sid, offset, min(size, CONTEXT_PAGE_MAX))
+
+
+def _send_context_page(sid: str, offset: int, size: int) -> None:
+    start = time.monotonic()
+    page = context_pages.get(offset, size)
+    metrics.observe("page_ms", (time.monotonic() - start) * 1000)
+    transport.emit("context_page", page, to=sid)
+
+
+def set_page_provider(provider: Optional[Callable[[int, int], Dict[str, Any]]]) -> None:
+    """Swap the page reader (None restores desktop.get_context_page)."""
+    context_pages.fetch = provider or desktop.get_context_page
+
+
+def on_context_resync(sid: str, payload: Any = None) -> None:
+    """Client lost track of the context version: resend the full snapshot."""
+    message = context_sync.snapshot(sid)
+    if message is None:
+        context_scheduler.request(sid)
+        return
+    log.info(f"[context] resync sid={sid} v={message['v']}")
+    transport.emit("context_update", message, to=sid)
+
+
+context_sync = ContextSync()
+shadow = ShadowBuffer()
+# The utterance being dictated and what has been typed for it
+dictation = DictationTracker()
+context_pages = ContextPages(desktop.get_context_page)
+
+
+# ── Metrics gauges ──────────────────────────────────────────
+metrics.gauge("queue_depth", lambda: injection_worker.stats()["depth"])
+metrics.gauge("clients", lambda: len(clients))
+metrics.gauge("threads", threading.active_count)
+
+
+context_scheduler = ContextScheduler(
+    run_context_grab,
+    deliver_context,
+    spawn=lambda fn, *args: transport.spawn(fn, *args),
+    sleep=lambda seconds: transport.sleep(seconds),
+)
+
+
+# ── Event registration ──────────────────────────────────────
+
+EVENT_HANDLERS: Dict[str, Callable[[str, Any], None]] = {
+    "text_input": on_text_input,
+    "key_command": on_key_command,
+    "move_cursor": on_move_cursor,
+    "edit_ops": on_edit_ops,
+    "request_context": on_request_context,
+    "context_resync": on_context_resync,
+    "context_page": on_context_page,
+    "stats": on_stats,
+    "clock_sync": on_clock_sync,
+    "cancel_inject": on_cancel_inject,
+    "dictation": on_dictation,
+}
+
+
+def set_transport(new_transport: Transport) -> None:
+    """Route handler output through another front end (see asgi_server.py)."""
+    global transport
+    transport = new_transport
+
+
+@socketio.on("connect")
+def _flask_connect(auth=None):
+    on_connect(request.sid, request.remote_addr, auth)
+
+
+@socketio.on("disconnect")
+def _flask_disconnect(*args):
+    on_disconnect(request.sid)
 
-def push_context_delayed(sid: str):
-    """Delay context grab slightly to allow target app to process input."""
-    socketio.sleep(0.1) # 100ms delay
-    ctx = get_cursor_context()
-    socketio.emit("context_update", ctx, to=sid)
+
+def _flask_handler(handler: Callable[[str, Any], None]) -> Callable[..., None]:
+    def wrapper(payload: Any = None) -> None:
+        handler(request.sid, payload)
+    return wrapper
+
+
+for _event, _handler in EVENT_HANDLERS.items():
+    socketio.on_event(_event, _flask_handler(_handler))
+
+
+# ── Event-driven context push ───────────────────────────────
+
+def _on_target_changed(kinds: Set[str]) -> None:
+    """Throttled focus/text/selection events: one grab for every client.
+
+    Text and caret events while our own edits are being typed, or are typed
+    but not reconciled yet, are echoes of those edits: the shadow already
+    has them and the follow-up grab after the edit will reconcile.
+    """
+    log.debug(f"[events] target changed kinds={sorted(kinds)}")
+    if "focus" not in kinds:
+        queue = injection_worker.stats()
+        if queue["busy"] or queue["depth"] or shadow.pending() is not None:
+            log.debug(f"[events] ignoring {sorted(kinds)} during our own edits")
+            return
+    if "focus" in kinds:
+        # The caret is in another control now: the shadow copy, cached
+        # pages and an open utterance all describe the old one
+        shadow.invalidate()
+        context_pages.touch()
+        dictation.interrupt()
+    context_scheduler.request(supersede="focus" in kinds)
+
+
+def start_context_push(source: Optional[ContextEventSource] = None) -> bool:
+    """Drive context updates from target events instead of client polling."""
+    global push_mode
+
+    if source is None:
+        source = create_event_source()
+    if source is None:
+        log.warning("[events] no event source on this platform, keeping polling")
+        return False
+
+    source.start(EventThrottle(_on_target_changed, interval=CONTEXT_PUSH_INTERVAL))
+    push_mode = True
+    log.info(f"[events] push mode on (throttle={CONTEXT_PUSH_INTERVAL}s)")
+    return True
 
 
 # ── Utility functions ────────────────────────────────────────
@@ -257,58 +1075,95 @@ def get_lan_ips() -> List[str]:
     return ips
 
 
-def print_qr(url: str) -> None:
-    """Print a QR code in the terminal."""
+def render_qr(url: str) -> str:
+    """A QR code for `url` as terminal text ("" without the qrcode package)."""
     try:
         import qrcode
     except ImportError:
         log.warning("qrcode package not installed, skipping QR display")
-        return
+        return ""
 
-    print(f"\nScan this QR code to open: {url}\n")
     qr = qrcode.QRCode(border=1)
     qr.add_data(url)
     qr.make(fit=True)
+    out = io.StringIO()
+    qr.print_ascii(out=out, invert=True)
+    text = out.getvalue()
     try:
-        qr.print_ascii(invert=True)
-    except UnicodeEncodeError:
-        matrix = qr.get_matrix()
-        for row in matrix:
-            line = "".join("##" if cell else "  " for cell in row)
-            print(line)
-    print("")
+        text.encode(sys.stdout.encoding or "utf-8")
+    except (UnicodeEncodeError, LookupError):
+        # e.g. a cp950 console without the half-block characters
+        text = "".join("".join("##" if cell else "  " for cell in row) + "\n" for row in qr.get_matrix())
+    return f"\nScan this QR code to open: {url}\n\n{text}"
+
+
+def announce() -> None:
+    """Print the LAN URLs and their QR codes (runs while the server listens)."""
+    t0 = time.perf_counter()
+    lan_ips = get_lan_ips()
+    warmup.phase("lan", time.perf_counter() - t0)
+
+    lines = []
+    if lan_ips:
+        lines.append("\nAvailable LAN URLs:")
+        lines.extend(f"  → http://{ip}:{PORT}/" for ip in lan_ips)
+        lines.append("\nQR codes (scan with your phone camera):")
+        t0 = time.perf_counter()
+        lines.extend(render_qr(f"http://{ip}:{PORT}/") for ip in lan_ips)
+        warmup.phase("qr", time.perf_counter() - t0)
+        # Browsers only run service workers on HTTPS or localhost
+        lines.append("Offline cache (sw.js) is off over plain http:// LAN URLs; only HTTPS or localhost get it.")
+    else:
+        lines.append("\nNo LAN IP detected. Use localhost if running on same machine.")
+    lines.append("Waiting for connections...\n")
+    # One write so the request log cannot interleave with the QR codes
+    print("\n".join(lines), flush=True)
+
+
+def _on_ready(w: Warmup) -> None:
+    if clients:
+        transport.emit("status_update", {"status": "ready", "hostname": socket.gethostname(), "startup": w.snapshot()})
+
+
+def start_warmup() -> None:
+    """Initialise the backends and print the QR codes in the background."""
+    # Injection backend, clipboard and UIA, in the worker if there is one
+    warmup.add("worker" if desktop.worker else "desktop", desktop.warm_up)
+    warmup.add("announce", announce)
+    warmup.on_ready(_on_ready)
+    warmup.start()
 
 
 # ── Main entry point ─────────────────────────────────────────
 
 def main() -> None:
-    lan_ips = get_lan_ips()
+    if CONTEXT_PUSH:
+        start_context_push()
 
     print("=" * 50)
     print("  GhostWriter — Phone-to-PC Input Bridge")
     print("=" * 50)
     print(f"\nListening on {HOST}:{PORT}")
-    print(f"Async mode: threading")
-
-    if lan_ips:
-        print("\nAvailable LAN URLs:")
-        for ip in lan_ips:
-            print(f"  → http://{ip}:{PORT}/")
-        print("\nQR codes (scan with your phone camera):")
-        for ip in lan_ips:
-            print_qr(f"http://{ip}:{PORT}/")
-    else:
-        print("\nNo LAN IP detected. Use localhost if running on same machine.")
+    print(f"Async mode: {SERVER_MODE}")
 
-    print("Waiting for connections...\n")
+    # Listen right away; backends, LAN URLs and QR codes come up meanwhile
+    start_warmup()
 
     try:
-        socketio.run(
-            app,
-            host=HOST,
-            port=PORT,
-            allow_unsafe_werkzeug=True,  # Required for threading mode
-        )
+        if SERVER_MODE == "asgi":
+            try:
+                from .asgi_server import serve
+            except ImportError:
+                from asgi_server import serve
+            serve(sys.modules[__name__], HOST, PORT, grab_workers=ASGI_GRAB_WORKERS)
+        else:
+            socketio.run(
+                app,
+                host=HOST,
+                port=PORT,
+                allow_unsafe_werkzeug=True,  # Required for threading mode
+                request_handler=NoDelayRequestHandler,
+            )
     except OSError as exc:
         log.error(f"Failed to start server on {HOST}:{PORT}: {exc}")
         print("Try another port: set PORT=5001 and restart.")
@@ -0,0 +1,139 @@
+"""Resumable phone sessions for GhostWriter.
+
+A Socket.IO sid lives only as long as one WebSocket.  On a phone, Wi-Fi
+blips drop the socket every so often, and each reconnect used to look like
+a brand-new client: the edit_ops sequence started over (so batches the
+phone resent were typed twice), queued ops were acked to a dead sid, and
+the phone re-downloaded the full context.
+
+A session outlives its sockets.  The server hands the phone a token in the
+"connected" status; the phone sends it back in the Socket.IO CONNECT auth
+payload when it reconnects.  While the phone is away the session keeps the
+next edit_ops seq it expects, so on resume every batch below it is acked as
+a duplicate and nothing is injected twice, and every batch from it on is
+new, so nothing typed offline is lost.  A session nobody resumes within
+`ttl` seconds is dropped.
+"""
+
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class Session:
+    token: str
+    sid: Optional[str]
+    # edit_ops seq expected next; None until the first batch
+    next_seq: Optional[int] = None
+    # monotonic time the socket went away; None while connected
+    detached_at: Optional[float] = None
+    resumes: int = 0
+
+
+class SessionRegistry:
+    """Sessions by token, with the sid currently bound to each."""
+
+    def __init__(self, ttl: float = 120.0, max_sessions: int = 32) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Session] = {}
+        self._by_sid: Dict[str, str] = {}
+
+        self.opened = 0
+        self.resumed = 0
+        self.expired = 0
+
+    def get(self, token: Any) -> Optional[Session]:
+        """The live session for `token` (None if unknown or expired)."""
+        if not isinstance(token, str):
+            return None
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None or self._is_expired(session, time.monotonic()):
+                return None
+            return session
+
+    def open(self, sid: str, token: Any = None) -> tuple[Session, Optional[str]]:
+        """Bind `sid` to the session for `token`, or to a new session.
+
+        Returns (session, previous sid); the previous sid is None for a new
+        session.  The caller moves whatever it keeps per sid over to `sid`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token) if isinstance(token, str) else None
+            if session is not None and not self._is_expired(session, now):
+                previous = session.sid
+                if previous is not None:
+                    self._by_sid.pop(previous, None)
+                session.sid, session.detached_at = sid, None
+                session.resumes += 1
+                self._by_sid[sid] = session.token
+                self.resumed += 1
+                return session, previous
+
+            session = Session(token=secrets.token_urlsafe(16), sid=sid)
+            self._sessions[session.token] = session
+            self._by_sid[sid] = session.token
+            self.opened += 1
+            return session, None
+
+    def detach(self, sid: str, next_seq: Optional[int]) -> bool:
+        """The socket for `sid` closed; keep its session resumable.
+
+        Returns False if `sid` has no session (already resumed elsewhere,
+        closed, or never had one).
+        """
+        with self._lock:
+            token = self._by_sid.pop(sid, None)
+            session = self._sessions.get(token) if token else None
+            if session is None or session.sid != sid:
+                return False
+            if next_seq is not None:
+                session.next_seq = next_seq
+            session.detached_at = time.monotonic()
+            return True
+
+    def close(self, sid: str) -> None:
+        """End the session bound to `sid`; it cannot be resumed."""
+        with self._lock:
+            token = self._by_sid.pop(sid, None)
+            if token is not None:
+                self._sessions.pop(token, None)
+
+    def prune(self) -> List[Session]:
+        """Drop sessions past their ttl (and the oldest detached ones over
+        `max_sessions`); returns them so per-sid state can be freed."""
+        now = time.monotonic()
+        with self._lock:
+            dropped = [s for s in self._sessions.values() if self._is_expired(s, now)]
+            detached = sorted(
+                (s for s in self._sessions.values() if s.detached_at is not None and s not in dropped),
+                key=lambda s: s.detached_at or 0.0,
+            )
+            excess = len(self._sessions) - len(dropped) - self.max_sessions
+            if excess > 0:
+                dropped += detached[:excess]
+            for session in dropped:
+                self._sessions.pop(session.token, None)
+            self.expired += len(dropped)
+            return dropped
+
+    def _is_expired(self, session: Session, now: float) -> bool:
+        return session.detached_at is not None and now - session.detached_at > self.ttl
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": sum(1 for s in self._sessions.values() if s.detached_at is None),
+                "detached": sum(1 for s in self._sessions.values() if s.detached_at is not None),
+                "opened": self.opened,
+                "resumed": self.resumed,
+                "expired": self.expired,
+            }
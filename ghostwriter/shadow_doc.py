@@ -0,0 +1,193 @@
+"""Shadow copy of the text around the PC caret for GhostWriter.
+
+Every injected keystroke used to be followed by a real context grab (UIA or
+Ctrl+C) just to learn that the characters we typed now sit before the
+caret.  `ShadowBuffer` keeps, per focused control (the grab's `target`:
+window handle plus UIA element), the context from the last real grab and
+applies our own inserts, backspaces, deletes and caret moves to it, so the
+new context can be sent to the phones immediately.  A real
+grab every so often reconciles the copy with what the app actually shows
+and counts how often the two disagreed (drift).
+
+Anything the model cannot follow (up/down/home/end, key chords, a caret
+move past the text it knows) invalidates the copy; the next context
+request then goes to a real grab as before.
+
+Each local edit bumps `epoch`.  A grab reconciles only if no edit happened
+while it ran, since otherwise it may predate the text we just typed.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Context fields the shadow edits; the rest (app_name, strategy, ...) are kept
+TEXT_FIELDS = ("before", "after", "selected")
+
+
+def _norm(text: str) -> str:
+    return text.replace("\r", "")
+
+
+class ShadowBuffer:
+    """Last known context per target, edited locally between real grabs.
+
+    `window` caps how much text is kept on each side of the caret, like the
+    grab's chars_before/chars_after.  Thread-safe: edits arrive from the
+    injection thread, reconciles from grab threads.
+    """
+
+    def __init__(self, window: int = 50, max_targets: int = 8) -> None:
+        self.window = window
+        self.max_targets = max_targets
+        self._lock = threading.Lock()
+        # ctx["target"] -> last context (real or locally edited).  Not the
+        # app name: two fields of one window must not share a copy.
+        self._docs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._current: Optional[str] = None
+        self._dirty = False
+        self._epoch = 0
+
+        self.edits = 0
+        self.invalidations = 0
+        self.reconciles = 0
+        self.discarded = 0
+        self.drift = 0
+
+    @property
+    def epoch(self) -> int:
+        with self._lock:
+            return self._epoch
+
+    # ── Real grabs ───────────────────────────────────────────
+
+    def reconcile(self, ctx: Dict[str, Any], epoch: int) -> bool:
+        """Adopt a real grab started at `epoch`; False if edits overtook it."""
+        with self._lock:
+            if epoch != self._epoch:
+                self.discarded += 1
+                return False
+            key = ctx.get("target") if ctx.get("supported") else None
+            if key is None:
+                self._current = None
+                self._dirty = False
+                return True
+            doc = self._docs.get(key)
+            if self._dirty and key == self._current and doc is not None and not self._matches(doc, ctx):
+                self.drift += 1
+            self._docs[key] = dict(ctx)
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_targets:
+                self._docs.popitem(last=False)
+            self._current = key
+            self._dirty = False
+            self.reconciles += 1
+            return True
+
+    @staticmethod
+    def _matches(shadow: Dict[str, Any], real: Dict[str, Any]) -> bool:
+        """Compare on the text both sides hold (the shadow may hold less)."""
+        before, real_before = _norm(shadow.get("before", "")), _norm(real.get("before", ""))
+        after, real_after = _norm(shadow.get("after", "")), _norm(real.get("after", ""))
+        n, m = min(len(before), len(real_before)), min(len(after), len(real_after))
+        return (
+            before[len(before) - n:] == real_before[len(real_before) - n:]
+            and after[:m] == real_after[:m]
+            and _norm(shadow.get("selected", "")) == _norm(real.get("selected", ""))
+        )
+
+    # ── Local edits ──────────────────────────────────────────
+
+    def insert(self, text: str) -> Optional[Dict[str, Any]]:
+        """Typed text replaces the selection and ends up before the caret."""
+        return self._edit(lambda before, after, selected: (before + text.replace("\r\n", "\n"), after, ""))
+
+    def delete_back(self, count: int = 1) -> Optional[Dict[str, Any]]:
+        def edit(before: str, after: str, selected: str):
+            n = count
+            if selected:
+                selected, n = "", n - 1
+            for _ in range(n):
+                if not before:
+                    return None  # past what we know
+                before = before[:-2] if before.endswith("\r\n") else before[:-1]
+            return before, after, selected
+        return self._edit(edit)
+
+    def delete_forward(self, count: int = 1) -> Optional[Dict[str, Any]]:
+        def edit(before: str, after: str, selected: str):
+            n = count
+            if selected:
+                selected, n = "", n - 1
+            for _ in range(n):
+                if not after:
+                    return None
+                after = after[2:] if after.startswith("\r\n") else after[1:]
+            return before, after, selected
+        return self._edit(edit)
+
+    def move(self, offset: int) -> Optional[Dict[str, Any]]:
+        """Caret `offset` characters from the selection start (<0) or end."""
+        def edit(before: str, after: str, selected: str):
+            if offset < 0:
+                after = selected + after
+                if -offset > len(before):
+                    return None
+                return before[:len(before) + offset], before[len(before) + offset:] + after, ""
+            before = before + selected
+            if offset > len(after):
+                return None
+            return before + after[:offset], after[offset:], ""
+        return self._edit(edit)
+
+    def invalidate(self) -> None:
+        """Something we cannot model happened; wait for a real grab."""
+        with self._lock:
+            if self._current is not None:
+                self.invalidations += 1
+            self._current = None
+            self._dirty = False
+            self._epoch += 1
+
+    def _edit(self, fn: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._epoch += 1
+            doc = self._docs.get(self._current) if self._current is not None else None
+            if doc is None:
+                return None
+            edited = fn(doc.get("before", ""), doc.get("after", ""), doc.get("selected", ""))
+            if edited is None:
+                self.invalidations += 1
+                self._current = None
+                self._dirty = False
+                return None
+            before, after, selected = edited
+            doc["before"] = before[-self.window:] if len(before) > self.window else before
+            doc["after"] = after[:self.window]
+            doc["selected"] = selected
+            self._dirty = True
+            self.edits += 1
+            return dict(doc)
+
+    # ── Views ────────────────────────────────────────────────
+
+    def pending(self) -> Optional[Dict[str, Any]]:
+        """The edited context while it is ahead of the last real grab, else None."""
+        with self._lock:
+            if not self._dirty or self._current is None:
+                return None
+            return dict(self._docs[self._current])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "target": self._current,
+                "dirty": self._dirty,
+                "edits": self.edits,
+                "reconciles": self.reconciles,
+                "discarded": self.discarded,
+                "drift": self.drift,
+                "invalidations": self.invalidations,
+            }
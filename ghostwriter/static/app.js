@@ -1,7 +1,13 @@
 (function () {
   "use strict";
 
-  var socket = new Sio4Lite();
+  // Token of our server session; sent on reconnect to resume it
+  var sessionToken = null;
+  var socket = new Sio4Lite({
+    auth: function () {
+      return sessionToken ? { session: sessionToken } : null;
+    }
+  });
 
   var textInput = document.getElementById("textInput");
   var modeSelect = document.getElementById("modeSelect");
@@ -12,6 +18,12 @@
   var statusText = document.getElementById("statusText");
   var hostName = document.getElementById("hostName");
   var reconnectMsg = document.getElementById("reconnectMsg");
+  var latencyOverlay = document.getElementById("latencyOverlay");
+  var pendingOps = document.getElementById("pendingOps");
+  var injectProgress = document.getElementById("injectProgress");
+  var injectBar = document.getElementById("injectBar");
+  var injectLabel = document.getElementById("injectLabel");
+  var cancelInject = document.getElementById("cancelInject");
 
   // Phase 2 Elements
   var contextArea = document.getElementById("contextArea");
@@ -19,8 +31,12 @@
   var textBefore = document.getElementById("textBefore");
   var textAfter = document.getElementById("textAfter");
   var refreshContext = document.getElementById("refreshContext");
+  var contextContent = document.getElementById("contextContent");
+  var expandContext = document.getElementById("expandContext");
 
   var isComposing = false;
+  // Server pushes context on focus/text/selection events; no polling needed
+  var pushMode = false;
 
   /* ── i18n Logic ────────────────────────────────────────── */
 
@@ -30,13 +46,19 @@
       statusDisconnected: "Disconnected",
       statusReconnecting: "Reconnecting...",
       statusReplaced: "Replaced by a new client",
+      statusWarming: "Connected, starting up...",
       statusError: "Injection error",
+      btnCancel: "Stop",
       title: "GhostWriter",
       subtitle: "Type on phone, inject at your PC cursor instantly.",
       labelMode: "Mode",
       modeStream: "Real-time Stream",
       modeBatch: "Batch (Commit)",
       modeReplace: "Replace Selection",
+      modeDictation: "Dictation (Voice)",
+      btnDone: "Done",
+      dictationClosed: "Dictation interrupted on the PC, starting over",
+      editsDropped: "New PC session: {n} unconfirmed edits not resent",
       labelInput: "Input",
       btnSend: "Send to PC",
       btnReplace: "Replace Selection",
@@ -47,21 +69,29 @@
       help1: "Select <b>Stream</b> for instant typing (like a remote keyboard).",
       help2: "Select <b>Batch</b> to write a full sentence first, then send.",
       help3: "Select <b>Replace</b> to grab PC text, edit it, and send it back.",
+      help4: "Select <b>Dictation</b> and use your keyboard's voice input: words appear on the PC as you speak and are corrected in place. Tap <b>Done</b> to start a new sentence.",
       placeholder: "Type, write, or use voice input...",
-      unsupported: "This app doesn't support text sync"
+      unsupported: "This app doesn't support text sync",
+      ctxTimeout: "PC not responding, try again in a moment"
     },
     zh: {
       statusConnected: "已連線",
       statusDisconnected: "連線中斷",
       statusReconnecting: "重新連線中...",
       statusReplaced: "已被新用戶取代",
+      statusWarming: "已連線，啟動中...",
       statusError: "注入錯誤",
+      btnCancel: "停止",
       title: "GhostWriter",
       subtitle: "手機輸入文字，即時在電腦游標處注入。",
       labelMode: "運作模式",
       modeStream: "即時序列 (打字機模式)",
       modeBatch: "整段發送 (批次模式)",
       modeReplace: "替換選取內容 (修改模式)",
+      modeDictation: "語音聽寫 (邊說邊改)",
+      btnDone: "完成",
+      dictationClosed: "電腦端聽寫已中斷，重新開始",
+      editsDropped: "電腦端為新連線：{n} 項未確認的編輯未重送",
       labelInput: "輸入區域",
       btnSend: "發送到電腦",
       btnReplace: "取代電腦選取文字",
@@ -72,8 +102,10 @@
       help1: "選取 <b>即時序列</b>：手機打字會像虛擬鍵盤一樣同步到電腦。",
       help2: "選取 <b>整段發送</b>：先在手機寫完，按下「發送」後才會傳到電腦。",
       help3: "選取 <b>修改模式</b>：點擊「抓取」取得電腦選取的文字，在手機修改後點擊「取代」。",
+      help4: "選取 <b>語音聽寫</b> 並使用鍵盤的語音輸入：說話時文字即時出現在電腦上，辨識修正也會同步更新。點擊「完成」開始下一句。",
       placeholder: "輸入文字、語音輸入，或是修改內容...",
-      unsupported: "此程式暫不支援文字同步"
+      unsupported: "此程式暫不支援文字同步",
+      ctxTimeout: "電腦端無回應，請稍後再試"
     }
   };
 
@@ -124,10 +156,20 @@
       sendBtn.classList.remove("hidden");
       grabBtn.classList.remove("hidden");
       sendBtn.textContent = t.btnReplace;
+    } else if (mode === "dictation") {
+      sendBtn.classList.remove("hidden");
+      grabBtn.classList.add("hidden");
+      sendBtn.textContent = t.btnDone;
     }
   }
 
-  modeSelect.addEventListener("change", updateUiForMode);
+  var lastMode = modeSelect.value;
+  modeSelect.addEventListener("change", function () {
+    // Leaving dictation ends the utterance as it stands
+    if (lastMode === "dictation") finishUtterance();
+    lastMode = modeSelect.value;
+    updateUiForMode();
+  });
 
   /* ── Connection status helpers ─────────────────────────── */
 
@@ -146,13 +188,12 @@
   socket.on("connect", function () {
     setConnected(true, "statusConnected");
     reconnectMsg.classList.add("hidden");
-    // Small delay to ensure the connection is stable before heavy COM requests
-    setTimeout(function () {
-      socket.emit("request_context");
-    }, 500);
+    if (latencyOn) syncClock();
   });
 
   socket.on("disconnect", function () {
+    // Edits stay queued and go out once the session resumes
+    pauseEdits();
     setConnected(false, "statusDisconnected");
     reconnectMsg.classList.remove("hidden");
   });
@@ -172,36 +213,226 @@
   socket.on("status_update", function (payload) {
     if (!payload || typeof payload !== "object") return;
     if (payload.status === "connected") {
-      setConnected(true, "statusConnected");
+      pushMode = !!payload.push;
+      var resumed = !!payload.resumed && payload.session === sessionToken;
+      sessionToken = payload.session || null;
+      var dropped = resumeEdits(resumed ? payload.next_seq : null);
+      if (!resumed) {
+        // The new session knows nothing of what the old one typed
+        dictPending = [];
+        if (dictText) newUtterance();
+        // New server session: context versions start over
+        ctxState = null;
+        ctxVersion = 0;
+        // Small delay to ensure the connection is stable before heavy COM requests
+        setTimeout(function () {
+          socket.emit("request_context");
+        }, 500);
+      }
+      // ready is false while the PC is still initialising its backends
+      setConnected(true, payload.ready === false ? "statusWarming" : "statusConnected");
+      if (dropped) {
+        statusText.textContent = translations[langSelect.value].editsDropped.replace("{n}", dropped);
+        setTimeout(function () {
+          if (socket.connected) setConnected(true, "statusConnected");
+        }, 3000);
+      }
+    } else if (payload.status === "ready") {
+      if (socket.connected) setConnected(true, "statusConnected");
     } else if (payload.status === "replaced") {
       setConnected(false, "statusReplaced");
     }
     hostName.textContent = payload.hostname || "-";
   });
 
-  socket.on("context_update", function (payload) {
+  /* ── Context sync (versioned deltas) ───────────────────── */
+
+  var ctxState = null;
+  var ctxVersion = 0;
+
+  function applyContextDelta(base, delta) {
+    var next = {};
+    var key;
+    for (key in base) {
+      if (Object.prototype.hasOwnProperty.call(base, key)) next[key] = base[key];
+    }
+    for (key in delta) {
+      if (!Object.prototype.hasOwnProperty.call(delta, key)) continue;
+      var d = delta[key];
+      if (d === null) {
+        delete next[key];
+      } else if (typeof d === "object" && typeof d.t === "string") {
+        // String diff: keep prefix/suffix of the old value, splice in d.t
+        // (p and s count UTF-16 units, the same units slice() uses)
+        var old = typeof next[key] === "string" ? next[key] : "";
+        next[key] = old.slice(0, d.p) + d.t + old.slice(old.length - d.s);
+      } else {
+        next[key] = d;
+      }
+    }
+    return next;
+  }
+
+  function setText(el, text) {
+    // Skip DOM writes when nothing changed
+    if (el.textContent !== text) el.textContent = text;
+  }
+
+  function renderContext(ctx) {
     var t = translations[langSelect.value];
-    if (!payload || typeof payload !== "object") return;
 
-    if (payload.supported) {
+    if (ctx.pv !== pageV) resetPages(ctx.pv);
+
+    if (ctx.supported) {
       contextArea.classList.remove("unsupported");
-      appName.textContent = payload.app_name || "Unknown App";
-      textBefore.textContent = payload.before || "";
-      textAfter.textContent = payload.after || "";
+      setText(appName, ctx.app_name || "Unknown App");
+      // Loaded pages start at the caret and replace the short grab
+      setText(textBefore, pageStart < 0 ? extraBefore : (ctx.before || ""));
+      setText(textAfter, pageEnd > 0 ? extraAfter : (ctx.after || ""));
     } else {
       contextArea.classList.add("unsupported");
-      appName.textContent = payload.app_name || "Unsupported";
-      textBefore.textContent = payload.reason || t.unsupported;
-      textAfter.textContent = "";
+      setText(appName, ctx.app_name || "Unsupported");
+      // "timeout": the PC's desktop worker is hung or restarting
+      setText(textBefore, ctx.strategy === "timeout" ? t.ctxTimeout : (ctx.reason || t.unsupported));
+      setText(textAfter, "");
     }
 
-    if (modeSelect.value === "replace" && payload.selected) {
-      textInput.value = payload.selected;
+    if (modeSelect.value === "replace" && ctx.selected) {
+      textInput.value = ctx.selected;
       textInput.focus();
     }
+  }
+
+  socket.on("context_update", function (payload) {
+    if (!payload || typeof payload !== "object") return;
+
+    if (payload.full) {
+      ctxState = payload.full;
+      ctxVersion = payload.v;
+    } else if (payload.delta) {
+      if (!ctxState || payload.base !== ctxVersion) {
+        // Versions drifted (missed an update): ask for a full snapshot
+        socket.emit("context_resync");
+        return;
+      }
+      ctxState = applyContextDelta(ctxState, payload.delta);
+      ctxVersion = payload.v;
+    } else {
+      return;
+    }
+
+    renderContext(ctxState);
+  });
+
+  /* ── Paged context (expanded preview) ──────────────────── */
+  // Expanded, the preview scrolls and loads more text around the caret a
+  // page at a time.  Pages belong to one document version (ctx.pv); any
+  // edit starts over, so text from two versions is never stitched together.
+  // Pages are chained on the start/end offsets the PC reports, never on
+  // string lengths here: the PC drops some characters (U+FFFC) and counts
+  // in its own units, so a length-based offset would skip or repeat text.
+
+  var PAGE_CHARS = 400;
+  var expanded = false;
+  var pageV = null;
+  var extraBefore = "";
+  var extraAfter = "";
+  // Span loaded so far, in PC offsets from the caret (0/0: none yet)
+  var pageStart = 0;
+  var pageEnd = 0;
+  var pageDone = { before: false, after: false };
+  var pageLoading = { before: false, after: false };
+  var fillTimer = null;
+
+  function resetPages(v) {
+    pageV = v;
+    extraBefore = "";
+    extraAfter = "";
+    pageStart = pageEnd = 0;
+    pageDone.before = pageDone.after = false;
+    pageLoading.before = pageLoading.after = false;
+    if (expanded) schedulePageFill();
+  }
+
+  function requestPage(side) {
+    if (!expanded || !ctxState || !ctxState.supported || !socket.connected) return;
+    if (pageLoading[side] || pageDone[side]) return;
+    var offset = side === "before" ? pageStart - PAGE_CHARS : pageEnd;
+    pageLoading[side] = true;
+    socket.emit("context_page", { offset: offset, size: PAGE_CHARS });
+  }
+
+  function fillPages() {
+    // Load until the box can scroll, then leave the rest to scrolling
+    if (contextContent.scrollHeight <= contextContent.clientHeight + 24) {
+      requestPage("before");
+      requestPage("after");
+    }
+  }
+
+  function schedulePageFill() {
+    // Typing changes the version on every key: wait for a pause
+    clearTimeout(fillTimer);
+    fillTimer = setTimeout(fillPages, 400);
+  }
+
+  socket.on("context_page", function (page) {
+    if (!page || typeof page !== "object") return;
+    var side = page.req < 0 ? "before" : "after";
+    pageLoading[side] = false;
+    if (page.v !== pageV || !ctxState) return;
+    if (!page.ok) {
+      pageDone[side] = true;
+      return;
+    }
+    if (side === "before") {
+      // The page must end where the text we show starts
+      if (page.end !== pageStart) return;
+      var height = contextContent.scrollHeight;
+      extraBefore = page.text + extraBefore;
+      pageStart = page.start;
+      setText(textBefore, pageStart < 0 ? extraBefore : (ctxState.before || ""));
+      // Keep the text under the finger where it was
+      contextContent.scrollTop += contextContent.scrollHeight - height;
+    } else {
+      if (page.start !== pageEnd) return;
+      extraAfter += page.text;
+      pageEnd = page.end;
+      setText(textAfter, pageEnd > 0 ? extraAfter : (ctxState.after || ""));
+    }
+    if (page.edge || !page.text) pageDone[side] = true;
+    fillPages();
+  });
+
+  contextContent.addEventListener("scroll", function () {
+    if (contextContent.scrollTop < 24) requestPage("before");
+    if (contextContent.scrollHeight - contextContent.scrollTop - contextContent.clientHeight < 24) requestPage("after");
+  }, { passive: true });
+
+  expandContext.addEventListener("click", function () {
+    expanded = !expanded;
+    contextArea.classList.toggle("expanded", expanded);
+    expandContext.setAttribute("aria-pressed", expanded ? "true" : "false");
+    if (expanded) {
+      fillPages();
+    } else if (ctxState) {
+      resetPages(pageV);
+      renderContext(ctxState);
+    }
   });
 
   socket.on("error", function (payload) {
+    if (payload && payload.code === "DICTATION_CLOSED") {
+      // Something else typed on the PC: what is left here would land elsewhere
+      if (payload.detail === utteranceId()) {
+        newUtterance();
+        statusText.textContent = translations[langSelect.value].dictationClosed;
+        setTimeout(function () {
+          if (socket.connected) setConnected(true, "statusConnected");
+        }, 2000);
+      }
+      return;
+    }
     setConnected(false, "statusError");
     setTimeout(function () {
       if (socket.connected) {
@@ -210,16 +441,301 @@
     }, 2000);
   });
 
+  /* ── Long injection progress ───────────────────────────── */
+
+  // Long texts are typed in chunks; the server reports each one and the
+  // bar's Stop button ends the injection after the current chunk.
+  var injectId = 0;
+  var injectHideTimer = null;
+
+  socket.on("inject_progress", function (p) {
+    if (!p || typeof p.id !== "number") return;
+    injectId = p.id;
+    clearTimeout(injectHideTimer);
+    injectProgress.classList.remove("hidden");
+    injectBar.style.width = (p.total ? Math.round(100 * p.done / p.total) : 100) + "%";
+    injectLabel.textContent = p.done + " / " + p.total + (p.cps ? " · " + p.cps + "/s" : "");
+    cancelInject.disabled = !!p.finished;
+    if (p.finished) {
+      injectHideTimer = setTimeout(function () {
+        injectProgress.classList.add("hidden");
+      }, p.cancelled ? 2000 : 600);
+    }
+  });
+
+  cancelInject.addEventListener("click", function () {
+    cancelInject.disabled = true;
+    socket.emit("cancel_inject", { id: injectId });
+  });
+
+  /* ── Latency overlay ───────────────────────────────────── */
+
+  // Enabled with ?latency=1 or by tapping the status dot; remembered locally
+  var latencyOn = /[?&]latency=1\b/.test(location.search) ||
+    localStorage.getItem("gwLatency") === "1";
+  var clockOffset = 0;   // server epoch ms - client epoch ms
+  var traceSeq = 0;
+  var traceSent = {};
+
+  function setLatencyOverlay(on) {
+    latencyOn = on;
+    localStorage.setItem("gwLatency", on ? "1" : "0");
+    latencyOverlay.classList.toggle("hidden", !on);
+    latencyOverlay.textContent = on ? "latency: -" : "";
+    traceSent = {};
+    if (on && socket.connected) syncClock();
+  }
+
+  function syncClock() {
+    socket.emit("clock_sync", { t0: Date.now() });
+  }
+
+  socket.on("clock_sync", function (payload) {
+    if (!payload || typeof payload.t0 !== "number" || typeof payload.ts !== "number") return;
+    var now = Date.now();
+    // Assume the reply was stamped halfway through the round trip
+    clockOffset = payload.ts - (payload.t0 + now) / 2;
+  });
+
+  socket.on("trace", function (payload) {
+    if (!latencyOn || !payload || !payload.ids) return;
+    var now = Date.now();
+    var rtt = null;
+    payload.ids.forEach(function (id) {
+      if (traceSent[id] === undefined) return;
+      rtt = now - traceSent[id];
+      delete traceSent[id];
+    });
+    if (rtt === null) return;
+    latencyOverlay.textContent =
+      "rtt " + rtt + " ms · queue " + payload.queue_ms.toFixed(1) +
+      " · inject " + payload.inject_ms.toFixed(1) +
+      " · server " + payload.server_ms.toFixed(1) +
+      (payload.merged > 1 ? " · ×" + payload.merged : "");
+  });
+
+  statusDot.addEventListener("click", function () {
+    setLatencyOverlay(!latencyOn);
+  });
+
+  if (latencyOn) setLatencyOverlay(true);
+
+  /* ── Batched edit ops ──────────────────────────────────── */
+
+  // Edits are queued locally and sent as binary edit_ops batches.  At most
+  // EDIT_WINDOW batches are in flight; whatever is typed meanwhile is
+  // coalesced and goes out in one batch when an ops_ack frees a slot.
+  // While offline, edits keep queueing; on reconnect the session resumes
+  // and the server skips batches it already took (seq below next_seq).
+  var EDIT_WINDOW = 2;
+  var EDIT_MAX_OPS = 256;
+  var editSeq = 0;
+  var editQueue = [];      // ops not sent yet
+  var editInFlight = [];   // [{seq, ops}] sent, waiting for ops_ack
+  var editRetryTimer = null;
+  // Pause before resending after the PC did not answer; doubles up to the max
+  var RETRY_MIN_MS = 500;
+  var RETRY_MAX_MS = 8000;
+  var editBackoff = RETRY_MIN_MS;
+
+  function codePoints(text) {
+    return Array.from ? Array.from(text) : text.split("");
+  }
+
+  function isHorizontal(op) {
+    return op.dir === "left" || op.dir === "right";
+  }
+
+  function signedSteps(op) {
+    return op.dir === "left" ? -op.n : op.n;
+  }
+
+  function queueEdit(op) {
+    var last = editQueue[editQueue.length - 1];
+    if (last && last.op === "insert" && op.op === "insert" && last.mode === op.mode) {
+      last.text += op.text;
+    } else if (last && last.op === "delete" && op.op === "delete" && last.dir === op.dir) {
+      last.n += op.n;
+    } else if (last && last.op === "insert" && op.op === "delete" && op.dir === "back") {
+      // Backspace over text that was never sent: just drop the text
+      var chars = codePoints(last.text);
+      var cut = Math.min(chars.length, op.n);
+      last.text = chars.slice(0, chars.length - cut).join("");
+      if (!last.text) editQueue.pop();
+      if (op.n > cut) queueEdit({ op: "delete", dir: "back", n: op.n - cut });
+    } else if (last && last.op === "move" && op.op === "move" && isHorizontal(last) && isHorizontal(op)) {
+      // Caret placements are relative: fold them into one net offset
+      var net = signedSteps(last) + signedSteps(op);
+      if (net === 0) {
+        editQueue.pop();
+      } else {
+        last.dir = net < 0 ? "left" : "right";
+        last.n = Math.abs(net);
+      }
+    } else if (last && last.op === "move" && op.op === "move" && last.dir === op.dir) {
+      last.n += op.n;
+    } else {
+      editQueue.push(op);
+    }
+    pumpEdits();
+  }
+
+  function sendBatch(batch) {
+    var buf = Sio4Lite.encodeEditOps(batch.seq, batch.ops);
+    if (latencyOn) {
+      traceSeq += 1;
+      traceSent[traceSeq] = Date.now();
+      delete traceSent[traceSeq - 100];   // never answered (connection lost, ...)
+      socket.emit("edit_ops", { b: buf, t: Date.now() + clockOffset, trace: traceSeq });
+    } else {
+      socket.emit("edit_ops", buf);
+    }
+  }
+
+  function pumpEdits() {
+    while (socket.connected && !editRetryTimer && editQueue.length && editInFlight.length < EDIT_WINDOW) {
+      editSeq += 1;
+      var batch = { seq: editSeq, ops: editQueue.splice(0, EDIT_MAX_OPS) };
+      editInFlight.push(batch);
+      sendBatch(batch);
+    }
+    showPending(0);
+    pumpDictation();
+  }
+
+  /* ── Dictation ─────────────────────────────────────────── */
+
+  // The text box holds the utterance being dictated.  Every change (each
+  // interim result of the keyboard's speech recognizer) is sent as the
+  // whole hypothesis; the server types only what differs from the last
+  // one.  Only the newest unsent hypothesis of an utterance matters, and
+  // it waits behind queued edits so the two stay in order.
+  var dictBase = Date.now().toString(36);
+  var dictCount = 1;
+  var dictText = "";        // last hypothesis of the current utterance
+  var dictPending = [];     // [{u, text, final}] not sent yet
+
+  function utteranceId() {
+    return dictBase + "." + dictCount;
+  }
+
+  function queueHypothesis(text, final) {
+    if (text === dictText && !final) return;
+    var u = utteranceId();
+    var last = dictPending[dictPending.length - 1];
+    if (last && last.u === u) {
+      last.text = text;
+      last.final = !!final;
+    } else {
+      dictPending.push({ u: u, text: text, final: !!final });
+    }
+    dictText = text;
+    pumpDictation();
+  }
+
+  function pumpDictation() {
+    while (dictPending.length && socket.connected && !editQueue.length) {
+      var payload = dictPending.shift();
+      if (latencyOn) {
+        traceSeq += 1;
+        traceSent[traceSeq] = Date.now();
+        payload.t = Date.now() + clockOffset;
+        payload.trace = traceSeq;
+      }
+      socket.emit("dictation", payload);
+    }
+  }
+
+  // Abandon the current utterance (the PC closed it, or forgot it)
+  function newUtterance() {
+    var u = utteranceId();
+    dictPending = dictPending.filter(function (h) { return h.u !== u; });
+    dictCount += 1;
+    dictText = "";
+    textInput.value = "";
+  }
+
+  function finishUtterance() {
+    if (dictText || textInput.value) {
+      queueHypothesis(textInput.value, true);
+      dictCount += 1;
+      dictText = "";
+    }
+    textInput.value = "";
+  }
+
+  function pauseEdits() {
+    clearTimeout(editRetryTimer);
+    editRetryTimer = null;
+    showPending(0);
+  }
+
+  // nextSeq: the resumed session's next expected seq, or null for a new
+  // session (which takes the first seq it sees as its start).  A new session
+  // cannot tell which in-flight batches the old one typed, so those are
+  // dropped rather than risk typing them twice.  Returns the ops dropped.
+  function resumeEdits(nextSeq) {
+    var dropped = 0;
+    if (typeof nextSeq === "number") {
+      editInFlight = editInFlight.filter(function (b) { return b.seq >= nextSeq; });
+    } else {
+      editInFlight.forEach(function (b) { dropped += b.ops.length; });
+      editInFlight = [];
+    }
+    editInFlight.forEach(sendBatch);
+    pumpEdits();
+    return dropped;
+  }
+
+  function showPending(serverPending) {
+    var count = editQueue.length + editInFlight.length + (serverPending || 0);
+    pendingOps.textContent = count ? count + " ⋯" : "";
+    pendingOps.classList.toggle("hidden", !count);
+  }
+
+  function retryEdits(delay) {
+    // Back off, then resend everything still in flight
+    if (editRetryTimer) return;
+    editRetryTimer = setTimeout(function () {
+      editRetryTimer = null;
+      editInFlight.forEach(sendBatch);
+      pumpEdits();
+    }, delay);
+  }
+
+  socket.on("ops_ack", function (ack) {
+    if (!ack || typeof ack.seq !== "number") return;
+    if (ack.ok) {
+      editInFlight = editInFlight.filter(function (b) { return b.seq !== ack.seq; });
+      editBackoff = RETRY_MIN_MS;
+    } else if (ack.retry) {
+      // The PC did not answer (hung app, restarting worker): the ops
+      // before `index` ran, the rest go again once it has had a moment
+      var batch = editInFlight.filter(function (b) { return b.seq === ack.seq; })[0];
+      if (batch && typeof ack.index === "number") batch.ops = batch.ops.slice(ack.index);
+      retryEdits(editBackoff);
+      editBackoff = Math.min(editBackoff * 2, RETRY_MAX_MS);
+      showPending(ack.pending);
+      return;
+    } else if (ack.code === "QUEUE_FULL" || ack.code === "OUT_OF_ORDER") {
+      // Server is behind
+      retryEdits(300);
+      return;
+    } else {
+      // Rejected as malformed: resending would not help
+      editInFlight = editInFlight.filter(function (b) { return b.seq !== ack.seq; });
+    }
+    pumpEdits();
+    showPending(ack.pending);
+  });
+
   /* ── Input handling ────────────────────────────────────── */
 
   function flushInput() {
     var text = textInput.value;
-    if (!text || !socket.connected) return;
+    if (!text) return;
 
-    socket.emit("text_input", {
-      text: text,
-      mode: modeSelect.value || "stream",
-    });
+    queueEdit({ op: "insert", text: text, mode: modeSelect.value || "stream" });
 
     if (modeSelect.value === "stream") {
       textInput.value = "";
@@ -231,6 +747,10 @@
   }
 
   sendBtn.addEventListener("click", function () {
+    if (modeSelect.value === "dictation") {
+      finishUtterance();
+      return;
+    }
     flushInput();
     if (modeSelect.value !== "stream") {
       textInput.value = "";
@@ -238,6 +758,10 @@
   });
 
   grabBtn.addEventListener("click", function () {
+    // An unchanged context is not re-sent, so fill from what we already have
+    if (ctxState && ctxState.selected) {
+      textInput.value = ctxState.selected;
+    }
     socket.emit("request_context");
   });
 
@@ -261,7 +785,7 @@
     if (e.key === "Backspace" || e.keyCode === 8) {
       if (textInput.value.length === 0) {
         e.preventDefault();
-        socket.emit("key_command", { key: "backspace" });
+        queueEdit({ op: "delete", dir: "back", n: 1 });
 
         // Optimistic update: Remove last char from "Before" text locally
         var currentBefore = textBefore.textContent;
@@ -279,6 +803,12 @@
   });
 
   textInput.addEventListener("input", function (e) {
+    // Interim speech results arrive as composition updates: send them all
+    if (modeSelect.value === "dictation") {
+      queueHypothesis(textInput.value, false);
+      return;
+    }
+
     // During CJK composition, skip — wait for compositionend.
     if (isComposing) return;
 
@@ -288,7 +818,7 @@
 
       // Special check for mobile delete without keydown
       if (e.inputType === "deleteContentBackward" && textInput.value.length === 0) {
-        socket.emit("key_command", { key: "backspace" });
+        queueEdit({ op: "delete", dir: "back", n: 1 });
         // Optimistic delete
         var b = textBefore.textContent;
         if (b.length > 0) textBefore.textContent = b.slice(0, -1);
@@ -370,22 +900,33 @@
     }
 
     if (range && range.startContainer.nodeType === Node.TEXT_NODE) {
-      var offset = range.startOffset;
       var text = range.startContainer.textContent;
+      var offset = range.startOffset;
+      // startOffset counts UTF-16 units: never split a surrogate pair
+      var unit = text.charCodeAt(offset - 1);
+      if (offset > 0 && offset < text.length && unit >= 0xD800 && unit <= 0xDBFF) offset += 1;
 
+      // The server places the caret directly at this offset from the
+      // current one (one UIA call), so long jumps cost the same as short ones.
+      // It counts characters as code points, like the context it sends.
       if (isBefore) {
         // Clicked in "Before" text: move left
-        // Distance = (total length of before) - (clicked position)
-        var steps = text.length - offset;
+        // Distance = characters from the clicked position to the end
+        var steps = codePoints(text.slice(offset)).length;
         if (steps > 0) {
-          socket.emit("move_cursor", { direction: "left", steps: steps });
+          queueEdit({ op: "move", dir: "left", n: steps });
+          // Optimistic: show the caret at the clicked spot right away
+          textAfter.textContent = text.slice(offset) + textAfter.textContent;
+          textBefore.textContent = text.slice(0, offset);
         }
       } else {
         // Clicked in "After" text: move right
-        // Distance = (clicked position)
-        var steps = offset;
-        if (steps >= 0) {
-          socket.emit("move_cursor", { direction: "right", steps: steps });
+        // Distance = characters before the clicked position
+        var steps = codePoints(text.slice(0, offset)).length;
+        if (steps > 0) {
+          queueEdit({ op: "move", dir: "right", n: steps });
+          textBefore.textContent = textBefore.textContent + text.slice(0, offset);
+          textAfter.textContent = text.slice(offset);
         }
       }
 
@@ -402,6 +943,7 @@
   /* ── Auto-sync timer ───────────────────────────────────── */
 
   setInterval(function () {
+    if (pushMode) return;
     if (socket.connected && modeSelect.value === "stream" && !isComposing && document.activeElement !== textInput) {
       // Only auto-sync if we are NOT typing to avoid jumping
       socket.emit("request_context");
@@ -414,11 +956,10 @@
 
   socket.connect();
 
-  if ("serviceWorker" in navigator) {
-    navigator.serviceWorker.getRegistrations().then(function (regs) {
-      regs.forEach(function (reg) {
-        reg.unregister();
-      });
+  // Caches the content-hashed shell so cold opens don't wait on Wi-Fi
+  if ("serviceWorker" in navigator && window.isSecureContext) {
+    navigator.serviceWorker.register("/sw.js").catch(function (err) {
+      console.warn("[sw] registration failed", err);
     });
   }
 })();
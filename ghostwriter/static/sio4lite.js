@@ -1,5 +1,9 @@
 // Minimal Engine.IO v4 + Socket.IO v4 client (WebSocket transport only).
 // Supports: connect, disconnect, reconnect, emit(event, data), on(event, handler).
+// emit() sends ArrayBuffers / typed arrays (as `data` or one of its top-level
+// fields) as binary attachments, e.g. the output of Sio4Lite.encodeEditOps.
+// opts.auth (an object, or a function returning one) is sent with every
+// CONNECT, including reconnects, e.g. a session token to resume.
 //
 // Engine.IO v4 packet types (first character of WebSocket frame):
 //   0 = open        – server sends JSON with sid, pingInterval, pingTimeout
@@ -11,6 +15,7 @@
 // Socket.IO v4 packet types (after the leading "4"):
 //   0 = CONNECT     – "40" or "40{...}"
 //   2 = EVENT       – "42[event, data]"
+//   5 = BINARY_EVENT – "45<n>-[event, {_placeholder, num}]" + n binary frames
 
 (function (global) {
   "use strict";
@@ -75,6 +80,8 @@
       return;
     }
 
+    this.ws.binaryType = "arraybuffer";
+
     this.ws.onopen = function () {
       // WebSocket transport is open. Wait for Engine.IO "open" (type 0).
     };
@@ -94,7 +101,8 @@
           if (openPayload.pingTimeout) self._pingTimeout = openPayload.pingTimeout;
         } catch (_) {}
         // Send Socket.IO CONNECT packet: Engine.IO message + SIO connect = "40"
-        self.ws.send("40");
+        var auth = typeof self.opts.auth === "function" ? self.opts.auth() : self.opts.auth;
+        self.ws.send(auth ? "40" + JSON.stringify(auth) : "40");
         self._resetHeartbeat();
         return;
       }
@@ -205,8 +213,43 @@
 
   /* ── Send event to server ──────────────────────────────── */
 
+  function isBinary(value) {
+    return typeof ArrayBuffer !== "undefined" &&
+      (value instanceof ArrayBuffer || ArrayBuffer.isView(value));
+  }
+
+  // Replace binary values (top level only) with Socket.IO placeholders
+  function extractBinary(data, attachments) {
+    if (isBinary(data)) {
+      attachments.push(data);
+      return { _placeholder: true, num: 0 };
+    }
+    if (!data || typeof data !== "object" || Array.isArray(data)) return data;
+    var out = {};
+    for (var key in data) {
+      if (!Object.prototype.hasOwnProperty.call(data, key)) continue;
+      if (isBinary(data[key])) {
+        out[key] = { _placeholder: true, num: attachments.length };
+        attachments.push(data[key]);
+      } else {
+        out[key] = data[key];
+      }
+    }
+    return out;
+  }
+
   Sio4Lite.prototype.emit = function (event, data) {
     if (!this.ws || !this.connected) return;
+    var attachments = [];
+    var packetData = extractBinary(data, attachments);
+    if (attachments.length) {
+      // Binary event: the placeholder packet, then one binary frame each
+      this.ws.send("45" + attachments.length + "-" + JSON.stringify([event, packetData]));
+      for (var i = 0; i < attachments.length; i++) {
+        this.ws.send(attachments[i]);
+      }
+      return;
+    }
     // Correct packet format:
     //   Engine.IO message prefix: "4"
     //   Socket.IO EVENT type:     "2"
@@ -216,6 +259,57 @@
     this.ws.send(frame);
   };
 
+  /* ── Compact edit-op encoding (mirrors edit_ops.py) ────── */
+
+  var INSERT_MODES = ["stream", "batch", "replace"];
+  var MOVE_DIRS = ["left", "right", "up", "down", "home", "end"];
+
+  function utf8Bytes(text) {
+    if (typeof TextEncoder !== "undefined") return new TextEncoder().encode(text);
+    var bin = unescape(encodeURIComponent(text));
+    var out = new Uint8Array(bin.length);
+    for (var i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+    return out;
+  }
+
+  // ops: [{op: "insert", text, mode} | {op: "delete", n, dir} |
+  //       {op: "move", dir, n} | {op: "key", keys: ["ctrl", "a"]}]
+  Sio4Lite.encodeEditOps = function (seq, ops) {
+    var bytes = [1];
+
+    function varint(n) {
+      while (n > 0x7f) {
+        bytes.push((n % 128) | 0x80);
+        n = Math.floor(n / 128);
+      }
+      bytes.push(n);
+    }
+
+    varint(seq);
+    for (var i = 0; i < ops.length; i++) {
+      var op = ops[i];
+      if (op.op === "insert") {
+        var raw = utf8Bytes(op.text);
+        bytes.push(0x01 + Math.max(0, INSERT_MODES.indexOf(op.mode || "stream")));
+        varint(raw.length);
+        for (var j = 0; j < raw.length; j++) bytes.push(raw[j]);
+      } else if (op.op === "delete") {
+        bytes.push(op.dir === "forward" ? 0x11 : 0x10);
+        varint(op.n || 1);
+      } else if (op.op === "move") {
+        bytes.push(0x20 + MOVE_DIRS.indexOf(op.dir));
+        varint(op.n || 1);
+      } else if (op.op === "key") {
+        bytes.push(0x30, op.keys.length);
+        for (var k = 0; k < op.keys.length; k++) {
+          bytes.push(op.keys[k].length);
+          for (var c = 0; c < op.keys[k].length; c++) bytes.push(op.keys[k].charCodeAt(c));
+        }
+      }
+    }
+    return new Uint8Array(bytes).buffer;
+  };
+
   /* ── Graceful disconnect ───────────────────────────────── */
 
   Sio4Lite.prototype.disconnect = function () {
@@ -0,0 +1,75 @@
+/* GhostWriter service worker: keeps the app shell for offline / slow opens.
+ *
+ * assets.py fills in VERSION and ASSETS (the content-hashed URLs) when the
+ * server starts, so a new build installs a new cache and drops the old one.
+ */
+(function () {
+  "use strict";
+
+  var VERSION = "__VERSION__";
+  var ASSETS = __ASSETS__;
+  var PREFIX = "ghostwriter-";
+  var CACHE = PREFIX + VERSION;
+
+  self.addEventListener("install", function (event) {
+    event.waitUntil(
+      caches.open(CACHE).then(function (cache) {
+        return cache.addAll(["/"].concat(ASSETS));
+      }).then(function () {
+        return self.skipWaiting();
+      })
+    );
+  });
+
+  self.addEventListener("activate", function (event) {
+    event.waitUntil(
+      caches.keys().then(function (keys) {
+        return Promise.all(keys.filter(function (key) {
+          return key.indexOf(PREFIX) === 0 && key !== CACHE;
+        }).map(function (key) {
+          return caches.delete(key);
+        }));
+      }).then(function () {
+        return self.clients.claim();
+      })
+    );
+  });
+
+  function remember(request, response) {
+    if (response && response.ok) {
+      var copy = response.clone();
+      caches.open(CACHE).then(function (cache) { cache.put(request, copy); });
+    }
+    return response;
+  }
+
+  self.addEventListener("fetch", function (event) {
+    var request = event.request;
+    if (request.method !== "GET") return;
+    var url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (url.pathname.indexOf("/assets/") === 0) {
+      // Hashed names never change content: cache first
+      event.respondWith(
+        caches.match(request).then(function (hit) {
+          return hit || fetch(request).then(function (response) { return remember(request, response); });
+        })
+      );
+      return;
+    }
+
+    if (request.mode === "navigate") {
+      // Network first, so the page always matches the running server;
+      // the cached shell is only used when the PC can't be reached.
+      event.respondWith(
+        fetch(request).then(function (response) {
+          return remember("/", response);
+        }).catch(function () {
+          return caches.match("/");
+        })
+      );
+    }
+    // Everything else (socket.io, /metrics, ...) goes straight to the network
+  });
+})();
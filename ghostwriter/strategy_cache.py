@@ -0,0 +1,122 @@
+"""Per-application context strategy cache for GhostWriter.
+
+get_cursor_context can read the caret context several ways (UIA
+TextPattern/ValuePattern, Ctrl+C of the selection).  Probing all of them on
+every poll is expensive: the UIA probe walks parents and patterns, and the
+clipboard probe fires a real Ctrl+C and waits for the clipboard, even in
+apps (e.g. WeChat) where it never works.  `StrategyCache` remembers, per
+(process, focused window class), which strategy last worked and which ones
+failed recently, so a grab goes straight to the working strategy and skips
+known failures.
+
+Failures back off: a failed strategy is skipped for `base_ttl` seconds,
+doubling on each further failure up to `max_ttl`, and a success resets it.
+When focus moves to a different element (its UIA runtime id, not just its
+window: Chrome, Electron, WPF and UWP keep one window for all their
+controls) the skip deadlines of the newly focused app are cleared, so a
+fresh control gets one real probe.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+AppKey = Tuple[str, str]
+
+
+@dataclass
+class _Entry:
+    preferred: Optional[str] = None
+    # strategy -> (consecutive failures, skip until [monotonic])
+    failed: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+    hits: int = 0
+    skips: int = 0
+
+
+class StrategyCache:
+    """Which context strategies to try for an app, in which order."""
+
+    def __init__(self, base_ttl: float = 5.0, max_ttl: float = 120.0) -> None:
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[AppKey, _Entry] = {}
+        self._focus: Optional[Hashable] = None
+
+    def _entry(self, key: AppKey) -> _Entry:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        return entry
+
+    def focus(self, key: AppKey, focus_id: Hashable) -> bool:
+        """Note the focused element; returns True (and re-arms probes) if it changed."""
+        with self._lock:
+            if focus_id == self._focus:
+                return False
+            self._focus = focus_id
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Keep the failure counts so a repeat failure backs off further
+                entry.failed = {s: (count, 0.0) for s, (count, _) in entry.failed.items()}
+            return True
+
+    def plan(self, key: AppKey, strategies: Sequence[str]) -> List[str]:
+        """`strategies` in the order to try: the last one that worked first,
+        minus those still inside their failure back-off."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry(key)
+            order = list(strategies)
+            if entry.preferred in order:
+                order.remove(entry.preferred)
+                order.insert(0, entry.preferred)
+            planned = [s for s in order if entry.failed.get(s, (0, 0.0))[1] <= now]
+            entry.skips += len(order) - len(planned)
+            return planned
+
+    def success(self, key: AppKey, strategy: str) -> None:
+        with self._lock:
+            entry = self._entry(key)
+            entry.preferred = strategy
+            entry.failed.pop(strategy, None)
+            entry.hits += 1
+
+    def failure(self, key: AppKey, strategy: str) -> None:
+        with self._lock:
+            entry = self._entry(key)
+            count = entry.failed.get(strategy, (0, 0.0))[0] + 1
+            ttl = min(self.base_ttl * 2 ** (count - 1), self.max_ttl)
+            entry.failed[strategy] = (count, time.monotonic() + ttl)
+            if entry.preferred == strategy:
+                entry.preferred = None
+
+    def invalidate(self, key: Optional[AppKey] = None) -> None:
+        """Forget one app (or everything)."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._focus = None
+            else:
+                self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{process}/{cls}": {
+                    "preferred": entry.preferred,
+                    "skipping": {
+                        s: round(until - now, 1) for s, (_, until) in entry.failed.items() if until > now
+                    },
+                    "hits": entry.hits,
+                    "skips": entry.skips,
+                }
+                for (process, cls), entry in self._entries.items()
+            }
+
+
+strategies = StrategyCache()
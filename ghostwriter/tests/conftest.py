@@ -0,0 +1,59 @@
+"""Shared fixtures for the GhostWriter tests.
+
+The modules are imported the way server.py runs them (from the ghostwriter
+directory), with the fakes from fakes.py standing in for the desktop.
+
+Usage (from the ghostwriter directory):
+    python -m pytest -q tests
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from typing import Callable
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("INJECT_BACKEND", "recording")
+# The fakes are installed in this process, so keep desktop calls here
+os.environ["DESKTOP_WORKER"] = "0"
+
+import timing  # noqa: E402
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """timing.wait_until with the deadline the tests use unless they say otherwise."""
+    return timing.wait_until(predicate, timeout, interval=0.01)
+
+
+@pytest.fixture
+def doc():
+    """A FakeDocument typed into by the server's injector."""
+    import injector
+    from fakes import FakeDocument, RecordingBackend
+
+    document = FakeDocument()
+    injector.set_backend(RecordingBackend(document))
+    return document
+
+
+@pytest.fixture
+def server(doc):
+    import server as module
+    from fakes import FakeContextProvider
+
+    module.set_context_provider(FakeContextProvider(doc))
+    yield module
+    module.set_context_provider(None)
+
+
+@pytest.fixture
+def client(server):
+    """A Socket.IO test client connected to the real server app."""
+    test_client = server.socketio.test_client(server.app)
+    yield test_client
+    if test_client.is_connected():
+        test_client.disconnect()
@@ -0,0 +1,130 @@
+"""AssetPipeline: fingerprinted names, rewritten entry points, caching headers."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+
+import pytest
+
+import assets
+from assets import IMMUTABLE, REVALIDATE, AssetPipeline
+
+APP_JS = "console.log('GhostWriter');\n" * 40
+INDEX = """<!doctype html>
+<link rel="manifest" href="/manifest.json" />
+<link rel="stylesheet" href="/style.css?v=2" />
+<a href="https://example.com/">out</a>
+<script src="/missing.js"></script>
+<script src="/app.js"></script>
+"""
+MANIFEST = {"name": "GhostWriter", "icons": [{"src": "/icons/icon.svg"}, {"src": "/elsewhere.png"}]}
+SW = 'var VERSION = "__VERSION__";\nvar ASSETS = __ASSETS__;\n'
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[: assets.HASH_CHARS]
+
+
+@pytest.fixture
+def static(tmp_path):
+    (tmp_path / "icons").mkdir()
+    (tmp_path / "icons" / "icon.svg").write_text("<svg/>")
+    (tmp_path / "app.js").write_text(APP_JS)
+    (tmp_path / "style.css").write_text("body{}")
+    (tmp_path / "index.html").write_text(INDEX)
+    (tmp_path / "manifest.json").write_text(json.dumps(MANIFEST))
+    (tmp_path / "sw.js").write_text(SW)
+    return tmp_path
+
+
+@pytest.fixture
+def pipeline(static):
+    return AssetPipeline(str(static)).build()
+
+
+def body(response) -> bytes:
+    return response.get_data()
+
+
+def test_files_are_named_by_content_hash(static, pipeline):
+    assert pipeline.urls["/app.js"] == f"/assets/app.{digest(APP_JS.encode())}.js"
+    assert pipeline.urls["/icons/icon.svg"] == f"/assets/icons/icon.{digest(b'<svg/>')}.svg"
+    assert "/index.html" not in pipeline.urls and "/sw.js" not in pipeline.urls
+
+    old_url, old_version = pipeline.urls["/app.js"], pipeline.version
+    (static / "app.js").write_text(APP_JS + "// changed\n")
+    pipeline.build()
+    assert pipeline.urls["/app.js"] != old_url and pipeline.version != old_version
+    assert pipeline.get(old_url) is None
+
+
+def test_entry_points_point_at_the_hashed_names(pipeline):
+    html = body(pipeline.response("/")).decode()
+    assert f'src="{pipeline.urls["/app.js"]}"' in html
+    assert f'href="{pipeline.urls["/style.css"]}"' in html
+    assert f'href="{pipeline.urls["/manifest.json"]}"' in html
+    # Nothing to point at: left as written
+    assert 'src="/missing.js"' in html and 'href="https://example.com/"' in html
+
+    manifest = json.loads(body(pipeline.response(pipeline.urls["/manifest.json"])))
+    assert [icon["src"] for icon in manifest["icons"]] == [pipeline.urls["/icons/icon.svg"], "/elsewhere.png"]
+
+    sw = body(pipeline.response("/sw.js")).decode()
+    assert f'VERSION = "{pipeline.version}"' in sw
+    assert f"ASSETS = {json.dumps(pipeline.shell)}" in sw
+
+
+def test_cache_control_and_conditional_requests(pipeline):
+    url = pipeline.urls["/style.css"]
+    first = pipeline.response(url)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == IMMUTABLE
+    assert pipeline.response("/").headers["Cache-Control"] == REVALIDATE
+    assert pipeline.response("/sw.js").headers["Cache-Control"] == REVALIDATE
+
+    etag = first.headers["ETag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        again = pipeline.response(url, if_none_match=header)
+        assert again.status_code == 304 and body(again) == b""
+        assert again.headers["ETag"] == etag
+    assert pipeline.response(url, if_none_match='"other"').status_code == 200
+    assert pipeline.response("/nope.js") is None
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("deflate", None),
+    ("", None),
+])
+def test_accept_encoding_picks_the_body(pipeline, header, encoding):
+    url = pipeline.urls["/app.js"]
+    response = pipeline.response(url, accept_encoding=header)
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers.get("Content-Encoding") == encoding
+    data = body(response)
+    assert (gzip.decompress(data) if encoding else data) == APP_JS.encode()
+    if encoding:
+        # Each encoding has its own ETag, so a 304 never swaps bodies
+        assert response.headers["ETag"] != pipeline.response(url).headers["ETag"]
+        assert pipeline.response(url, header, response.headers["ETag"]).status_code == 304
+
+
+def test_small_files_are_not_compressed(pipeline):
+    response = pipeline.response(pipeline.urls["/style.css"], accept_encoding="gzip")
+    assert "Content-Encoding" not in response.headers
+
+
+def test_server_serves_the_pipeline(server):
+    web = server.app.test_client()
+    index = web.get("/")
+    assert index.headers["Cache-Control"] == REVALIDATE
+    url = server.assets.urls["/app.js"]
+    assert url in index.get_data(as_text=True)
+    script = web.get(url, headers={"Accept-Encoding": "gzip"})
+    assert script.status_code == 200 and script.headers["Cache-Control"] == IMMUTABLE
+    assert script.headers["Content-Encoding"] == "gzip"
+    assert web.get(url, headers={"If-None-Match": script.headers["ETag"], "Accept-Encoding": "gzip"}).status_code == 304
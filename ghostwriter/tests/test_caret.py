@@ -0,0 +1,113 @@
+"""Caret placement: TextRange moves, the UIA worker path and its fallback."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+import context_grabber
+import injector
+from conftest import wait_until
+from context_grabber import WindowsUIABackend
+from fakes import FakeDocument, FakeTextPattern, FakeUIABackend, RecordingBackend
+from uia_worker import UIATarget, UIAWorker
+
+TEXT = ("GhostWriter 測試 caret line.\n" * 40)[:1000]
+
+
+def target(doc: FakeDocument) -> UIATarget:
+    return UIATarget(doc, FakeTextPattern(doc), "text", "test")
+
+
+@pytest.mark.parametrize("offset", [1, 10, 100, -1, -10, -100, 2_000, -2_000])
+def test_text_range_move_matches_arrow_keys(offset):
+    start = len(TEXT) // 2
+    arrows = FakeDocument(text=TEXT, caret=start)
+    RecordingBackend(arrows).press("left" if offset < 0 else "right", presses=abs(offset))
+    ranged = FakeDocument(text=TEXT, caret=start)
+    WindowsUIABackend().place_caret(target(ranged), offset)
+    # Both clamp at the document edges
+    assert ranged.caret == arrows.caret == min(max(start + offset, 0), len(TEXT))
+
+
+@pytest.mark.parametrize("offset", [-3, 3, 0])
+def test_from_a_selection_the_caret_lands_where_the_preview_points(offset):
+    # before ends at the selection start, after begins at its end
+    doc = FakeDocument(text=TEXT, caret=100, selection_end=110)
+    WindowsUIABackend().place_caret(target(doc), offset)
+    expected = 100 + offset if offset < 0 else 110 + offset
+    assert (doc.caret, doc.selection_end) == (expected, None)
+
+
+def test_worker_path_reports_the_distance_moved():
+    doc = FakeDocument(text=TEXT, caret=100, selection_end=110)
+    worker = UIAWorker(FakeUIABackend(doc))
+    try:
+        assert worker.place_caret(-7) == -7 and doc.caret == 93
+        assert worker.place_caret(12) == 12 and doc.caret == 105
+        assert worker.place_caret(-10_000) == -105 and doc.caret == 0
+    finally:
+        worker.stop()
+
+
+class GatedUIABackend(FakeUIABackend):
+    """place_caret blocks until `gate` is set, like a busy target app."""
+
+    def __init__(self, document: FakeDocument) -> None:
+        super().__init__(document)
+        self.gate = threading.Event()
+        self.started = threading.Event()
+
+    def place_caret(self, target, offset):
+        self.started.set()
+        self.gate.wait(5.0)
+        return super().place_caret(target, offset)
+
+
+@pytest.fixture
+def slow_uia(monkeypatch):
+    doc = FakeDocument(text=TEXT, caret=500)
+    backend = GatedUIABackend(doc)
+    worker = UIAWorker(backend)
+    monkeypatch.setattr(context_grabber, "get_uia_worker", lambda: worker)
+    injector.set_backend(RecordingBackend(doc))
+    yield doc, backend, worker
+    backend.gate.set()
+    worker.stop()
+
+
+def test_started_uia_move_gets_no_arrow_fallback(slow_uia):
+    doc, backend, worker = slow_uia
+    result = context_grabber.place_caret(-5, timeout=0.1)
+    assert not result["ok"] and result["code"] == "CARET_BUSY"
+    assert doc.caret == 500
+
+    # The UIA move lands late, once; no arrow keys were pressed
+    backend.gate.set()
+    worker.call(lambda: None, timeout=2.0)
+    assert doc.caret == 495
+    assert injector.get_backend().calls == []
+
+
+def test_queued_uia_move_is_cancelled_before_falling_back(slow_uia):
+    doc, backend, worker = slow_uia
+    # Keep the UIA thread busy so the caret job is still queued at its deadline
+    blocker = threading.Event()
+    worker.submit(blocker.wait, 5.0)
+    result = context_grabber.place_caret(-5, timeout=0.1)
+    assert result["ok"] and result["mode"] == "keys"
+    assert doc.caret == 495
+
+    blocker.set()
+    worker.call(lambda: None, timeout=2.0)
+    assert not backend.started.is_set()
+    assert doc.caret == 495
+
+
+def test_preview_click_distance_counts_code_points(client, doc):
+    # app.js sends the code points between the click and the caret: the
+    # emoji is one step, though the preview's DOM offsets count it as two
+    doc.text, doc.caret = "ab😀cd", 5
+    client.emit("edit_ops", {"seq": 1, "ops": [{"op": "move", "dir": "left", "n": 3}, {"op": "insert", "text": "|"}]})
+    assert wait_until(lambda: doc.text == "ab|😀cd")
@@ -0,0 +1,142 @@
+"""Chunked injection: chunk cuts, EWMA sizing, progress and cancel."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+import injector
+from conftest import wait_until
+from injector import ChunkPlanner, _chunk_end, inject_stream
+
+
+@pytest.mark.parametrize("text, start, size, end", [
+    ("hello world again", 0, 100, 17),      # the rest fits
+    ("hello world again", 0, 14, 12),       # after the last space in the second half
+    ("hello world", 0, 4, 4),               # no space in the second half: hard cut
+    ("ab\r\ncd", 0, 3, 4),                  # never between CR and LF
+    ("ab\r\ncdef", 0, 6, 4),                # a whitespace cut goes after the LF
+    ("one two three", 4, 6, 8),             # counted from `start`
+])
+def test_chunk_end(text, start, size, end):
+    assert _chunk_end(text, start, size) == end
+
+
+def test_planner_sizes_chunks_from_an_ewma_of_the_rate():
+    planner = ChunkPlanner(target=0.1, min_chars=16, max_chars=400, initial_rate=200.0)
+    assert planner.size("notepad.exe") == 20
+    planner.observe("notepad.exe", 100, 0.1)   # 1000 chars/s
+    assert planner.size("notepad.exe") == 100
+    planner.observe("notepad.exe", 50, 0.1)    # 500 chars/s: 0.7 * 1000 + 0.3 * 500
+    assert planner.snapshot() == {"notepad.exe": 850.0}
+    assert planner.size("notepad.exe") == 85
+    # Each app has its own rate; sizes stay inside the bounds
+    planner.observe("slow.exe", 1, 1.0)
+    assert planner.size("slow.exe") == 16
+    planner.observe("fast.exe", 10_000, 0.001)
+    assert planner.size("fast.exe") == 400
+    planner.observe("notepad.exe", 0, 0.0)
+    assert planner.snapshot()["notepad.exe"] == 850.0
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    fixed = ChunkPlanner(target=1.0, min_chars=10, max_chars=10)
+    monkeypatch.setattr(injector, "chunk_planner", fixed)
+    return fixed
+
+
+def test_stream_reports_progress_per_chunk(planner):
+    typed, progress = [], []
+
+    def inject(chunk, app):
+        typed.append(chunk)
+        return {"ok": True, "mode": "unicode"}
+
+    text = "word " * 9
+    result = inject_stream(text, app="notepad.exe", on_chunk=lambda d, t, r: progress.append((d, t)), inject=inject)
+    assert result == {"ok": True, "mode": "unicode", "text": text, "chunks": 5, "cancelled": False}
+    assert "".join(typed) == text and all(len(chunk) <= 10 for chunk in typed)
+    assert progress == [(10, 45), (20, 45), (30, 45), (40, 45), (45, 45)]
+    assert "notepad.exe" in planner.snapshot()
+
+
+def test_stream_stops_on_cancel_or_failure(planner):
+    calls = []
+
+    def inject(chunk, app):
+        calls.append(chunk)
+        if len(calls) == 3:
+            return {"ok": False, "code": "INJECT_ERR", "message": "注入失敗"}
+        return {"ok": True, "mode": "unicode"}
+
+    text = "x" * 50
+    result = inject_stream(text, inject=inject, cancelled=lambda: len(calls) >= 2)
+    assert (result["text"], result["cancelled"], result["chunks"]) == ("x" * 20, True, 2)
+
+    calls.clear()
+    result = inject_stream(text, inject=inject)
+    # What was typed before the failure is reported, not the whole text
+    assert (result["ok"], result["code"], result["text"], result["chunks"]) == (False, "INJECT_ERR", "x" * 20, 2)
+
+
+def progress_events(client):
+    return [m["args"][0] for m in client.get_received() if m["name"] == "inject_progress"]
+
+
+@pytest.fixture
+def gated(monkeypatch, server):
+    """desktop.inject_text that blocks on its first call until `go` is set."""
+    calls = []
+    started, go = threading.Event(), threading.Event()
+    inject = server.desktop.inject_text
+
+    def inject_text(text, app=""):
+        calls.append(text)
+        if len(calls) == 1:
+            started.set()
+            assert go.wait(5.0)
+        return inject(text, app)
+
+    monkeypatch.setattr(server.desktop, "inject_text", inject_text)
+    return calls, started, go
+
+
+def test_long_insert_is_chunked_and_can_be_cancelled(server, client, doc, planner, gated):
+    calls, started, go = gated
+    text = "a" * (server.INJECT_CHUNK_MIN + 100)
+    client.emit("text_input", {"text": text})
+    assert started.wait(5.0)
+    (first,) = progress_events(client)
+    assert (first["done"], first["total"]) == (0, len(text))
+
+    client.emit("cancel_inject", {"id": first["id"] + 1})  # someone else's job
+    client.emit("cancel_inject", {"id": first["id"]})
+    go.set()
+    received = []
+
+    def finished():
+        received.extend(progress_events(client))
+        return any(p.get("finished") for p in received)
+
+    assert wait_until(finished)
+    assert received[-1]["cancelled"] and received[-1]["done"] == 10
+    assert doc.text == "a" * 10 and len(calls) == 1
+    assert server.injections == {}
+
+
+def test_typing_merged_in_the_queue_is_not_chunked(server, client, doc, planner, gated):
+    calls, started, go = gated
+    client.emit("text_input", {"text": "x"})
+    assert started.wait(5.0)
+    words = ["word%02d " % i for i in range(server.INJECT_CHUNK_MIN // 7 + 1)]
+    for word in words:
+        client.emit("text_input", {"text": word})
+    go.set()
+    assert wait_until(lambda: doc.text == "x" + "".join(words))
+    # One write for everything that queued up, no progress bar
+    assert calls == ["x", "".join(words)]
+    assert progress_events(client) == []
+    # The grab after "x" waits for it to show; let it finish here
+    assert wait_until(lambda: not server.context_scheduler.stats()["running"])
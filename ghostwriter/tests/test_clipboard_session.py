@@ -0,0 +1,95 @@
+"""ClipboardSession ownership and restore (clipboard_session.py)."""
+
+from __future__ import annotations
+
+import pytest
+
+from conftest import wait_until
+from clipboard_session import ClipboardBackend, ClipboardSession, WindowsClipboardBackend
+from fakes import FakeClipboard
+
+
+@pytest.fixture
+def board():
+    return FakeClipboard(formats={49161: b"user image"}, text="original")
+
+
+@pytest.fixture
+def session(board):
+    clipboard = ClipboardSession(board, idle_timeout=60)
+    yield clipboard
+    clipboard.flush()
+
+
+def paste(session, text):
+    with session.hold() as clipboard:
+        clipboard.set_text(text)
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ClipboardBackend()
+
+
+def test_burst_saves_and_restores_once(session, board):
+    for text in ("one", "two", "three"):
+        paste(session, text)
+    session.flush()
+    assert (board.text, board.formats) == ("original", {49161: b"user image"})
+    stats = session.stats()
+    assert (stats["holds"], stats["saves"], stats["restores"]) == (3, 1, 1)
+
+
+def test_user_copy_after_the_last_hold_is_kept(session, board):
+    paste(session, "ours")
+    board.set_text("user copy")
+    session.flush()
+    assert board.text == "user copy"
+    assert session.stats()["skipped_restores"] == 1
+
+
+def test_user_copy_between_holds_is_saved_again(session, board):
+    paste(session, "ours")
+    board.set_text("user copy")
+    paste(session, "ours again")
+    assert board.text == "ours again"
+    session.flush()
+    # Not the pre-session contents: the copy made in between comes back
+    assert board.text == "user copy"
+    stats = session.stats()
+    assert (stats["saves"], stats["restores"], stats["skipped_restores"]) == (2, 1, 1)
+
+
+def test_text_only_backend_detects_user_copy(session, board):
+    board.sequence = lambda: None
+    paste(session, "ours")
+    board.set_text("user copy")
+    paste(session, "ours again")
+    session.flush()
+    assert board.text == "user copy"
+
+
+def test_idle_timeout_restores(board):
+    clipboard = ClipboardSession(board, idle_timeout=0.05)
+    paste(clipboard, "ours")
+    assert wait_until(lambda: board.text == "original")
+    assert clipboard.stats()["owned"] is False
+
+
+@pytest.mark.parametrize("fmt, copied", [
+    (1, True),        # CF_TEXT
+    (8, True),        # CF_DIB (CF_BITMAP is synthesized from it)
+    (13, True),       # CF_UNICODETEXT
+    (14, True),       # CF_ENHMETAFILE, copied as its bits
+    (0xC0F0, True),   # a registered format ("HTML Format", ...)
+    (2, False),       # CF_BITMAP
+    (3, False),       # CF_METAFILEPICT, synthesized from CF_ENHMETAFILE
+    (0x0200, False),  # CF_PRIVATEFIRST
+    (0x02FF, False),
+    (0x0300, False),  # CF_GDIOBJFIRST
+    (0x03FF, False),
+])
+def test_windows_snapshot_skips_handle_formats(fmt, copied):
+    # _copyable needs no Win32 state
+    backend = WindowsClipboardBackend.__new__(WindowsClipboardBackend)
+    assert backend._copyable(fmt) is copied
@@ -0,0 +1,134 @@
+"""Context push: synthetic focus/caret events through ScriptedEventSource."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from conftest import wait_until
+from context_events import ContextEventSource, EventThrottle
+from fakes import FakeDocument, ScriptedEventSource
+
+
+def test_event_source_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ContextEventSource()
+
+
+def test_throttle_collapses_a_burst():
+    fired = []
+    done = threading.Event()
+
+    def callback(kinds):
+        fired.append(kinds)
+        done.set()
+
+    throttle = EventThrottle(callback, interval=0.1)
+    source = ScriptedEventSource([(0, "selection")] + [(0.001, "text")] * 20 + [(0.001, "focus")])
+    source.start(throttle)
+    assert source.done.wait(2.0)
+    assert wait_until(lambda: len(fired) == 2)
+    # The first event fires at once, the rest of the burst as one trailing call
+    assert fired == [{"selection"}, {"text", "focus"}]
+    assert (throttle.received, throttle.fired) == (22, 2)
+
+
+@pytest.fixture
+def push(server):
+    sources = []
+
+    def start(script):
+        source = ScriptedEventSource(script)
+        sources.append(source)
+        assert server.start_context_push(source)
+        return source
+
+    yield start
+    for source in sources:
+        source.stop()
+    server.push_mode = False
+
+
+def contexts(client):
+    return [m["args"][0] for m in client.get_received() if m["name"] == "context_update"]
+
+
+def test_caret_events_keep_the_shadow_copy(server, client, doc, push):
+    doc.text, doc.caret = "hello", 5
+    client.emit("request_context")
+    assert wait_until(lambda: server.shadow.stats()["target"] is not None)
+    client.emit("text_input", {"text": " world"})
+    assert wait_until(lambda: doc.text == "hello world")
+    invalidations = server.shadow.stats()["invalidations"]
+    pages = server.context_pages.version
+
+    source = push([(0, "text"), (0.01, "selection")])
+    assert source.done.wait(2.0)
+    assert wait_until(lambda: server.context_scheduler.stats()["running"] is False and server.shadow.stats()["dirty"] is False)
+    # Our own typing fires text/caret events; a grab reconciles, nothing is thrown away
+    assert server.shadow.stats()["invalidations"] == invalidations
+    assert server.shadow.stats()["target"] is not None
+    assert server.context_pages.version == pages
+
+
+def test_focus_event_invalidates_the_old_target(server, client, doc, push):
+    doc.text, doc.caret = "first field", 11
+    client.emit("request_context")
+    assert wait_until(lambda: server.shadow.stats()["target"] == "FakeEdit/1")
+    contexts(client)
+    invalidations = server.shadow.stats()["invalidations"]
+    pages = server.context_pages.version
+    grabs = server.context_scheduler.stats()["grabs"]
+
+    other = FakeDocument(text="second field", caret=6, name="Other", runtime_id=2)
+
+    def switch_focus():
+        server._context_provider.document = other
+
+    source = push([(0, "focus", switch_focus)])
+    assert source.done.wait(2.0)
+    assert wait_until(lambda: server.context_scheduler.stats()["grabs"] > grabs)
+    assert server.context_pages.version > pages
+    assert wait_until(lambda: server.shadow.stats()["target"] == "FakeEdit/2")
+    assert server.shadow.stats()["invalidations"] == invalidations + 1
+    assert wait_until(lambda: any("second" in str(message) for message in contexts(client)))
+
+
+def test_focus_event_closes_an_open_utterance(server, client, doc, push):
+    client.emit("dictation", {"u": "u1", "text": "ice"})
+    assert wait_until(lambda: doc.text == "ice")
+    assert server.dictation.stats()["open"] == "u1"
+
+    source = push([(0, "focus")])
+    assert source.done.wait(2.0)
+    assert wait_until(lambda: server.dictation.stats()["open"] is None)
+    client.emit("dictation", {"u": "u1", "text": "ice cream"})
+    assert wait_until(lambda: any(
+        m["name"] == "error" and m["args"][0].get("code") == "DICTATION_CLOSED" for m in client.get_received()
+    ))
+    assert doc.text == "ice"
+
+
+def test_text_events_during_our_own_edits_are_ignored(monkeypatch, server, client, doc):
+    doc.text, doc.caret = "hello", 5
+    client.emit("request_context")
+    assert wait_until(lambda: server.shadow.stats()["target"] == "FakeEdit/1")
+    client.emit("text_input", {"text": " world"})
+    assert wait_until(lambda: server.shadow.pending() is not None)
+
+    requested = []
+    request = server.context_scheduler.request
+    monkeypatch.setattr(server.context_scheduler, "request", lambda *a, **kw: requested.append(kw) if "supersede" in kw else request(*a, **kw))
+    # The echo of " world" is already in the shadow: no grab for it
+    server._on_target_changed({"text", "selection"})
+    assert requested == []
+    # Focus moving elsewhere always counts
+    server._on_target_changed({"focus", "text"})
+    assert requested == [{"supersede": True}]
+
+    monkeypatch.setattr(server.context_scheduler, "request", request)
+    server.shadow.reconcile({"supported": True, "target": "FakeEdit/1", "before": "hello world"}, server.shadow.epoch)
+    monkeypatch.setattr(server.context_scheduler, "request", lambda *a, **kw: requested.append(kw))
+    server._on_target_changed({"text"})
+    assert requested[-1] == {"supersede": False}
@@ -0,0 +1,67 @@
+"""Paged context reads: pages chain on the offsets the PC reports."""
+
+from __future__ import annotations
+
+import pytest
+
+import context_grabber
+from conftest import wait_until
+from context_grabber import WindowsUIABackend
+from fakes import FakeDocument, FakeTextPattern, FakeUIABackend
+from uia_worker import UIATarget, UIAWorker
+
+# Chrome puts U+FFFC where images sit; the phone never sees those
+TEXT = "".join(f"line {i} \ufffc😀\n" for i in range(60))
+
+
+def read_back(doc: FakeDocument, size: int) -> str:
+    """Load everything before the caret a page at a time, like app.js."""
+    backend = WindowsUIABackend()
+    target = UIATarget(doc, FakeTextPattern(doc), "text", "test")
+    start, text = 0, ""
+    while True:
+        page = backend.read_page(target, start - size, size)
+        assert page["end"] == start
+        text, start = page["text"] + text, page["start"]
+        if page["edge"]:
+            return text
+
+
+@pytest.mark.parametrize("size", [7, 64, 400])
+def test_pages_chained_on_start_end_cover_the_text_once(size):
+    doc = FakeDocument(text=TEXT, caret=len(TEXT) - 20)
+    expected = context_grabber._sanitize_text(TEXT[: doc.caret])
+    assert read_back(doc, size) == expected
+
+
+def test_page_after_the_caret_reports_its_span():
+    doc = FakeDocument(text=TEXT, caret=10, selection_end=15)
+    backend = WindowsUIABackend()
+    target = UIATarget(doc, FakeTextPattern(doc), "text", "test")
+    page = backend.read_page(target, 0, 12)
+    # The span counts the dropped U+FFFC, the text does not
+    assert (page["start"], page["end"]) == (0, 12)
+    assert page["text"] == context_grabber._sanitize_text(TEXT[15:27])
+    tail = backend.read_page(target, len(TEXT), 12)
+    assert (tail["start"], tail["end"], tail["edge"]) == (len(TEXT) - 15, len(TEXT) - 15, True)
+
+
+def test_server_forwards_the_span(monkeypatch, server, client):
+    doc = FakeDocument(text="abcdefghij", caret=5)
+    worker = UIAWorker(FakeUIABackend(doc))
+    monkeypatch.setattr(context_grabber, "get_uia_worker", lambda: worker)
+    server.set_page_provider(context_grabber.get_context_page)
+    try:
+        client.emit("context_page", {"offset": -4, "size": 4})
+
+        def pages():
+            return [e["args"][0] for e in client.get_received() if e["name"] == "context_page"]
+
+        received = []
+        assert wait_until(lambda: received.extend(pages()) or received)
+        page = received[0]
+        assert page["ok"] and page["req"] == -4
+        assert (page["start"], page["end"], page["text"]) == (-4, 0, "bcde")
+    finally:
+        server.set_page_provider(None)
+        worker.stop()
@@ -0,0 +1,115 @@
+"""ContextScheduler: single flight, coalescing, force priority, cleanup."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from context_scheduler import ContextScheduler
+
+
+class Grabs:
+    """A grab function that blocks until released, one grab at a time."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Semaphore(0)
+        self.delivered = []
+
+    def grab(self, force, hint):
+        self.calls.append((force, hint))
+        n = len(self.calls)
+        self.started.release()
+        assert self.release.acquire(timeout=5.0)
+        return {"n": n, "force": force}
+
+    def deliver(self, sid, ctx):
+        self.delivered.append((sid, ctx["n"]))
+
+    def next(self):
+        """Wait for the next grab to start, then let it finish."""
+        assert self.started.acquire(timeout=5.0)
+        self.release.release()
+
+
+@pytest.fixture
+def grabs():
+    return Grabs()
+
+
+@pytest.fixture
+def scheduler(grabs):
+    def spawn(fn, *args):
+        threading.Thread(target=fn, args=args, daemon=True).start()
+
+    return ContextScheduler(grabs.grab, grabs.deliver, spawn, time.sleep)
+
+
+def test_requests_during_a_grab_collapse_into_one_follow_up(scheduler, grabs):
+    scheduler.request("a")
+    assert grabs.started.acquire(timeout=5.0)
+    for _ in range(5):
+        scheduler.request("a")
+    scheduler.request("b")
+    grabs.release.release()
+    grabs.next()
+    assert wait_until(lambda: not scheduler.stats()["running"])
+    assert len(grabs.calls) == 2
+    # Plain requests do not make the running grab stale: both answers go out
+    assert sorted(grabs.delivered) == [("a", 1), ("a", 2), ("b", 1), ("b", 2)]
+
+
+def test_steady_polling_still_gets_answers(scheduler, grabs):
+    scheduler.request("a")
+    for done in range(1, 5):
+        assert grabs.started.acquire(timeout=5.0)
+        scheduler.request("a")  # the next poll lands while this grab runs
+        grabs.release.release()
+        assert wait_until(lambda: len(grabs.delivered) == done)
+    grabs.next()
+    assert wait_until(lambda: not scheduler.stats()["running"])
+    assert [n for _, n in grabs.delivered] == [1, 2, 3, 4, 5]
+
+
+def test_pending_force_grab_takes_priority(scheduler, grabs):
+    scheduler.request("a")
+    assert grabs.started.acquire(timeout=5.0)
+    scheduler.request("a", force=True)
+    scheduler.request("a")
+    grabs.release.release()
+    grabs.next()
+    assert wait_until(lambda: not scheduler.stats()["running"])
+    assert grabs.calls == [(False, None), (True, None)]
+    # The plain grab was overtaken; only the forced one is shown
+    assert grabs.delivered == [("a", 2)]
+
+
+def test_edit_during_a_grab_drops_its_result(scheduler, grabs):
+    scheduler.request("a")
+    assert grabs.started.acquire(timeout=5.0)
+    scheduler.request("a", hint="typed")
+    grabs.release.release()
+    grabs.next()
+    assert wait_until(lambda: not scheduler.stats()["running"])
+    assert grabs.calls[1] == (False, "typed")
+    assert grabs.delivered == [("a", 2)]
+
+
+def test_disconnected_client_gets_nothing_more(scheduler, grabs):
+    scheduler.request("a")
+    scheduler.request("b")
+    assert grabs.started.acquire(timeout=5.0)
+    scheduler.request("a")
+    scheduler.forget("a")
+    scheduler.forget("b")
+    grabs.release.release()
+    assert wait_until(lambda: not scheduler.stats()["running"])
+    # Nobody left to answer: no delivery and no follow-up grab
+    assert grabs.delivered == [] and len(grabs.calls) == 1
+    assert scheduler.stats()["subscribers"] == 0
+    scheduler.request()
+    assert len(grabs.calls) == 1
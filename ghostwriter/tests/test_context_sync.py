@@ -0,0 +1,51 @@
+"""Versioned context deltas (context_sync.py)."""
+
+from __future__ import annotations
+
+from context_sync import ContextSync, apply_text_diff, diff_text, utf16_len
+
+
+def js_apply(old: str, diff: dict) -> str:
+    """static/app.js applyContextDelta: slice() on UTF-16 code units."""
+    units = old.encode("utf-16-le")
+    keep_head = units[:2 * diff["p"]]
+    keep_tail = units[len(units) - 2 * diff["s"]:]
+    return (keep_head + diff["t"].encode("utf-16-le") + keep_tail).decode("utf-16-le")
+
+
+def test_diff_keeps_common_prefix_and_suffix():
+    diff = diff_text("the quick brown fox", "the quick red fox")
+    assert diff == {"p": 10, "s": 4, "t": "red"}
+    assert apply_text_diff("the quick brown fox", diff) == "the quick red fox"
+
+
+def test_offsets_count_utf16_units_after_astral_characters():
+    old = "📝 note 😀 before|after 🎉"
+    new = "📝 note 😀 before, edited|after 🎉"
+    diff = diff_text(old, new)
+    assert diff["p"] == utf16_len("📝 note 😀 before")
+    assert diff["s"] == utf16_len("|after 🎉")
+    assert js_apply(old, diff) == new
+    assert apply_text_diff(old, diff) == new
+
+
+def test_diff_never_splits_a_surrogate_pair():
+    # 😀 (U+1F600) and 😁 (U+1F601) share their high surrogate
+    old = "x😀y" * 8
+    new = "x😀y" * 3 + "x😁y" + "x😀y" * 4
+    diff = diff_text(old, new)
+    assert diff["t"] == "😁"
+    assert js_apply(old, diff) == new
+
+
+def test_encode_sends_deltas_against_the_last_version():
+    sync = ContextSync()
+    first = {"before": "🎉" * 10 + " hello", "after": ""}
+    assert sync.encode("a", first) == {"v": 1, "full": first}
+    assert sync.encode("a", first) is None
+
+    second = {"before": "🎉" * 10 + " hello world", "after": ""}
+    message = sync.encode("a", second)
+    assert (message["v"], message["base"]) == (2, 1)
+    assert js_apply(first["before"], message["delta"]["before"]) == second["before"]
+    assert sync.snapshot("a") == {"v": 2, "full": second}
@@ -0,0 +1,125 @@
+"""Dictation: tail edits between hypotheses, closed utterances, failures."""
+
+from __future__ import annotations
+
+import pytest
+
+from conftest import wait_until
+from dictation import DictationTracker, tail_diff
+
+
+@pytest.mark.parametrize("old, new, edit", [
+    ("", "ice", (0, "ice")),
+    ("ice", "ice cream", (0, " cream")),        # appending costs no backspaces
+    ("I scream", "ice cream", (8, "ice cream")),
+    ("ice cream", "ice cre", (2, "")),
+    ("same", "same", (0, "")),
+])
+def test_tail_diff(old, new, edit):
+    assert tail_diff(old, new) == edit
+
+
+def test_revisions_edit_from_what_was_typed():
+    tracker = DictationTracker()
+    assert tracker.revise("s", "u1", "ice") == (0, "ice")
+    tracker.commit(0, "ice")
+    assert tracker.revise("s", "u1", "ice cream") == (0, " cream")
+    tracker.commit(0, " cream")
+    assert tracker.revise("s", "u1", "ice scream") == (5, "scream")
+    tracker.commit(5, "scream", final=True)
+    stats = tracker.stats()
+    assert (stats["open"], stats["revisions"], stats["keys"]) == (None, 3, 5 + 3 + 6 + 6)
+    # Retyping every hypothesis: 3, then 3 + 9, then 9 + 10
+    assert stats["retype_keys"] == 34
+
+
+def test_closed_utterances_refuse_all_but_a_repeat():
+    tracker = DictationTracker()
+    tracker.revise("s", "u1", "ice")
+    tracker.commit(0, "ice")
+    # Another utterance closes the first
+    assert tracker.revise("s", "u2", "hello") == (0, "hello")
+    assert tracker.revise("s", "u1", "ice") == (0, "")
+    assert tracker.revise("s", "u1", "ice cream") is None
+    tracker.interrupt()
+    assert tracker.revise("s", "u2", "hello there") is None
+    assert tracker.stats()["interrupted"] == 2 and tracker.stats()["refused"] == 2
+
+
+def test_focus_on_another_app_closes_the_utterance():
+    tracker = DictationTracker()
+    tracker.revise("s", "u1", "ice", app="notepad.exe")
+    tracker.commit(0, "ice")
+    assert tracker.revise("s", "u1", "ice cream", app="word.exe") is None
+    assert tracker.stats()["open"] is None
+
+
+def test_a_failed_edit_closes_with_unknown_text():
+    tracker = DictationTracker()
+    tracker.revise("s", "u1", "I scream")
+    tracker.commit(0, "I scream")
+    assert tracker.revise("s", "u1", "ice cream") == (8, "ice cream")
+    tracker.fail(8)
+    # Not even the old text is a harmless resend: it was backspaced away
+    assert tracker.revise("s", "u1", "I scream") is None
+    assert tracker.revise("s", "u1", "ice cream") is None
+    stats = tracker.stats()
+    assert (stats["open"], stats["failed"], stats["deleted"], stats["revisions"]) == (None, 1, 8, 1)
+
+
+def test_moved_and_forgotten_sessions():
+    tracker = DictationTracker()
+    tracker.revise("old", "u1", "ice")
+    tracker.commit(0, "ice")
+    tracker.move("old", "new")
+    assert tracker.revise("new", "u1", "ice cream") == (0, " cream")
+    tracker.forget("new")
+    assert tracker.stats()["open"] is None
+    # Forgotten, not closed: the id starts afresh
+    assert tracker.revise("new", "u1", "x") == (0, "x")
+
+
+# ── Server ───────────────────────────────────────────────────
+
+def errors(client):
+    return [m["args"][0] for m in client.get_received() if m["name"] == "error"]
+
+
+def test_server_types_only_the_changes(server, client, doc):
+    client.emit("dictation", {"u": "d1", "text": "I scream"})
+    assert wait_until(lambda: doc.text == "I scream")
+    client.emit("dictation", {"u": "d1", "text": "ice cream"})
+    assert wait_until(lambda: doc.text == "ice cream")
+    client.emit("dictation", {"u": "d1", "text": "ice cream please", "final": True})
+    assert wait_until(lambda: doc.text == "ice cream please")
+    assert wait_until(lambda: server.dictation.stats()["open"] is None)
+
+    # A resend of the final text is harmless; a change is refused
+    client.emit("dictation", {"u": "d1", "text": "ice cream please"})
+    client.emit("dictation", {"u": "d1", "text": "ice cream, please"})
+    received = []
+    assert wait_until(lambda: received.extend(errors(client)) or received)
+    assert [(e["code"], e["detail"]) for e in received] == [("DICTATION_CLOSED", "d1")]
+    assert doc.text == "ice cream please"
+    assert wait_until(lambda: not server.context_scheduler.stats()["running"])
+
+
+def test_server_closes_the_utterance_when_typing_fails(monkeypatch, server, client, doc):
+    client.emit("dictation", {"u": "d2", "text": "I scream"})
+    assert wait_until(lambda: doc.text == "I scream")
+    failed = server.dictation.stats()["failed"]
+
+    monkeypatch.setattr(server.desktop, "inject_text", lambda text, app="": {
+        "ok": False, "code": "INJECT_ERR", "message": "注入失敗"})
+    client.emit("dictation", {"u": "d2", "text": "ice cream"})
+    # The backspaces landed, the new text did not
+    assert wait_until(lambda: server.dictation.stats()["failed"] == failed + 1)
+    assert doc.text == ""
+    monkeypatch.undo()
+
+    client.emit("dictation", {"u": "d2", "text": "I scream"})
+    received = []
+    assert wait_until(lambda: received.extend(errors(client)) or any(
+        e.get("code") == "DICTATION_CLOSED" for e in received))
+    assert doc.text == ""
+    assert wait_until(lambda: not server.context_scheduler.stats()["running"])
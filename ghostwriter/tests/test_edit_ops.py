@@ -0,0 +1,123 @@
+"""edit_ops batches: parsing and per-batch acks from the server."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+import injector
+from conftest import wait_until
+from edit_ops import BatchResult, EditBatch, EditOp, EditOpError, decode_batch, encode_batch, parse_batch
+from fakes import RecordingBackend
+
+
+class NoForwardDelete(RecordingBackend):
+    """The target app refuses forward deletes."""
+
+    def press(self, key: str, presses: int = 1) -> None:
+        if key == "delete":
+            raise OSError("delete refused")
+        super().press(key, presses)
+
+
+def acks(client):
+    return [m["args"][0] for m in client.get_received() if m["name"] == "ops_ack"]
+
+
+def wait_acks(client, count):
+    received = []
+
+    def enough():
+        received.extend(acks(client))
+        return len(received) >= count
+
+    wait_until(enough)
+    return received
+
+
+def test_binary_round_trip():
+    batch = EditBatch(7, [
+        EditOp("insert", text="héllo 😀"),
+        EditOp("delete", direction="back", count=2),
+        EditOp("move", direction="left", count=3),
+        EditOp("key", keys=("ctrl", "a")),
+    ])
+    assert decode_batch(encode_batch(batch)).ops == batch.ops
+
+
+def test_bad_batch_is_rejected():
+    with pytest.raises(EditOpError):
+        parse_batch({"seq": 1, "ops": [{"op": "delete", "n": 0}]})
+
+
+def test_batch_result_waits_for_every_op():
+    results = BatchResult(3, 3)
+    assert results.record(0, {"ok": True}) is None
+    assert results.record(2, {"ok": False, "code": "KEY_ERR"}) is None
+    assert results.record(1, {"ok": False, "code": "INJECT_ERR"}) == {
+        "ok": False, "code": "INJECT_ERR", "index": 1, "message": "",
+    }
+
+
+def test_batch_is_acked_once_all_ops_ran(client, doc):
+    client.emit("edit_ops", {"seq": 1, "ops": [
+        {"op": "insert", "text": "hello"},
+        {"op": "delete", "n": 2},
+        {"op": "insert", "text": "p!"},
+    ]})
+    client.emit("edit_ops", {"seq": 2, "ops": [{"op": "insert", "text": " more"}]})
+    received = wait_acks(client, 2)
+    assert [(a["seq"], a["ok"]) for a in received] == [(1, True), (2, True)]
+    assert doc.text == "help! more"
+
+
+def test_failure_in_the_middle_of_a_batch_is_reported(client, doc):
+    injector.set_backend(NoForwardDelete(doc))
+    client.emit("edit_ops", {"seq": 1, "ops": [
+        {"op": "insert", "text": "ab"},
+        {"op": "delete", "n": 1, "dir": "forward"},
+        {"op": "insert", "text": "c"},
+    ]})
+    (ack,) = wait_acks(client, 1)
+    assert (ack["seq"], ack["ok"], ack["code"], ack["index"]) == (1, False, "KEY_ERR", 1)
+    assert doc.text == "abc"
+
+
+def test_desktop_timeout_is_resent_from_the_failed_op(monkeypatch, server, client, doc):
+    inject = server.desktop.inject_text
+    queued = threading.Event()
+    failed = []
+
+    def hung_once(text, app=""):
+        if text == "x" and not failed:
+            failed.append(text)
+            queued.wait(5.0)  # let the next batch queue up behind this op
+            return {"ok": False, "code": "TIMEOUT", "message": "電腦端無回應"}
+        return inject(text, app)
+
+    monkeypatch.setattr(server.desktop, "inject_text", hung_once)
+    client.emit("edit_ops", {"seq": 1, "ops": [
+        {"op": "insert", "text": "ab"},
+        {"op": "move", "dir": "left", "n": 1},
+        {"op": "insert", "text": "x"},
+    ]})
+    client.emit("edit_ops", {"seq": 2, "ops": [{"op": "move", "dir": "right", "n": 1}, {"op": "insert", "text": "c"}]})
+    queued.set()
+    (ack,) = wait_acks(client, 1)
+    assert (ack["seq"], ack["ok"], ack["code"], ack["index"], ack["retry"]) == (1, False, "TIMEOUT", 2, True)
+
+    # What was queued behind the op is dropped, and seq 1 is expected again
+    time.sleep(0.2)
+    assert doc.text == "ab" and acks(client) == []
+    client.emit("edit_ops", {"seq": 2, "ops": [{"op": "move", "dir": "right", "n": 1}, {"op": "insert", "text": "c"}]})
+    (ack,) = wait_acks(client, 1)
+    assert (ack["seq"], ack["code"], ack["expected"]) == (2, "OUT_OF_ORDER", 1)
+
+    # The client's resend: batch 1 from the failed op, then batch 2
+    client.emit("edit_ops", {"seq": 1, "ops": [{"op": "insert", "text": "x"}]})
+    client.emit("edit_ops", {"seq": 2, "ops": [{"op": "move", "dir": "right", "n": 1}, {"op": "insert", "text": "c"}]})
+    received = wait_acks(client, 2)
+    assert [(a["seq"], a["ok"]) for a in received] == [(1, True), (2, True)]
+    assert doc.text == "axbc"
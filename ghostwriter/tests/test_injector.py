@@ -0,0 +1,127 @@
+"""Injection backends and paths (injector.py) on RecordingBackend."""
+
+from __future__ import annotations
+
+import pytest
+
+import injector
+from clipboard_session import ClipboardSession, set_clipboard_session
+from fakes import FakeClipboard, FakeDocument, RecordingBackend
+
+
+@pytest.fixture
+def clipboard():
+    board = FakeClipboard(formats={49161: b"user image"}, text="user text")
+    session = ClipboardSession(board, idle_timeout=60)
+    set_clipboard_session(session)
+    yield board
+    set_clipboard_session(None)
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        injector.InjectionBackend()
+
+
+def test_native_backend_types_unicode_directly():
+    doc = FakeDocument()
+    backend = RecordingBackend(doc)
+    injector.set_backend(backend)
+    assert injector.inject_text("héllo 測試 😀")["ok"]
+    assert doc.text == "héllo 測試 😀"
+    assert all(kind == "type" for kind, _ in backend.calls)
+
+
+def test_ascii_only_backend_pastes_the_rest(clipboard):
+    doc = FakeDocument()
+    backend = RecordingBackend(doc, unicode_native=False, clipboard=clipboard)
+    injector.set_backend(backend)
+    assert injector.inject_text("abc 測試")["ok"]
+    assert doc.text == "abc 測試"
+    assert ("hotkey", ("ctrl", "v")) in backend.calls
+
+    # The user's clipboard (all formats) comes back once the session ends
+    injector.get_clipboard_session().flush()
+    assert (clipboard.text, clipboard.formats) == ("user text", {49161: b"user image"})
+
+
+def test_keys_and_hotkeys():
+    doc = FakeDocument(text="abc", caret=3)
+    injector.set_backend(RecordingBackend(doc))
+    assert injector.press_key("backspace", 2)["ok"]
+    assert injector.press_key("left")["ok"]
+    assert (doc.text, doc.caret) == ("a", 0)
+    assert injector.press_hotkey("ctrl", "a")["ok"]
+
+
+# ── Injection planner ───────────────────────────────────────
+
+@pytest.fixture
+def model(monkeypatch):
+    fresh = injector.CostModel()
+    monkeypatch.setattr(injector, "cost_model", fresh)
+    return fresh
+
+
+def test_plan_types_ascii_and_pastes_what_cannot_be_typed(model, clipboard):
+    ascii_only = RecordingBackend(unicode_native=False, clipboard=clipboard)
+    assert model.plan("hello", ascii_only) == [(injector.TYPED, "hello")]
+    assert model.plan("測試文字", ascii_only) == [(injector.PASTE, "測試文字")]
+    native = RecordingBackend()
+    assert model.plan("測試文字", native) == [(injector.TYPED, "測試文字")]
+    assert model.plan("", native) == []
+
+
+def test_plan_splits_mixed_runs_by_cost(model, clipboard, monkeypatch):
+    # Cheap ASCII keystrokes, dear non-ASCII ones: paste only the middle
+    monkeypatch.setitem(injector.COST_PRIORS, "recording", {
+        "typed:ascii": (0.0005, 0.000001), "typed:unicode": (0.001, 0.01), "clipboard": (0.05, 0.00001),
+    })
+    text = "a" * 200 + "測" * 20 + "b" * 200
+    steps = model.plan(text, RecordingBackend(clipboard=clipboard), "notepad.exe")
+    assert steps == [(injector.TYPED, "a" * 200), (injector.PASTE, "測" * 20), (injector.TYPED, "b" * 200)]
+
+
+def test_plan_follows_measured_costs_per_app(model, clipboard):
+    native = RecordingBackend(clipboard=clipboard)
+    assert model.plan("測試" * 5, native, "fast.exe") == [(injector.TYPED, "測試" * 5)]
+    for _ in range(20):
+        model.observe(native.name, "slow.exe", "typed:unicode", 10, 0.5)
+    assert model.plan("測試" * 5, native, "slow.exe") == [(injector.PASTE, "測試" * 5)]
+    # fast.exe has its own fit (from before the slow app's measurements)
+    assert model.plan("測試" * 5, native, "fast.exe") == [(injector.TYPED, "測試" * 5)]
+    assert model.snapshot()["recording/slow.exe"]["typed:unicode"]["samples"] == 20
+
+
+def test_blocked_paste_falls_back_instead_of_failing(model, clipboard):
+    doc = FakeDocument()
+    backend = RecordingBackend(doc, unicode_native=False, clipboard=clipboard)
+    injector.set_backend(backend)
+    model.block_paste("notepad.exe")
+    # Typing cannot do the CJK run, so it is pasted after all
+    assert model.plan("abc 測試", backend, "notepad.exe") == [(injector.PASTE, "abc 測試")]
+    assert injector.inject_text("abc 測試", app="notepad.exe")["ok"]
+    assert doc.text == "abc 測試"
+
+
+def test_backend_that_can_neither_type_nor_paste_reports_it(model):
+    doc = FakeDocument()
+    injector.set_backend(RecordingBackend(doc, unicode_native=False))
+    result = injector.inject_text("abc 測試")
+    assert (result["ok"], result["code"]) == (False, "INJECT_UNSUPPORTED")
+    assert doc.text == ""
+
+
+def test_failed_paste_backs_off_that_app_only(model, clipboard, monkeypatch):
+    doc = FakeDocument()
+    injector.set_backend(RecordingBackend(doc, unicode_native=False, clipboard=clipboard))
+
+    def broken(*args):
+        raise OSError("clipboard busy")
+
+    monkeypatch.setattr(injector, "_paste", broken)
+    text = "a" * 2000  # long enough that pasting is planned
+    assert injector.inject_text(text, app="notepad.exe")["ok"]
+    # Typed instead, and no more pastes planned for notepad for a while
+    assert doc.text == text
+    assert not model.paste_allowed("notepad.exe") and model.paste_allowed("word.exe")
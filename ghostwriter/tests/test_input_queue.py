@@ -0,0 +1,129 @@
+"""InjectionWorker: per-client queues, round-robin, word holds and bounds."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from input_queue import InjectionWorker, InputOp, ends_mid_word
+
+
+class Desk:
+    """Records what was typed; the first op blocks until `go` is set."""
+
+    def __init__(self) -> None:
+        self.done = []
+        self.started = threading.Event()
+        self.go = threading.Event()
+
+    def execute(self, op):
+        if not self.started.is_set():
+            self.started.set()
+            assert self.go.wait(5.0)
+        self.done.append((op.sid, op.text or op.key))
+        return {"ok": True}
+
+
+@pytest.fixture
+def desk():
+    return Desk()
+
+
+def text(sid, value):
+    return InputOp("text", sid=sid, text=value)
+
+
+def key(sid, value):
+    return InputOp("key", sid=sid, key=value)
+
+
+def busy(worker, desk):
+    """Occupy the worker with a blocking op from a third client."""
+    assert worker.submit(key("z", "blocker"))
+    assert desk.started.wait(5.0)
+
+
+@pytest.mark.parametrize("value, mid_word", [
+    ("hel", True), ("hello ", False), ("hi,", False), ("中文", False), ("", False), ("x1", True),
+])
+def test_ends_mid_word(value, mid_word):
+    assert ends_mid_word(value) is mid_word
+
+
+def test_clients_are_served_round_robin(desk):
+    worker = InjectionWorker(desk.execute)
+    busy(worker, desk)
+    assert worker.submit_many([key("a", "a1"), key("a", "a2"), key("a", "a3")])
+    assert worker.submit_many([key("b", "b1"), key("b", "b2")])
+    desk.go.set()
+    assert wait_until(lambda: len(desk.done) == 6)
+    assert [k for _, k in desk.done] == ["blocker", "a1", "b1", "a2", "b2", "a3"]
+    assert worker.stats()["switches"] == 5
+
+
+def test_text_behind_a_running_write_is_merged(desk):
+    worker = InjectionWorker(desk.execute)
+    busy(worker, desk)
+    assert worker.submit_many([text("a", "he"), text("a", "llo"), key("a", "enter"), text("a", "!")])
+    desk.go.set()
+    assert wait_until(lambda: len(desk.done) == 4)
+    assert desk.done[1:] == [("a", "hello"), ("a", "enter"), ("a", "!")]
+    assert worker.stats()["merged"] == 1
+
+
+def test_queue_bound_is_per_client(desk):
+    worker = InjectionWorker(desk.execute, maxsize=2, put_timeout=0.05)
+    busy(worker, desk)
+    assert worker.submit_many([key("a", "1"), key("a", "2")])
+    start = time.monotonic()
+    assert not worker.submit(key("a", "3"))
+    assert time.monotonic() - start >= 0.04
+    # More than a queue can ever hold fails without waiting
+    assert not worker.submit_many([key("b", str(i)) for i in range(3)])
+    # A full queue for one client does not block another
+    assert worker.submit(key("b", "ok"))
+    assert worker.stats()["rejected"] == 4
+    desk.go.set()
+    assert wait_until(lambda: len(desk.done) == 4)
+    assert ("a", "3") not in desk.done
+
+
+def test_client_stopped_mid_word_keeps_the_stream(desk):
+    worker = InjectionWorker(desk.execute, hold_timeout=5.0)
+    desk.started.set()
+    desk.go.set()
+    assert worker.submit(text("a", "hel"))
+    assert wait_until(lambda: len(desk.done) == 1)
+    assert worker.submit(key("b", "enter"))
+    time.sleep(0.1)
+    assert len(desk.done) == 1 and worker.stats()["holder"] == "a"
+    assert worker.submit(text("a", "lo "))
+    assert wait_until(lambda: len(desk.done) == 3)
+    assert desk.done == [("a", "hel"), ("a", "lo "), ("b", "enter")]
+
+
+def test_hold_lapses_after_the_timeout(desk):
+    worker = InjectionWorker(desk.execute, hold_timeout=0.2)
+    desk.started.set()
+    desk.go.set()
+    assert worker.submit(text("a", "hel"))
+    assert wait_until(lambda: len(desk.done) == 1)
+    held = time.monotonic()
+    assert worker.submit(key("b", "enter"))
+    assert wait_until(lambda: len(desk.done) == 2)
+    assert time.monotonic() - held >= 0.15
+    assert worker.stats()["holder"] is None
+
+
+def test_release_ends_the_hold_at_once(desk):
+    worker = InjectionWorker(desk.execute, hold_timeout=5.0)
+    desk.started.set()
+    desk.go.set()
+    assert worker.submit(text("a", "hel"))
+    assert wait_until(lambda: len(desk.done) == 1)
+    assert worker.submit(key("b", "enter"))
+    worker.release("a")
+    assert wait_until(lambda: len(desk.done) == 2, timeout=1.0)
@@ -0,0 +1,93 @@
+"""Rolling latency windows, the /metrics exposition and clock-corrected uplink."""
+
+from __future__ import annotations
+
+import time
+
+from conftest import wait_until
+from metrics import Metrics, RollingHistogram
+
+
+def test_quantiles_cover_only_the_window():
+    hist = RollingHistogram(window=100)
+    for value in range(1000, 1100):
+        hist.observe(value)
+    for value in range(100):
+        hist.observe(value)
+    # The first hundred samples rolled out; the lifetime totals did not
+    assert hist.quantiles() == {0.5: 50, 0.95: 94, 0.99: 98}
+    assert hist.count == 200
+    assert hist.total == sum(range(1000, 1100)) + sum(range(100))
+
+
+def test_empty_window_reports_zero():
+    assert RollingHistogram().quantiles() == {0.5: 0.0, 0.95: 0.0, 0.99: 0.0}
+
+
+def test_snapshot_keys_series_by_label():
+    m = Metrics()
+    m.observe("inject_ms", 1.234, kind="text")
+    m.observe("inject_ms", 3.0, kind="key")
+    m.observe("page_ms", 7.0)
+    snap = m.snapshot()
+    assert snap["inject_ms"]["kind=text"] == {"count": 1, "p50": 1.23, "p95": 1.23, "p99": 1.23}
+    assert snap["inject_ms"]["kind=key"]["count"] == 1
+    assert snap["page_ms"]["all"]["p50"] == 7.0
+
+
+def test_prometheus_summary_and_gauges():
+    m = Metrics(prefix="gw")
+    m.observe("grab_ms", 2.0, strategy='say "hi"\\\n')
+    m.observe("grab_ms", 4.0, strategy='say "hi"\\\n')
+    m.gauge("clients", lambda: 3)
+
+    def broken():
+        raise RuntimeError("not ready")
+
+    m.gauge("queue_depth", broken)
+    lines = m.render_prometheus().splitlines()
+    label = 'strategy="say \\"hi\\"\\\\\\n"'
+    assert lines == [
+        "# TYPE gw_grab_ms summary",
+        f'gw_grab_ms{{{label},quantile="0.5"}} 2.000',
+        f'gw_grab_ms{{{label},quantile="0.95"}} 4.000',
+        f'gw_grab_ms{{{label},quantile="0.99"}} 4.000',
+        f"gw_grab_ms_sum{{{label}}} 6.000",
+        f"gw_grab_ms_count{{{label}}} 2",
+        # A gauge that fails to read is left out, not reported as 0
+        "# TYPE gw_clients gauge",
+        "gw_clients 3",
+    ]
+
+
+def test_metrics_route_serves_the_exposition(server):
+    server.metrics.observe("page_ms", 1.0)
+    response = server.app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE ghostwriter_page_ms summary" in body
+    assert "# TYPE ghostwriter_clients gauge" in body
+
+
+def test_clock_sync_echoes_the_send_time(client):
+    before = time.time() * 1000
+    client.emit("clock_sync", {"t0": 12345})
+    replies = [e["args"][0] for e in client.get_received() if e["name"] == "clock_sync"]
+    assert replies and replies[0]["t0"] == 12345
+    assert before <= replies[0]["ts"] <= time.time() * 1000
+
+
+def test_uplink_uses_the_server_clock_send_time(server, client, doc):
+    def uplink():
+        return server.metrics.snapshot().get("uplink_ms", {}).get("all", {"count": 0})
+
+    seen = uplink()["count"]
+    # The client stamps `t` in server-clock ms: 40ms in flight
+    client.emit("text_input", {"text": "a", "t": time.time() * 1000 - 40})
+    assert wait_until(lambda: uplink()["count"] == seen + 1)
+    assert 40 <= uplink()["p99"] < 1000
+    # A client clock running ahead never yields a negative latency
+    client.emit("text_input", {"text": "b", "t": time.time() * 1000 + 60000})
+    assert wait_until(lambda: doc.text == "ab")
+    assert min(q for k, q in uplink().items() if k != "count") >= 0
@@ -0,0 +1,19 @@
+"""Socket.IO handlers of server.py, end to end against a FakeDocument."""
+
+from __future__ import annotations
+
+from conftest import wait_until
+
+
+def test_handlers_run_in_arrival_order(server):
+    # A thread per event could hand ops to the injection queue out of order
+    assert server.socketio.server.async_handlers is False
+
+
+def test_events_are_typed_in_order(client, doc):
+    client.emit("text_input", {"text": "ab"})
+    client.emit("key_command", {"key": "backspace"})
+    client.emit("text_input", {"text": "c"})
+    client.emit("move_cursor", {"offset": -1})
+    client.emit("text_input", {"text": "x"})
+    assert wait_until(lambda: doc.text == "axc")
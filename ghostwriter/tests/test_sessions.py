@@ -0,0 +1,160 @@
+"""Resumable sessions: the registry, moving per-sid state, resume end to end."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from context_sync import ContextSync
+from input_queue import InjectionWorker, InputOp
+from sessions import SessionRegistry
+
+
+def test_resume_keeps_the_expected_seq():
+    registry = SessionRegistry(ttl=60)
+    session, previous = registry.open("s1")
+    assert previous is None and session.next_seq is None
+    assert registry.detach("s1", 4)
+    assert registry.get(session.token).detached_at is not None
+
+    resumed, previous = registry.open("s2", session.token)
+    assert resumed is session and previous == "s1"
+    assert (resumed.sid, resumed.next_seq, resumed.detached_at, resumed.resumes) == ("s2", 4, None, 1)
+    # The old socket closing late must not detach the resumed session
+    assert not registry.detach("s1", 1)
+    assert registry.stats() == {"active": 1, "detached": 0, "opened": 1, "resumed": 1, "expired": 0}
+
+
+@pytest.mark.parametrize("token", [None, 42, "unknown"])
+def test_unknown_tokens_open_a_new_session(token):
+    registry = SessionRegistry()
+    session, previous = registry.open("s1", token)
+    assert previous is None and session.token != token
+    assert registry.get(token) is None
+
+
+def test_detached_sessions_expire():
+    registry = SessionRegistry(ttl=0.05)
+    session, _ = registry.open("s1")
+    live, _ = registry.open("s2")
+    registry.detach("s1", 3)
+    time.sleep(0.1)
+    assert registry.get(session.token) is None
+    # Connected sessions never expire
+    assert registry.get(live.token) is live
+    assert registry.prune() == [session]
+    fresh, previous = registry.open("s3", session.token)
+    assert previous is None and fresh.token != session.token
+    assert registry.stats()["expired"] == 1
+
+
+def test_oldest_detached_sessions_go_past_the_limit():
+    registry = SessionRegistry(ttl=60, max_sessions=2)
+    sessions = [registry.open(f"s{i}")[0] for i in range(3)]
+    for i in range(3):
+        registry.detach(f"s{i}", None)
+    assert registry.prune() == [sessions[0]]
+    assert registry.get(sessions[1].token) is sessions[1]
+
+
+def test_closed_sessions_cannot_be_resumed():
+    registry = SessionRegistry()
+    session, _ = registry.open("s1")
+    registry.close("s1")
+    assert registry.get(session.token) is None
+    assert not registry.detach("s1", 1)
+
+
+def test_context_versions_follow_the_session():
+    sync = ContextSync()
+    first = {"before": "x" * 20 + " hello"}
+    sync.encode("old", first)
+    assert sync.move("old", "new")
+    assert not sync.move("old", "other")
+    assert sync.snapshot("old") is None
+    # The phone still has version 1: the next update is a delta against it
+    message = sync.encode("new", {"before": "x" * 20 + " hello world"})
+    assert (message["v"], message["base"]) == (2, 1)
+
+
+def test_rekey_moves_queued_ops_ahead_of_the_new_socket():
+    started, go, done = threading.Event(), threading.Event(), []
+
+    def execute(op):
+        if op.key == "blocker":
+            started.set()
+            assert go.wait(5.0)
+        done.append((op.sid, op.key))
+        return {"ok": True}
+
+    worker = InjectionWorker(execute)
+    assert worker.submit(InputOp("key", sid="z", key="blocker"))
+    assert started.wait(5.0)
+    assert worker.submit_many([InputOp("key", sid="old", key="1"), InputOp("key", sid="old", key="2")])
+    assert worker.submit(InputOp("key", sid="new", key="3"))
+    assert worker.rekey("old", "new") == 3
+    assert worker.rekey("gone", "new") == 0
+    assert worker.pending("old") == 0 and worker.pending("new") == 3
+    go.set()
+    assert wait_until(lambda: len(done) == 4)
+    assert done[1:] == [("new", "1"), ("new", "2"), ("new", "3")]
+
+
+# ── Server ───────────────────────────────────────────────────
+
+def status(client):
+    (connected,) = [m["args"][0] for m in client.get_received() if m["name"] == "status_update"]
+    return connected
+
+
+def acks(client):
+    return [m["args"][0] for m in client.get_received() if m["name"] == "ops_ack"]
+
+
+def insert(seq, text):
+    return {"seq": seq, "ops": [{"op": "insert", "text": text}]}
+
+
+def test_resumed_phone_resends_without_typing_twice(server, doc):
+    first = server.socketio.test_client(server.app)
+    token = status(first)["session"]
+    first.emit("edit_ops", insert(1, "a"))
+    first.emit("edit_ops", insert(2, "b"))
+    assert wait_until(lambda: doc.text == "ab")
+    first.disconnect()
+
+    second = server.socketio.test_client(server.app, auth={"session": token})
+    try:
+        connected = status(second)
+        assert (connected["resumed"], connected["next_seq"], connected["session"]) == (True, 3, token)
+        # Batch 2's ack was lost with the old socket: the phone sends it again
+        second.emit("edit_ops", insert(2, "b"))
+        second.emit("edit_ops", insert(3, "c"))
+        received = []
+        assert wait_until(lambda: received.extend(acks(second)) or len(received) == 2)
+        assert (received[0]["seq"], received[0]["ok"], received[0]["duplicate"]) == (2, True, True)
+        assert received[1]["seq"] == 3 and received[1]["ok"]
+        assert doc.text == "abc"
+    finally:
+        second.disconnect()
+
+
+def test_expired_session_starts_over(monkeypatch, server, doc):
+    monkeypatch.setattr(server.sessions, "ttl", 0.0)
+    first = server.socketio.test_client(server.app)
+    token = status(first)["session"]
+    first.emit("edit_ops", insert(1, "a"))
+    assert wait_until(lambda: doc.text == "a")
+    first.disconnect()
+    time.sleep(0.01)
+
+    second = server.socketio.test_client(server.app, auth={"session": token})
+    try:
+        connected = status(second)
+        assert connected["resumed"] is False and connected["session"] != token
+        assert connected["next_seq"] is None
+    finally:
+        second.disconnect()
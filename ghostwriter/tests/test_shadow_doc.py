@@ -0,0 +1,118 @@
+"""ShadowBuffer: local edits on the last real grab, per focused control."""
+
+from __future__ import annotations
+
+import pytest
+
+from shadow_doc import ShadowBuffer
+
+
+def grab(before="", after="", selected="", target="Edit/1", **extra):
+    return dict({"supported": True, "target": target, "app_name": "Notepad",
+                 "before": before, "after": after, "selected": selected}, **extra)
+
+
+def text(ctx):
+    return ctx["before"], ctx["selected"], ctx["after"]
+
+
+@pytest.fixture
+def shadow():
+    buffer = ShadowBuffer(window=10)
+    assert buffer.reconcile(grab("hello", " world"), buffer.epoch)
+    return buffer
+
+
+def test_nothing_to_edit_before_a_grab():
+    buffer = ShadowBuffer()
+    assert buffer.insert("x") is None and buffer.pending() is None
+
+
+def test_insert_replaces_the_selection_and_keeps_the_window(shadow):
+    shadow.reconcile(grab("abc", "xyz", selected="SEL"), shadow.epoch)
+    assert text(shadow.insert("12\r\n")) == ("abc12\n", "", "xyz")
+    ctx = shadow.insert("3456789")
+    # Only `window` characters are kept on each side
+    assert text(ctx) == ("12\n3456789", "", "xyz")
+    assert ctx["app_name"] == "Notepad" and shadow.pending() == ctx
+
+
+@pytest.mark.parametrize("edit, expected", [
+    (lambda s: s.delete_back(1), ("abc", "", "xyz")),
+    (lambda s: s.delete_back(2), ("ab", "", "xyz")),
+    (lambda s: s.delete_forward(1), ("abc", "", "xyz")),
+    (lambda s: s.delete_forward(2), ("abc", "", "yz")),
+])
+def test_delete_takes_the_selection_first(shadow, edit, expected):
+    shadow.reconcile(grab("abc", "xyz", selected="SEL"), shadow.epoch)
+    assert text(edit(shadow)) == expected
+
+
+def test_crlf_is_one_character(shadow):
+    shadow.reconcile(grab("ab\r\n", "\r\ncd"), shadow.epoch)
+    assert text(shadow.delete_back(1)) == ("ab", "", "\r\ncd")
+    assert text(shadow.delete_forward(1)) == ("ab", "", "cd")
+
+
+def test_caret_moves_collapse_the_selection(shadow):
+    shadow.reconcile(grab("abc", "xyz", selected="S"), shadow.epoch)
+    # Left from the selection start, right from its end
+    assert text(shadow.move(-1)) == ("ab", "", "cSxyz")
+    assert text(shadow.move(3)) == ("abcSx", "", "yz")
+    assert text(shadow.move(0)) == ("abcSx", "", "yz")
+
+
+@pytest.mark.parametrize("edit", [
+    lambda s: s.move(-6), lambda s: s.move(7), lambda s: s.delete_back(6), lambda s: s.delete_forward(7),
+])
+def test_edits_past_the_known_text_invalidate(shadow, edit):
+    assert edit(shadow) is None
+    assert shadow.stats()["target"] is None and shadow.stats()["invalidations"] == 1
+    # Until a real grab, nothing is modelled
+    assert shadow.insert("x") is None and shadow.pending() is None
+
+
+def test_invalidate_waits_for_a_real_grab(shadow):
+    shadow.insert("!")
+    shadow.invalidate()
+    assert shadow.pending() is None and shadow.insert("x") is None
+    assert shadow.reconcile(grab("again"), shadow.epoch)
+    assert text(shadow.insert("!")) == ("again!", "", "")
+
+
+def test_grab_overtaken_by_an_edit_is_discarded(shadow):
+    epoch = shadow.epoch
+    shadow.insert("!")
+    # Started before "!" was typed: it cannot show it
+    assert not shadow.reconcile(grab("hello", " world"), epoch)
+    assert text(shadow.pending()) == ("hello!", "", " world")
+    assert shadow.stats()["discarded"] == 1
+
+
+def test_reconcile_counts_drift_only_when_the_copy_was_wrong(shadow):
+    shadow.insert("!")
+    # The app shows more than we keep: compared on the overlap, CR ignored
+    assert shadow.reconcile(grab("say hello!", " world\r\n"), shadow.epoch)
+    assert shadow.stats()["drift"] == 0 and shadow.pending() is None
+    shadow.insert("?")
+    assert shadow.reconcile(grab("hello!!", " world"), shadow.epoch)
+    assert shadow.stats()["drift"] == 1
+
+
+def test_targets_are_the_focused_control_not_the_app(shadow):
+    shadow.insert("!")
+    # Another field of the same app: its own copy, no drift against the first
+    assert shadow.reconcile(grab("other", target="Edit/2"), shadow.epoch)
+    assert shadow.stats()["drift"] == 0
+    assert text(shadow.insert("?")) == ("other?", "", "")
+    # Back in the first field: the unreconciled "?" was the other field's
+    assert shadow.reconcile(grab("hello!", " world", target="Edit/1"), shadow.epoch)
+    assert shadow.stats()["drift"] == 0
+    assert text(shadow.insert(".")) == ("hello!.", "", " world")
+
+
+def test_unsupported_grab_drops_the_current_target(shadow):
+    assert shadow.reconcile({"supported": False, "target": "Edit/1"}, shadow.epoch)
+    assert shadow.insert("x") is None
+    assert shadow.reconcile(grab("x", target=None), shadow.epoch)
+    assert shadow.stats()["target"] is None
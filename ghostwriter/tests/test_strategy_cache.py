@@ -0,0 +1,69 @@
+"""Per-app context strategy cache and how get_cursor_context drives it."""
+
+from __future__ import annotations
+
+import pytest
+
+import context_grabber
+from fakes import FakeDocument, FakeUIABackend
+from strategy_cache import StrategyCache
+from uia_worker import UIAWorker
+
+KEY = ("chrome.exe", "Chrome_RenderWidgetHostHWND")
+HWND = 0x1234
+
+
+def test_failure_backs_off_until_focus_moves():
+    cache = StrategyCache()
+    cache.focus(KEY, 1)
+    cache.failure(KEY, "uia")
+    assert cache.plan(KEY, ("uia", "clipboard")) == ["clipboard"]
+    assert not cache.focus(KEY, 1)
+    assert cache.plan(KEY, ("uia", "clipboard")) == ["clipboard"]
+    assert cache.focus(KEY, 2)
+    assert cache.plan(KEY, ("uia", "clipboard")) == ["uia", "clipboard"]
+
+
+@pytest.fixture
+def chrome(monkeypatch):
+    """One top-level window whose focused element changes underneath it."""
+    backend = FakeUIABackend(FakeDocument(text="", has_text_pattern=False, has_value_pattern=False))
+    worker = UIAWorker(backend)
+    cache = StrategyCache()
+    copies = []
+
+    def grab(app):
+        copies.append(app)
+        return ""
+
+    monkeypatch.setattr(context_grabber, "get_uia_worker", lambda: worker)
+    monkeypatch.setattr(context_grabber, "strategies", cache)
+    monkeypatch.setattr(context_grabber, "_get_foreground_process_name", lambda: KEY[0])
+    monkeypatch.setattr(context_grabber, "_get_focus_window", lambda: (KEY[1], HWND))
+    monkeypatch.setattr(context_grabber, "_grab_selected_text_clipboard", grab)
+    yield backend, cache, copies
+    worker.stop()
+
+
+def test_focus_change_inside_one_window_reprobes_uia(chrome):
+    backend, cache, _ = chrome
+    result = context_grabber.get_cursor_context()
+    assert result["strategy"] == "none"
+    assert cache.plan(KEY, context_grabber.CONTEXT_STRATEGIES) == []
+
+    # Same hwnd, different element: UIA gets a real probe again
+    backend.focused = FakeDocument(text="hello world", caret=5, runtime_id=2)
+    result = context_grabber.get_cursor_context(3, 3)
+    assert (result["strategy"], result["before"], result["after"]) == ("uia", "llo", " wo")
+
+
+def test_no_selection_backs_off_like_a_failure(chrome):
+    _, cache, copies = chrome
+    for _ in range(3):
+        result = context_grabber.get_cursor_context()
+        assert not result["supported"]
+        assert result["reason"] == "TextPattern not available. Long-press Refresh to force grab."
+    # The first empty copy backed Ctrl+C off: later grabs skipped it
+    assert len(copies) == 1
+    assert "clipboard" in cache.snapshot()[f"{KEY[0]}/{KEY[1]}"]["skipping"]
+    assert cache.plan(KEY, context_grabber.CONTEXT_STRATEGIES) == []
@@ -0,0 +1,64 @@
+"""Adaptive deadlines (timing.py) and the clipboard copy wait that feeds them."""
+
+from __future__ import annotations
+
+import pytest
+
+import injector
+from clipboard_session import ClipboardSession
+from context_grabber import _copy_and_wait
+from fakes import FakeClipboard, FakeDocument, RecordingBackend
+from timing import OPERATIONS, LatencyProfile, profiles
+
+
+def test_misses_widen_and_successes_narrow():
+    profile = LatencyProfile(0.1, 0.01, 0.5)
+    profile.miss()
+    profile.miss()
+    assert profile.timeout() == pytest.approx(0.225)
+    for _ in range(10):
+        profile.observe(0.02)
+    assert profile.timeout() < 0.1
+
+
+class CopyingBackend(RecordingBackend):
+    """Ctrl+C copies `selection` to the clipboard, if there is one."""
+
+    def __init__(self, clipboard: FakeClipboard, selection: str = "") -> None:
+        super().__init__(FakeDocument(), clipboard=clipboard)
+        self.selection = selection
+
+    def hotkey(self, *keys: str) -> None:
+        super().hotkey(*keys)
+        if keys == ("ctrl", "c") and self.selection:
+            self.clipboard.set_text(self.selection)
+
+
+@pytest.fixture
+def board():
+    return FakeClipboard(text="user text")
+
+
+def test_copy_without_selection_is_not_a_miss(board):
+    injector.set_backend(CopyingBackend(board))
+    session = ClipboardSession(board)
+    default = OPERATIONS["copy"][0]
+    for _ in range(3):
+        assert not _copy_and_wait(session, "no-selection.exe", "copy", (("ctrl", "c"),), always_copies=False)
+    assert profiles.timeout("no-selection.exe", "copy") == pytest.approx(default)
+
+
+def test_copy_with_selection_learns_the_app(board):
+    injector.set_backend(CopyingBackend(board, selection="picked"))
+    session = ClipboardSession(board)
+    assert _copy_and_wait(session, "fast.exe", "copy", (("ctrl", "c"),), always_copies=False)
+    assert board.text == "picked"
+    assert profiles.timeout("fast.exe", "copy") < OPERATIONS["copy"][0]
+
+
+def test_force_copy_timeout_is_a_miss(board):
+    injector.set_backend(CopyingBackend(board))
+    session = ClipboardSession(board)
+    default = OPERATIONS["force_copy"][0]
+    assert not _copy_and_wait(session, "slow.exe", "force_copy", (("ctrl", "a"), ("ctrl", "c")))
+    assert profiles.timeout("slow.exe", "force_copy") > default
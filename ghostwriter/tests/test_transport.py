@@ -0,0 +1,30 @@
+"""Transports and the optional ASGI front end."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from transport import Transport
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_transport_interface_is_abstract():
+    with pytest.raises(TypeError):
+        Transport()
+
+
+def test_threading_mode_does_not_import_the_asgi_stack():
+    # uvicorn and asgiref are optional (requirements-asgi.txt)
+    code = (
+        "import sys, server, asgi_server\n"
+        "print(sorted(m for m in ('uvicorn', 'asgiref') if m in sys.modules))\n"
+    )
+    env = dict(os.environ, DESKTOP_WORKER="0")
+    result = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
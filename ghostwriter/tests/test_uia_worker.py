@@ -0,0 +1,101 @@
+"""UIAWorker's focused-target cache, driven by FakeUIABackend."""
+
+from __future__ import annotations
+
+import pytest
+
+from fakes import FakeDocument, FakeUIABackend
+from uia_worker import UIABackend, UIAWorker
+
+
+@pytest.fixture
+def backend():
+    return FakeUIABackend(FakeDocument(text="hello world", caret=5))
+
+
+@pytest.fixture
+def worker(backend):
+    uia = UIAWorker(backend)
+    yield uia
+    uia.stop()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        UIABackend()
+
+
+def test_initializes_once_on_its_thread(worker, backend):
+    worker.get_context()
+    worker.get_context()
+    assert backend.initialized == 1
+
+
+def test_target_is_cached_while_focus_stays(worker, backend):
+    ctx = worker.get_context(3, 3)
+    assert (ctx["before"], ctx["after"]) == ("llo", " wo")
+    worker.get_context(3, 3)
+    worker.place_caret(1)
+    assert backend.resolves == 1
+    assert worker.stats() == {"hits": 2, "misses": 1}
+
+
+def test_focus_change_resolves_again(worker, backend):
+    worker.get_context()
+    backend.focused = FakeDocument(text="other", caret=2, runtime_id=2)
+    assert worker.get_context(2, 2)["before"] == "ot"
+    assert backend.resolves == 2
+
+
+def test_no_focus_drops_the_cache(worker, backend):
+    document = backend.focused
+    worker.get_context()
+    backend.focused = None
+    assert worker.get_context() is None
+    backend.focused = document
+    worker.get_context()
+    assert backend.resolves == 2
+
+
+def test_unresolved_target_is_not_cached(worker, backend):
+    # A control whose pattern is not exposed yet, e.g. a page still loading
+    document = FakeDocument(text="late", caret=4, runtime_id=7, has_text_pattern=False, has_value_pattern=False)
+    backend.focused = document
+    assert worker.get_context() is None
+    assert worker.get_context() is None
+    assert backend.resolves == 2
+
+    document.has_text_pattern = True
+    assert worker.get_context(4, 0)["before"] == "late"
+    worker.get_context()
+    assert backend.resolves == 3
+
+
+def test_invalidate_forgets_the_target(worker, backend):
+    worker.get_context()
+    worker.invalidate()
+    worker.get_context()
+    assert backend.resolves == 2
+
+
+def test_stale_target_is_resolved_again(worker, backend):
+    worker.get_context()
+    calls = []
+    read_context = backend.read_context
+
+    def flaky(target, *args):
+        calls.append(target)
+        if len(calls) == 1:
+            raise OSError("element not available")
+        return read_context(target, *args)
+
+    backend.read_context = flaky
+    assert worker.get_context(2, 0)["before"] == "lo"
+    assert len(calls) == 2
+    assert backend.resolves == 2
+
+
+def test_value_only_target_cannot_place_caret(worker, backend):
+    backend.focused = FakeDocument(text="abc", caret=1, runtime_id=3, has_text_pattern=False)
+    assert worker.place_caret(1) is None
+    assert backend.focused.caret == 1
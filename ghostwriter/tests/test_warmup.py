@@ -0,0 +1,95 @@
+"""Warmup: steps run side by side, readiness is reported once, with timings."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from conftest import wait_until
+from warmup import Warmup
+
+
+def test_steps_run_concurrently_and_report_timings():
+    # Each step waits for the other: this only finishes if they overlap
+    both = threading.Barrier(2, timeout=5.0)
+    warmup = Warmup(started=time.perf_counter() - 0.5)
+    warmup.phase("imports", 0.25)
+    warmup.add("desktop", lambda: (both.wait(), time.sleep(0.05)))
+    warmup.add("announce", both.wait)
+    warmup.start()
+    assert warmup.wait(5.0) and warmup.ready
+
+    snap = warmup.snapshot()
+    assert snap["phases"] == {"imports": 250.0}
+    assert {name: step["state"] for name, step in snap["steps"].items()} == {"desktop": "ok", "announce": "ok"}
+    assert snap["steps"]["desktop"]["ms"] >= 50
+    # Measured from process start, which was half a second ago
+    assert snap["ready"] and snap["ready_ms"] >= 500
+    report = warmup.report()
+    assert report.startswith("imports 250 ms | desktop ") and report.endswith(f"ready after {warmup.ready_ms:.0f} ms")
+
+
+def test_a_failed_step_still_ends_the_warm_up():
+    def broken():
+        raise OSError("no display\nsecond line")
+
+    warmup = Warmup()
+    warmup.add("desktop", broken)
+    warmup.start()
+    assert warmup.wait(5.0)
+    step = warmup.snapshot()["steps"]["desktop"]
+    assert (step["state"], step["error"]) == ("failed", "no display")
+    assert "desktop " in warmup.report() and "(failed)" in warmup.report()
+
+
+def test_ready_callbacks_run_once_even_if_one_raises():
+    calls = []
+
+    def boom(w):
+        raise RuntimeError("callback bug")
+
+    warmup = Warmup()
+    warmup.add("a", lambda: None)
+    warmup.add("b", lambda: None)
+    warmup.on_ready(boom)
+    warmup.on_ready(calls.append)
+    warmup.start()
+    assert warmup.wait(5.0)
+    assert wait_until(lambda: calls == [warmup])
+    time.sleep(0.05)
+    assert calls == [warmup]
+
+
+def test_nothing_to_warm_is_ready_at_once():
+    warmup = Warmup()
+    assert not warmup.ready and warmup.report().endswith("warming up")
+    warmup.start()
+    assert warmup.ready and warmup.snapshot()["steps"] == {}
+
+
+def test_connect_says_warming_then_ready_is_broadcast(monkeypatch, server):
+    warmup = Warmup()
+    gate = threading.Event()
+    warmup.add("desktop", gate.wait)
+    warmup.on_ready(server._on_ready)
+    monkeypatch.setattr(server, "warmup", warmup)
+    warmup.start()
+
+    client = server.socketio.test_client(server.app)
+    try:
+        (connected,) = [e["args"][0] for e in client.get_received() if e["name"] == "status_update"]
+        assert connected["status"] == "connected" and connected["ready"] is False
+
+        gate.set()
+        assert warmup.wait(5.0)
+        received = []
+
+        def ready():
+            received.extend(e["args"][0] for e in client.get_received() if e["name"] == "status_update")
+            return received
+
+        assert wait_until(ready)
+        assert received[0]["status"] == "ready"
+        assert received[0]["startup"]["steps"]["desktop"]["state"] == "ok"
+    finally:
+        client.disconnect()
@@ -0,0 +1,95 @@
+"""SupervisedWorker's deadlines, watchdog restarts and back-off, on a real
+child process running fakes.FakeDesktopService."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from clipboard_session import ClipboardSession, set_clipboard_session
+from conftest import wait_until
+from desktop_service import Desktop
+from fakes import FakeClipboard, FakeDesktopService
+from worker_process import SupervisedWorker, WorkerError, WorkerTimeout, WorkerUnavailable
+
+
+@pytest.fixture
+def worker():
+    supervised = SupervisedWorker("fakes:FakeDesktopService", name="test", grace=0.1, backoff=(0.3, 2.0))
+    assert supervised.wait_ready(20.0)
+    yield supervised
+    supervised.stop()
+
+
+def restarted(worker: SupervisedWorker, count: int) -> float:
+    """Wait for restart number `count`; returns when it was seen."""
+    assert wait_until(lambda: worker.restarts >= count)
+    return time.monotonic()
+
+
+def test_hung_call_times_out_and_the_worker_is_replaced(worker):
+    pid = worker.call("input", "ping", timeout=5.0)
+    worker.call("input", "hang_next", "inject_text", 10.0, timeout=5.0)
+
+    start = time.monotonic()
+    with pytest.raises(WorkerTimeout) as raised:
+        worker.call("input", "inject_text", "lost", timeout=0.3)
+    assert raised.value.code == "TIMEOUT"
+    assert time.monotonic() - start < 1.0
+
+    restarted(worker, 1)
+    assert "inject_text stuck" in worker.last_restart
+    assert worker.wait_ready(20.0)
+    assert worker.call("input", "ping", timeout=5.0) != pid
+    assert worker.call("input", "inject_text", "typed", timeout=5.0)["ok"]
+    assert worker.call("input", "document_text", timeout=5.0) == "typed"
+
+
+def test_crashes_back_off_and_calls_fail_fast_meanwhile(worker):
+    pids = {worker.call("input", "ping", timeout=5.0)}
+    waits = []
+    for count in (1, 2):
+        with pytest.raises(WorkerError):
+            worker.call("input", "crash", timeout=5.0)
+        seen = restarted(worker, count)
+        # Down: no waiting on a deadline, just WORKER_DOWN
+        with pytest.raises(WorkerUnavailable) as raised:
+            worker.call("input", "ping", timeout=5.0)
+        assert raised.value.code == "WORKER_DOWN"
+        assert worker.wait_ready(20.0)
+        waits.append(time.monotonic() - seen)
+        pids.add(worker.call("input", "ping", timeout=5.0))
+
+    assert len(pids) == 3
+    assert worker.restarts == 2 and "exited with code 3" in worker.last_restart
+    # The second crash came soon after the first restart: it waited longer
+    assert waits[0] >= 0.25 and waits[1] >= 0.55
+
+
+def test_clipboard_held_by_a_killed_worker_is_restored(worker):
+    # What the hung paste left on the (shared) clipboard
+    clipboard = FakeClipboard(text="half-pasted")
+    set_clipboard_session(ClipboardSession(clipboard))
+    try:
+        Desktop(worker)
+        worker.call("input", "hang_next", "paste", 10.0, timeout=5.0)
+        with pytest.raises(WorkerTimeout):
+            worker.call("input", "paste", "half-pasted", timeout=0.3)
+        restarted(worker, 1)
+        assert clipboard.get_text() == FakeDesktopService.CLIPBOARD
+    finally:
+        set_clipboard_session(None)
+
+
+def test_slow_context_read_gets_its_own_grace(worker):
+    worker.lane_grace = {"context": 1.0}
+    pid = worker.call("input", "ping", timeout=5.0)
+    worker.call("input", "hang_next", "get_cursor_context", 0.8, timeout=5.0)
+    with pytest.raises(WorkerTimeout):
+        worker.call("context", "get_cursor_context", timeout=0.2)
+    # Past the default grace but inside the lane's: typing carries on
+    time.sleep(0.4)
+    assert worker.call("input", "inject_text", "still here", timeout=5.0)["ok"]
+    time.sleep(0.3)
+    assert worker.restarts == 0 and worker.call("input", "ping", timeout=5.0) == pid
@@ -0,0 +1,116 @@
+"""Readiness polling and adaptive per-application timing for GhostWriter.
+
+Fixed sleeps make every grab pay the worst case even when the target app
+answered in a few milliseconds, and still lose the race in slow apps.
+Instead, callers poll for readiness (`wait_until`) up to a deadline taken
+from a `LatencyProfile`.  The profile learns, per application and
+operation, how long that app actually takes.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float, interval: float = 0.002) -> bool:
+    """Poll `predicate` until it returns True or `timeout` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if predicate():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+
+
+class LatencyProfile:
+    """Recent observed latencies of one operation in one application.
+
+    The timeout is a high percentile of recent successes with headroom,
+    clamped to [floor, ceiling].  A miss (deadline hit without the event)
+    widens it so slow apps converge on a working deadline.
+    """
+
+    def __init__(self, default: float, floor: float, ceiling: float, window: int = 32) -> None:
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._boost = 1.0
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        # Decay any boost from earlier misses once the app answers again
+        self._boost = max(1.0, self._boost * 0.8)
+
+    def miss(self) -> None:
+        self._boost = min(self._boost * 1.5, 8.0)
+
+    def timeout(self) -> float:
+        if not self._samples:
+            base = self.default
+        else:
+            ordered = sorted(self._samples)
+            p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+            base = p90 * 1.5 + self.floor
+        return min(max(base * self._boost, self.floor), self.ceiling)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "samples": len(self._samples),
+            "timeout_ms": round(self.timeout() * 1000, 1),
+        }
+
+
+# (default, floor, ceiling) in seconds, per operation
+OPERATIONS: Dict[str, Tuple[float, float, float]] = {
+    # Ctrl+C until the clipboard sequence number changes.  With no selection
+    # it never does and the grab waits out the whole deadline, so only
+    # successful copies move it (no-change timeouts are not misses)
+    "copy": (0.14, 0.02, 0.30),
+    # Ctrl+A, Ctrl+C in force grab
+    "force_copy": (0.20, 0.03, 0.60),
+    # Injection until the target's text reflects it
+    "inject_settle": (0.10, 0.01, 0.40),
+}
+
+
+class TimingProfiles:
+    """LatencyProfile per (application, operation)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._profiles: Dict[Tuple[str, str], LatencyProfile] = {}
+
+    def get(self, app: str, op: str) -> LatencyProfile:
+        with self._lock:
+            profile = self._profiles.get((app, op))
+            if profile is None:
+                default, floor, ceiling = OPERATIONS[op]
+                profile = LatencyProfile(default, floor, ceiling)
+                self._profiles[(app, op)] = profile
+            return profile
+
+    def timeout(self, app: str, op: str) -> float:
+        return self.get(app, op).timeout()
+
+    def observe(self, app: str, op: str, seconds: float) -> None:
+        profile = self.get(app, op)
+        with self._lock:
+            profile.observe(seconds)
+
+    def miss(self, app: str, op: str) -> None:
+        profile = self.get(app, op)
+        with self._lock:
+            profile.miss()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {f"{app}/{op}": p.snapshot() for (app, op), p in self._profiles.items()}
+
+
+profiles = TimingProfiles()
@@ -0,0 +1,108 @@
+"""Socket.IO transports for GhostWriter's event handlers.
+
+The handlers in server.py take the client sid explicitly and talk back
+through a Transport, so the same code runs under Flask-SocketIO's threading
+mode and under the asyncio (ASGI) front end in asgi_server.py.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional
+
+log = logging.getLogger("ghostwriter.transport")
+
+
+class Transport(ABC):
+    """Emits, disconnects and background work; all methods are thread-safe."""
+
+    mode = "?"
+
+    @abstractmethod
+    def emit(self, event: str, data: Any = None, to: Optional[str] = None) -> None:
+        """Send `event` to client `to` (everyone if None)."""
+
+    @abstractmethod
+    def disconnect(self, sid: str) -> None:
+        """Close the connection of client `sid`."""
+
+    @abstractmethod
+    def spawn(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Run `fn(*args)` in the background."""
+
+    @abstractmethod
+    def sleep(self, seconds: float) -> None:
+        """Wait inside spawn()ed work."""
+
+
+class FlaskSocketIOTransport(Transport):
+    """Flask-SocketIO in threading mode: one OS thread per background task."""
+
+    mode = "threading"
+
+    def __init__(self, socketio: Any) -> None:
+        self._socketio = socketio
+
+    def emit(self, event: str, data: Any = None, to: Optional[str] = None) -> None:
+        self._socketio.emit(event, data, to=to)
+
+    def disconnect(self, sid: str) -> None:
+        self._socketio.server.disconnect(sid, namespace="/")
+
+    def spawn(self, fn: Callable[..., Any], *args: Any) -> None:
+        self._socketio.start_background_task(fn, *args)
+
+    def sleep(self, seconds: float) -> None:
+        self._socketio.sleep(seconds)
+
+
+class AsyncioTransport(Transport):
+    """python-socketio AsyncServer on an event loop.
+
+    Emits are scheduled onto `loop` from whichever thread calls them, and
+    background work (context grabs) runs on the bounded `executor`, so
+    blocking UIA/clipboard calls never stall the loop.
+    """
+
+    mode = "asgi"
+
+    def __init__(self, sio: Any, loop: asyncio.AbstractEventLoop, executor: Executor) -> None:
+        self._sio = sio
+        self._loop = loop
+        self._executor = executor
+
+    def _schedule(self, coro: Any) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.create_task(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def emit(self, event: str, data: Any = None, to: Optional[str] = None) -> None:
+        self._schedule(self._sio.emit(event, data, to=to))
+
+    def disconnect(self, sid: str) -> None:
+        self._schedule(self._sio.disconnect(sid))
+
+    def spawn(self, fn: Callable[..., Any], *args: Any) -> None:
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(_log_failure)
+
+    def sleep(self, seconds: float) -> None:
+        # spawn()ed work runs on executor threads, where a plain sleep is fine
+        time.sleep(seconds)
+
+
+def _log_failure(future: Any) -> None:
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        log.warning(f"[transport] background task failed: {exc}")
@@ -0,0 +1,256 @@
+"""Long-lived UI Automation worker for GhostWriter.
+
+COM must be initialised on every thread that touches UI Automation, and
+doing that per call (plus re-walking the control tree and re-probing
+patterns) is both slow and fragile.  `UIAWorker` owns one thread that
+initialises its backend once and serves all UIA calls.  It also caches the
+pattern-bearing control resolved for the focused element and reuses it
+until focus moves elsewhere.
+
+The platform specifics live behind `UIABackend`, so the caching logic can be
+driven by a fake backend on machines without Windows.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+log = logging.getLogger("ghostwriter.uia")
+
+
+class UIAStillRunning(FutureTimeout):
+    """A call timed out after it had started on the UIA thread.
+
+    Unlike a plain timeout (the call was cancelled before it ran), its
+    effect may still land, so the caller must not redo it another way.
+    """
+
+
+@dataclass
+class UIATarget:
+    """A resolved control that exposes text to read.
+
+    kind is "text" for TextPattern controls and "value" for ValuePattern-only
+    controls (no caret information).
+    """
+
+    control: Any
+    pattern: Any
+    kind: str
+    display_name: str
+
+
+class UIABackend(ABC):
+    """Platform hooks used by `UIAWorker`.  All methods run on the worker thread."""
+
+    def initialize(self) -> None:
+        """Per-thread setup (e.g. COM initialisation).  Called once."""
+
+    def shutdown(self) -> None:
+        """Undo `initialize` when the worker stops."""
+
+    @abstractmethod
+    def focused_element(self) -> Any:
+        """Return the currently focused element, or None."""
+
+    @abstractmethod
+    def focus_key(self, element: Any) -> Hashable:
+        """Return a cheap identity for `element` (runtime ID, hwnd, ...)."""
+
+    @abstractmethod
+    def resolve_target(self, element: Any) -> Optional[UIATarget]:
+        """Find the control around `element` that exposes a text/value pattern."""
+
+    @abstractmethod
+    def read_context(self, target: UIATarget, chars_before: int, chars_after: int, unit: int = 0) -> Optional[Dict[str, Any]]:
+        """Read the context dict from a resolved target.
+
+        chars_before/chars_after count UIA TextUnits (0 = character, 3 = line).
+        """
+
+    def place_caret(self, target: UIATarget, offset: int) -> Optional[int]:
+        """Put the caret `offset` characters from where it is now.
+
+        Negative offsets count from the start of the selection, others from
+        its end.  Returns the distance actually moved, or None if the target
+        cannot place a caret (e.g. ValuePattern only).
+        """
+        return None
+
+    def read_page(self, target: UIATarget, offset: int, size: int) -> Optional[Dict[str, Any]]:
+        """Read `size` characters starting `offset` characters from the caret
+        (counted like `place_caret`).  Returns {"start", "end", "text",
+        "edge"}, where start/end is the span really read, or None if the
+        target cannot read away from the caret.
+        """
+        return None
+
+
+class UIAWorker:
+    """Single thread that serialises UIA calls and caches the focused target."""
+
+    def __init__(self, backend: UIABackend) -> None:
+        self.backend = backend
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Cache, touched only on the worker thread.
+        self._cached_key: Optional[Hashable] = None
+        self._cached_target: Optional[UIATarget] = None
+        self._has_cache = False
+
+        self.hits = 0
+        self.misses = 0
+
+    # ── Thread lifecycle ─────────────────────────────────────
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="ghostwriter-uia", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._jobs.put(None)
+            thread.join(timeout=2.0)
+
+    def _run(self) -> None:
+        try:
+            self.backend.initialize()
+        except Exception as exc:
+            log.warning(f"[uia] backend initialisation failed: {exc}")
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                fn, args, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as exc:
+                    future.set_exception(exc)
+        finally:
+            try:
+                self.backend.shutdown()
+            except Exception:
+                pass
+
+    # ── Public API ───────────────────────────────────────────
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+        """Run `fn(*args)` on the UIA thread and return a Future for its result."""
+        self.start()
+        future: "Future[Any]" = Future()
+        self._jobs.put((fn, args, future))
+        return future
+
+    def call(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run `fn(*args)` on the UIA thread and wait up to `timeout` seconds.
+
+        On timeout a call still queued is cancelled (it will never run) and
+        the timeout is raised; one that already started raises
+        UIAStillRunning instead.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise
+            if future.done():
+                return future.result()
+            raise UIAStillRunning(f"{getattr(fn, '__name__', fn)} still running after {timeout}s") from None
+
+    def get_context(self, chars_before: int = 50, chars_after: int = 50, unit: int = 0, timeout: Optional[float] = 5.0) -> Optional[Dict[str, Any]]:
+        return self.call(self._get_context, chars_before, chars_after, unit, timeout=timeout)
+
+    def place_caret(self, offset: int, timeout: Optional[float] = 2.0) -> Optional[int]:
+        return self.call(self._place_caret, offset, timeout=timeout)
+
+    def read_page(self, offset: int, size: int, timeout: Optional[float] = 5.0) -> Optional[Dict[str, Any]]:
+        return self.call(self._on_target, self.backend.read_page, offset, size, timeout=timeout)
+
+    def focus_key(self, timeout: Optional[float] = 1.0) -> Optional[Hashable]:
+        """Identity of the focused element (`UIABackend.focus_key`), None if none."""
+        return self.call(self._focus_key, timeout=timeout)
+
+    def invalidate(self) -> None:
+        """Forget the cached target (runs on the worker thread)."""
+        self.submit(self._invalidate)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    # ── Worker-thread internals ──────────────────────────────
+
+    def _focus_key(self) -> Optional[Hashable]:
+        element = self.backend.focused_element()
+        return self.backend.focus_key(element) if element else None
+
+    def _invalidate(self) -> None:
+        self._cached_key = None
+        self._cached_target = None
+        self._has_cache = False
+
+    def current_target(self) -> Optional[UIATarget]:
+        """Return the target for the focused element, resolving it on focus change.
+
+        Must be called on the worker thread.
+        """
+        element = self.backend.focused_element()
+        if not element:
+            self._invalidate()
+            return None
+
+        key = self.backend.focus_key(element)
+        if self._has_cache and key == self._cached_key:
+            self.hits += 1
+            return self._cached_target
+
+        self.misses += 1
+        target = self.backend.resolve_target(element)
+        if target is None:
+            # Not cached: the pattern may just not be exposed yet (a page
+            # still loading, a lazily built accessibility tree)
+            self._invalidate()
+            return None
+        self._cached_key = key
+        self._cached_target = target
+        self._has_cache = True
+        return target
+
+    def _on_target(self, method: Callable[..., Any], *args: Any) -> Any:
+        """Call `method(target, *args)` on the focused target, re-resolving once."""
+        target = self.current_target()
+        if target is None:
+            return None
+        try:
+            return method(target, *args)
+        except Exception as exc:
+            # Cached element went stale (control destroyed, app restarted, ...).
+            log.debug(f"[uia] cached target failed, re-resolving: {exc}")
+            self._invalidate()
+            target = self.current_target()
+            if target is None:
+                return None
+            return method(target, *args)
+
+    def _get_context(self, chars_before: int, chars_after: int, unit: int) -> Optional[Dict[str, Any]]:
+        return self._on_target(self.backend.read_context, chars_before, chars_after, unit)
+
+    def _place_caret(self, offset: int) -> Optional[int]:
+        return self._on_target(self.backend.place_caret, offset)
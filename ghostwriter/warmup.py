@@ -0,0 +1,127 @@
+"""Background warm-up and startup timing for GhostWriter.
+
+The first keystroke used to pay for creating the injection backend (and
+importing pyautogui), the first context grab for COM/UIA initialisation,
+and nothing was listening until every QR code had been drawn.  `Warmup`
+runs those initialisations concurrently on daemon threads while the server
+is already accepting connections, records how long each phase took, and
+reports readiness so clients can tell "connected" from "ready to type".
+
+Handlers do not need to wait for it: the backends are created behind their
+own locks, so an event that arrives early simply blocks on the step that is
+still running instead of starting a second initialisation.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("ghostwriter")
+
+
+@dataclass
+class _Step:
+    name: str
+    fn: Callable[[], Any]
+    state: str = "pending"  # pending | running | ok | failed
+    ms: float = 0.0
+    error: str = ""
+
+
+class Warmup:
+    """Named init steps run in parallel, plus a log of synchronous phases."""
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        # perf_counter() at process start, so "ready after" covers imports
+        self.started = time.perf_counter() if started is None else started
+        self._lock = threading.Lock()
+        self._steps: Dict[str, _Step] = {}
+        # Synchronous startup phases in order: (name, ms)
+        self._phases: List[tuple] = []
+        self._done = threading.Event()
+        self._on_ready: List[Callable[["Warmup"], None]] = []
+        self.ready_ms: Optional[float] = None
+
+    def add(self, name: str, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            self._steps[name] = _Step(name, fn)
+
+    def phase(self, name: str, seconds: float) -> None:
+        """Record a phase timed by the caller (imports, asset build, ...)."""
+        with self._lock:
+            self._phases.append((name, seconds * 1000))
+
+    def on_ready(self, callback: Callable[["Warmup"], None]) -> None:
+        self._on_ready.append(callback)
+
+    def start(self) -> None:
+        with self._lock:
+            steps = list(self._steps.values())
+        if not steps:
+            self._finish()
+            return
+        for step in steps:
+            threading.Thread(target=self._run, args=(step,), name=f"ghostwriter-warm-{step.name}", daemon=True).start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self, step: _Step) -> None:
+        with self._lock:
+            step.state = "running"
+        t0 = time.perf_counter()
+        try:
+            step.fn()
+            state, error = "ok", ""
+        except Exception as exc:
+            state, error = "failed", (str(exc).splitlines() or [type(exc).__name__])[0]
+            log.warning(f"[warmup] {step.name} failed: {error}")
+        with self._lock:
+            step.state, step.error = state, error
+            step.ms = (time.perf_counter() - t0) * 1000
+            finished = all(s.state in ("ok", "failed") for s in self._steps.values())
+        if finished:
+            self._finish()
+
+    def _finish(self) -> None:
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.ready_ms = (time.perf_counter() - self.started) * 1000
+            self._done.set()
+        log.info(f"[startup] {self.report()}")
+        for callback in self._on_ready:
+            try:
+                callback(self)
+            except Exception as exc:
+                log.warning(f"[warmup] ready callback failed: {exc}")
+
+    def report(self) -> str:
+        """One line: each phase and step with its cost."""
+        with self._lock:
+            parts = [f"{name} {ms:.0f} ms" for name, ms in self._phases]
+            for step in self._steps.values():
+                cost = f"{step.ms:.0f} ms" if step.state in ("ok", "failed") else step.state
+                parts.append(f"{step.name} {cost}" + (" (failed)" if step.state == "failed" else ""))
+            ready = f"ready after {self.ready_ms:.0f} ms" if self.ready_ms is not None else "warming up"
+        return " | ".join(parts + [ready])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._done.is_set(),
+                "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+                "phases": {name: round(ms, 1) for name, ms in self._phases},
+                "steps": {
+                    s.name: {"state": s.state, "ms": round(s.ms, 1), **({"error": s.error} if s.error else {})}
+                    for s in self._steps.values()
+                },
+            }
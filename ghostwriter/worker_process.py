@@ -0,0 +1,398 @@
+"""Supervised worker process for GhostWriter's desktop calls.
+
+UI Automation and synthetic input call into other applications, and a hung
+application can block those calls for seconds, or for good.  Run in the
+server process, such a call wedges the thread it is on (the injection
+thread, a grab thread) and everything queued behind it.
+
+`SupervisedWorker` runs a service object in a child process instead and
+talks to it over its stdin/stdout with pickled messages:
+
+    parent -> child   ("call", id, lane, method, args)
+    child -> parent   ("ready", pid) once, then ("result", id, ok, value)
+                      or ("state", key, value)
+
+Each lane is one thread in the child, so calls on a lane run in order and a
+hang on one lane (say "context") does not hold up another ("input").  Every
+call has a deadline; the caller gets `WorkerTimeout` when it passes, and a
+watchdog thread kills and respawns the child if the call is still running
+a moment later (`grace`, or that lane's entry in `lane_grace`), or if the
+child dies or never comes up.  Respawns back off
+while the child keeps failing.  Calls made while it is down fail at once
+with `WorkerUnavailable`.
+
+A kill skips the child's own cleanup.  A service that leaves something to
+undo (the clipboard a paste borrowed) reports it through the `publish`
+function its `attach_worker(publish)` method is given; the parent keeps the
+last value of each key, None dropping it, and hands what is left to
+`on_lost(state)` once the child is gone.
+
+The service is named as "module:Class" and built in the child, so tests
+can swap in a fake (see fakes.FakeDesktopService) that hangs or crashes on
+demand.
+"""
+
+from __future__ import annotations
+
+import importlib
+import itertools
+import logging
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("ghostwriter.worker")
+
+
+class WorkerError(RuntimeError):
+    """A call the worker process could not answer."""
+
+    code = "WORKER_ERR"
+
+
+class WorkerTimeout(WorkerError):
+    code = "TIMEOUT"
+
+
+class WorkerUnavailable(WorkerError):
+    """The worker is down or restarting."""
+
+    code = "WORKER_DOWN"
+
+
+class WorkerCallError(WorkerError):
+    """The call raised inside the worker; the message names the exception."""
+
+    code = "WORKER_CALL"
+
+
+@dataclass
+class _Call:
+    id: int
+    lane: str
+    method: str
+    timeout: float
+    sent: float
+    done: threading.Event = field(default_factory=threading.Event)
+    ok: bool = False
+    value: Any = None
+
+
+class SupervisedWorker:
+    """A child process serving `factory` ("module:Class"), with a watchdog."""
+
+    def __init__(
+        self,
+        factory: str,
+        name: str = "worker",
+        startup_timeout: float = 20.0,
+        grace: float = 0.25,
+        backoff: Tuple[float, float] = (0.5, 30.0),
+        on_lost: Optional[Callable[[Dict[str, Any]], None]] = None,
+        lane_grace: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.factory = factory
+        self.name = name
+        self.startup_timeout = startup_timeout
+        # How far past its deadline a call may run before the child is
+        # killed; a kill also fails whatever the other lanes were doing
+        self.grace = grace
+        self.lane_grace = dict(lane_grace or {})
+        self.backoff = backoff
+        self.on_lost = on_lost
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._ready = False
+        self._ready_event = threading.Event()
+        self._spawned_at = 0.0
+        self._ready_at = 0.0
+        self._pending: Dict[int, _Call] = {}
+        # What the child published (see attach_worker), for on_lost
+        self._state: Dict[str, Any] = {}
+        self._ids = itertools.count(1)
+        self._delay = backoff[0]
+        self._next_spawn = 0.0
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.pid: Optional[int] = None
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+        self.last_restart = ""
+
+    # ── Lifecycle ────────────────────────────────────────────
+
+    def start(self) -> None:
+        with self._lock:
+            self._stopping = False
+            if self._proc is None and time.monotonic() >= self._next_spawn:
+                self._spawn_locked()
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name=f"ghostwriter-{self.name}-watchdog", daemon=True)
+                self._watchdog.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        self.start()
+        return self._ready_event.wait(timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopping = True
+            lost = self._detach_locked("stopped")
+        self._reap(*lost)
+
+    def _spawn_locked(self) -> None:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), self.factory],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._proc = proc
+        self._ready = False
+        self._ready_event.clear()
+        self._spawned_at = time.monotonic()
+        threading.Thread(target=self._read, args=(proc,), name=f"ghostwriter-{self.name}-reader", daemon=True).start()
+
+    def _detach_locked(self, reason: str) -> Tuple[Optional[subprocess.Popen], Dict[str, Any]]:
+        """Forget the child and fail its pending calls.
+
+        Returns (process, published state) for `_reap`, which the caller
+        runs once it has released the lock: waiting for the process and
+        on_lost must not hold up calls and the watchdog.
+        """
+        proc, self._proc = self._proc, None
+        self._ready = False
+        self._ready_event.clear()
+        state, self._state = self._state, {}
+        pending, self._pending = self._pending, {}
+        for call in pending.values():
+            call.ok, call.value = False, WorkerUnavailable(f"{self.name} worker {reason}")
+            call.done.set()
+        return proc, state
+
+    def _reap(self, proc: Optional[subprocess.Popen], state: Dict[str, Any]) -> None:
+        """Kill a detached child, then hand what it left behind to on_lost."""
+        if proc is not None:
+            try:
+                proc.kill()
+                proc.wait(timeout=2.0)
+            except Exception:
+                pass
+        if state and self.on_lost is not None:
+            try:
+                self.on_lost(state)
+            except Exception as exc:
+                log.warning(f"[{self.name}] on_lost failed: {exc}")
+
+    def _restart_locked(self, reason: str) -> Tuple[Optional[subprocess.Popen], Dict[str, Any]]:
+        """Detach the child and schedule the respawn; the caller `_reap`s."""
+        now = time.monotonic()
+        log.warning(f"[{self.name}] restarting worker pid={self.pid}: {reason}")
+        # A child that came up and stayed up a while starts over at the
+        # shortest back-off; one that keeps failing waits longer each time
+        if self._ready and now - self._ready_at > 10.0:
+            self._delay = self.backoff[0]
+        lost = self._detach_locked(reason)
+        self.restarts += 1
+        self.last_restart = reason
+        self._next_spawn = now + self._delay
+        self._delay = min(self._delay * 2, self.backoff[1])
+        return lost
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(0.05)
+            with self._lock:
+                lost = self._check_locked()
+            if lost is not None:
+                self._reap(*lost)
+
+    def _check_locked(self) -> Optional[Tuple[Optional[subprocess.Popen], Dict[str, Any]]]:
+        """One watchdog pass: spawn when due, restart a dead or stuck child."""
+        if self._stopping:
+            return None
+        now = time.monotonic()
+        proc = self._proc
+        if proc is None:
+            if now >= self._next_spawn:
+                try:
+                    self._spawn_locked()
+                except OSError as exc:
+                    log.error(f"[{self.name}] cannot start worker: {exc}")
+                    self._next_spawn = now + self.backoff[1]
+            return None
+        reason = None
+        if proc.poll() is not None:
+            reason = f"exited with code {proc.returncode}"
+        elif not self._ready:
+            if now - self._spawned_at > self.startup_timeout:
+                reason = f"not ready after {self.startup_timeout:.0f}s"
+        else:
+            for call in self._pending.values():
+                if now > self._deadline(call) + self.lane_grace.get(call.lane, self.grace):
+                    reason = f"{call.lane}.{call.method} stuck for {now - max(call.sent, self._ready_at):.1f}s"
+                    break
+        return self._restart_locked(reason) if reason else None
+
+    # ── Calls ────────────────────────────────────────────────
+
+    def call(self, lane: str, method: str, *args: Any, timeout: float = 5.0) -> Any:
+        """Run `service.method(*args)` on `lane` in the child.
+
+        Raises WorkerTimeout past `timeout` seconds (counted from when the
+        child is up), WorkerUnavailable while it is down, and
+        WorkerCallError if the call itself raised.
+        """
+        self.start()
+        call = _Call(next(self._ids), lane, method, timeout, time.monotonic())
+        with self._lock:
+            proc = self._proc
+            if proc is None:
+                raise WorkerUnavailable(f"{self.name} worker is restarting")
+            self._pending[call.id] = call
+            self.calls += 1
+        try:
+            with self._send_lock:
+                pickle.dump(("call", call.id, lane, method, args), proc.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                proc.stdin.flush()
+        except (OSError, ValueError) as exc:
+            with self._lock:
+                self._pending.pop(call.id, None)
+            raise WorkerUnavailable(f"{self.name} worker pipe closed: {exc}") from None
+
+        while not call.done.is_set():
+            with self._lock:
+                # Until the child is up there is no deadline yet; poll
+                remaining = self._deadline(call) - time.monotonic() if self._ready else 0.05
+                if remaining <= 0:
+                    # Left pending: the watchdog restarts the child if it stays stuck
+                    self.timeouts += 1
+                    raise WorkerTimeout(f"{lane}.{method} took over {timeout:.1f}s")
+            call.done.wait(remaining)
+
+        if call.ok:
+            return call.value
+        self.errors += 1
+        if isinstance(call.value, WorkerError):
+            raise call.value
+        raise WorkerCallError(str(call.value))
+
+    def _deadline(self, call: _Call) -> float:
+        """Calls queued before the child was up are timed from when it was."""
+        return max(call.sent, self._ready_at) + call.timeout
+
+    def _read(self, proc: subprocess.Popen) -> None:
+        try:
+            while True:
+                message = pickle.load(proc.stdout)
+                with self._lock:
+                    if self._proc is not proc:
+                        return
+                    if message[0] == "ready":
+                        self.pid = message[1]
+                        self._ready = True
+                        self._ready_at = time.monotonic()
+                        self._ready_event.set()
+                        log.info(f"[{self.name}] worker pid={self.pid} ready in {(self._ready_at - self._spawned_at) * 1000:.0f} ms")
+                    elif message[0] == "result":
+                        _, call_id, ok, value = message
+                        call = self._pending.pop(call_id, None)
+                        if call is not None:
+                            call.ok, call.value = ok, value
+                            call.done.set()
+                    elif message[0] == "state":
+                        _, key, value = message
+                        if value is None:
+                            self._state.pop(key, None)
+                        else:
+                            self._state[key] = value
+        except (EOFError, OSError, pickle.UnpicklingError):
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": self.pid if self._ready else None,
+                "ready": self._ready,
+                "pending": len(self._pending),
+                "calls": self.calls,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "restarts": self.restarts,
+                "last_restart": self.last_restart,
+            }
+
+
+# ── Child side ───────────────────────────────────────────────
+
+def _serve(factory: str) -> None:
+    # stdout carries the protocol; anything printed goes to stderr instead
+    out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    inp = sys.stdin.buffer
+    send_lock = threading.Lock()
+
+    def send(message: Tuple[Any, ...]) -> None:
+        with send_lock:
+            pickle.dump(message, out, protocol=pickle.HIGHEST_PROTOCOL)
+            out.flush()
+
+    module, _, attr = factory.partition(":")
+    service = getattr(importlib.import_module(module), attr)()
+    attach = getattr(service, "attach_worker", None)
+    if attach is not None:
+        attach(lambda key, value: send(("state", key, value)))
+    send(("ready", os.getpid()))
+
+    def run_lane(jobs: "queue.Queue[tuple]") -> None:
+        while True:
+            call_id, method, args = jobs.get()
+            try:
+                if method.startswith("_"):
+                    raise AttributeError(f"{method} is private")
+                message = ("result", call_id, True, getattr(service, method)(*args))
+            except BaseException as exc:
+                message = ("result", call_id, False, f"{type(exc).__name__}: {exc}")
+            try:
+                send(message)
+            except (pickle.PicklingError, TypeError, AttributeError) as exc:
+                send(("result", call_id, False, f"unpicklable result: {exc}"))
+
+    lanes: Dict[str, "queue.Queue[tuple]"] = {}
+    while True:
+        try:
+            message = pickle.load(inp)
+        except EOFError:
+            break  # parent went away
+        if message[0] != "call":
+            break
+        _, call_id, lane, method, args = message
+        jobs = lanes.get(lane)
+        if jobs is None:
+            jobs = lanes[lane] = queue.Queue()
+            threading.Thread(target=run_lane, args=(jobs,), name=f"worker-{lane}", daemon=True).start()
+        jobs.put((call_id, method, args))
+    # Lane threads may be stuck in a hung call; don't wait for them
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] [worker] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    try:
+        _serve(sys.argv[1])
+    except KeyboardInterrupt:
+        os._exit(0)